@@ -0,0 +1,249 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""asyncio front-end for embedding the device operations in a service.
+
+Every board gets one `AsyncDevice`, shared by all callers through
+`connect(port)`. Its blocking `AmpySession` calls run on a private worker
+thread, so the event loop never waits on the serial port, and an
+`asyncio.Lock` queues concurrent callers in arrival order.
+
+    device = await AM_async.connect("/dev/ttyACM0")
+    await device.put("main.py", "/main.py", progress=lambda n, total: ...)
+    async for chunk in device.stream("/log.csv"):
+        ...
+
+The serial transport itself stays blocking: rather than a second,
+non-blocking implementation of the raw-REPL protocol, the API wraps the one
+`AmpySession` the rest of the tool uses in a single-thread executor per
+board. That costs one OS thread for every open board, and a round-trip
+already running on that thread cannot be abandoned. Cancelling a transfer
+therefore stops it between two chunks and leaves the link usable;
+operations that take a single round-trip (ls, rm, bulk delete) run to
+completion first.
+"""
+
+import asyncio
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from AM_session import (
+    COMPRESSED_SUFFIX,
+    DEFAULT_BAUDRATE,
+    PARTIAL_SUFFIX,
+    AmpySession,
+    DeviceError,
+    TransferCancelled,
+)
+
+STREAM_QUEUE = 8  # chunks buffered for `stream` before the transfer waits for the reader
+
+_devices: dict[str, "AsyncDevice"] = {}
+
+
+class AsyncDevice:
+    """Coroutine API for one board; use `connect` to get the shared instance."""
+
+    def __init__(self, port: str, baudrate: int = DEFAULT_BAUDRATE, timeout: float = 10.0):
+        self.port = port
+        self.session = AmpySession(port, baudrate, timeout)
+        self.lock = asyncio.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"ampy-{port}")
+
+    async def _call(self, function, *args, cancel: threading.Event | None = None):
+        """Run `function(*args)` on the device thread, one caller at a time.
+
+        When the awaiting task is cancelled, `cancel` is set and the call is
+        still waited for, so the next caller finds the link in a clean state.
+        """
+        async with self.lock:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if cancel is not None:
+                    cancel.set()
+                with contextlib.suppress(Exception):
+                    await future
+                raise
+
+    @staticmethod
+    def _progress(cancel: threading.Event, progress):
+        """Per-chunk hook for the device thread: stops on cancel, reports in the loop."""
+        loop = asyncio.get_running_loop()
+
+        def hook(new_bytes: int, total: int):
+            if cancel.is_set():
+                raise TransferCancelled()
+            if progress is not None:
+                loop.call_soon_threadsafe(progress, new_bytes, total)
+
+        return hook
+
+    # --- connection ---
+    async def open(self) -> "AsyncDevice":
+        await self._call(self.session.open)
+        return self
+
+    async def close(self):
+        await self._call(self.session.close)
+        if _devices.get(self.port) is self:
+            del _devices[self.port]
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # --- operations ---
+    async def ls(self, directory: str = "/", recursive: bool = False) -> list[tuple[str, str, int]]:
+        """Entries of `directory` as `(path, "f" | "d", size)`, every level with `recursive`."""
+        return await self._call(self.session.walk, directory, recursive)
+
+    async def put(
+        self, local_file: str, remote_file: str, compress: bool = False, progress=None
+    ) -> dict:
+        """Upload a local file; `progress(new_bytes, total)` is called in the event loop."""
+        with open(local_file, "rb") as f:
+            data = f.read()
+        return await self.put_bytes(data, remote_file, compress, progress)
+
+    async def put_bytes(
+        self, data: bytes, remote_file: str, compress: bool = False, progress=None
+    ) -> dict:
+        cancel = threading.Event()
+        hook = self._progress(cancel, progress)
+
+        def upload():
+            try:
+                return self.session.put_bytes(data, remote_file, compress, hook)
+            except TransferCancelled:
+                # the target is only replaced once complete, drop the leftovers
+                compressed = remote_file + COMPRESSED_SUFFIX
+                for path in (remote_file + PARTIAL_SUFFIX, compressed, compressed + PARTIAL_SUFFIX):
+                    with contextlib.suppress(DeviceError):
+                        self.session.rm(path)
+                raise
+
+        return await self._call(upload, cancel=cancel)
+
+    async def get(
+        self, remote_file: str, local_file: str | None = None, compress: bool = False, progress=None
+    ) -> bytes | dict:
+        """Download a file into memory, or into `local_file` (then the stats are returned)."""
+        cancel = threading.Event()
+        hook = self._progress(cancel, progress)
+        if local_file is None:
+
+            def download():
+                buffer = bytearray()
+                self.session.download(remote_file, _Sink(buffer.extend), compress, hook)
+                return bytes(buffer)
+
+        else:
+
+            def download():
+                return self.session.download_file(remote_file, local_file, compress, hook)
+
+        return await self._call(download, cancel=cancel)
+
+    async def stream(self, remote_file: str, compress: bool = False):
+        """Async iterator over the chunks of a remote file as they arrive.
+
+        At most `STREAM_QUEUE` chunks are buffered; a slow reader slows the
+        transfer down instead of filling memory.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(STREAM_QUEUE)
+        cancel = threading.Event()
+        done = object()
+
+        def deliver(item):
+            if cancel.is_set():
+                raise TransferCancelled()
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def download():
+            try:
+                self.session.download(remote_file, _Sink(deliver), compress)
+            finally:
+                if not cancel.is_set():
+                    deliver(done)
+
+        task = asyncio.ensure_future(self._call(download, cancel=cancel))
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                finished, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in finished:
+                    getter.cancel()
+                    task.result()  # the transfer failed before the end marker
+                    continue
+                item = getter.result()
+                if item is done:
+                    break
+                yield item
+            await task
+        finally:
+            if not task.done():
+                cancel.set()
+                while not queue.empty():
+                    queue.get_nowait()  # unblock a worker waiting for space
+                with contextlib.suppress(asyncio.CancelledError, TransferCancelled):
+                    await task
+
+    async def rm(self, path: str):
+        await self._call(self.session.rm, path)
+
+    async def rmdir(self, path: str):
+        await self._call(self.session.rmdir, path)
+
+    async def bulk_delete(
+        self,
+        pattern: str = "*",
+        directory: str = "/",
+        recursive: bool = False,
+        remove_dirs: bool = False,
+    ) -> dict[str, list]:
+        """See `AmpySession.delete_matching`."""
+        return await self._call(
+            self.session.delete_matching, pattern, directory, recursive, remove_dirs
+        )
+
+
+class _Sink:
+    """Minimal binary file object handing every write to `callback`."""
+
+    def __init__(self, callback):
+        self.write = callback
+
+
+async def connect(port: str, baudrate: int = DEFAULT_BAUDRATE) -> AsyncDevice:
+    """The shared, opened `AsyncDevice` for `port`."""
+    device = _devices.get(port)
+    if device is None:
+        device = _devices[port] = AsyncDevice(port, baudrate)
+    await device.open()
+    return device
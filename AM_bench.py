@@ -0,0 +1,333 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Benchmarks for AM_main against a simulated board.
+
+Runs fixed workloads (many small files, a few large files, a bulk delete and
+a directory listing) through the same functions the menu uses, on a
+`FakeDevice` with configurable link speed and receive buffer. Results are
+printed and written as JSON; pass an earlier result file with `--compare` to
+flag regressions.
+
+    python AM_bench.py --baud 115200 --output bench.json
+    python AM_bench.py --baud 115200 --compare bench.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import AM_index
+import AM_journal
+import AM_main
+import AM_mpy
+from AM_fakedevice import FakeDevice
+from AM_session import AmpySession
+
+WORKLOAD_NAMES = ("small_files", "large_files", "bulk_delete", "listing")
+
+
+class OperationTimer:
+    """Records the duration of every call to `module.name` while active."""
+
+    def __init__(self, module, name: str):
+        self.module = module
+        self.name = name
+        self.durations: list[float] = []
+        self._original = None
+
+    def __enter__(self):
+        self._original = getattr(self.module, self.name)
+        original = self._original
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.durations.append(time.perf_counter() - start)
+
+        setattr(self.module, self.name, timed)
+        return self
+
+    def __exit__(self, *exc):
+        setattr(self.module, self.name, self._original)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def write_files(directory: str, count: int, size: int, seed: int, prefix: str) -> list[str]:
+    """Deterministic text-like payloads, so runs stay comparable."""
+    rng = random.Random(seed)
+    words = [b"import", b"machine", b"value", b"sensor", b"0x1f", b"def", b"return", b"\n"]
+    names = []
+    for i in range(count):
+        data = bytearray()
+        while len(data) < size:
+            data += rng.choice(words) + b" "
+        name = f"{prefix}{i:04d}.py"
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(bytes(data[:size]))
+        names.append(name)
+    return names
+
+
+# --- workloads ---
+# Each returns (operation durations, files handled, bytes moved).
+
+
+def workload_small_files(port, device, work_dir, args):
+    local_dir = os.path.join(work_dir, "small")
+    os.makedirs(local_dir)
+    write_files(local_dir, args.small_count, args.small_size, 1, "s")
+    # small files mostly travel in bundles, one operation each
+    with OperationTimer(AM_main, "upload_single") as singles, OperationTimer(
+        AmpySession, "put_bundle"
+    ) as bundles:
+        AM_main.upload_from_dir(port, local_dir)
+    return singles.durations + bundles.durations, args.small_count, args.small_count * args.small_size
+
+
+def workload_large_files(port, device, work_dir, args):
+    local_dir = os.path.join(work_dir, "large")
+    download_dir = os.path.join(work_dir, "large_back")
+    os.makedirs(local_dir)
+    names = write_files(local_dir, args.large_count, args.large_size, 2, "l")
+    with OperationTimer(AM_main, "upload_single") as uploads:
+        AM_main.upload_from_dir(port, local_dir)
+    remote = ",".join(AM_main.ROOT_DIR + name for name in names)
+    with OperationTimer(AM_main, "download_single") as downloads:
+        AM_main.download_multiple(port, remote, download_dir)
+    total = args.large_count * args.large_size
+    return uploads.durations + downloads.durations, 2 * args.large_count, 2 * total
+
+
+def workload_bulk_delete(port, device, work_dir, args):
+    for i in range(args.delete_count):
+        folder = device.local_path(f"/logs{i % 4}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"log{i:04d}.csv"), "wb") as f:
+            f.write(b"1,2,3\n")
+    with OperationTimer(AM_main, "bulk_delete") as timer:
+        report = AM_main.bulk_delete(port, "*", recursive=True, remove_dirs=True)
+    if report is None or report["failed"]:
+        raise RuntimeError(f"bulk delete failed: {report}")
+    return timer.durations, args.delete_count, 0
+
+
+def workload_listing(port, device, work_dir, args):
+    for i in range(30):
+        with open(device.local_path(f"/file{i:02d}.txt"), "wb") as f:
+            f.write(b"x" * i)
+    with OperationTimer(AM_main, "run_ampy_command") as timer:
+        for _ in range(args.listing_runs):
+            AM_main.run_ampy_command(port, ["ls", "-l", "-r"])
+    return timer.durations, args.listing_runs, 0
+
+
+WORKLOADS = {
+    "small_files": workload_small_files,
+    "large_files": workload_large_files,
+    "bulk_delete": workload_bulk_delete,
+    "listing": workload_listing,
+}
+
+
+# (module, attribute, name below the bench's own cache folder)
+STATE_PATHS = (
+    (AM_index, "INDEX_DIR", "index"),
+    (AM_journal, "JOURNAL_DIR", "journal"),
+    (AM_mpy, "MPY_CACHE_DIR", "mpy"),
+    (AM_main, "LINK_PROFILES_FILE", "links.json"),
+    (AM_main, "METRICS_DIR", "metrics"),
+)
+
+
+@contextlib.contextmanager
+def private_state():
+    """Point the tool's indexes, journals, caches and metrics at a throwaway folder.
+
+    Runs then neither see each other's state nor touch ~/.ampy_manager.
+    """
+    saved = [(module, name, getattr(module, name)) for module, name, _ in STATE_PATHS]
+    with tempfile.TemporaryDirectory(prefix="ampy_bench_cache_") as cache_dir:
+        for module, name, path in STATE_PATHS:
+            setattr(module, name, os.path.join(cache_dir, path))
+        try:
+            yield cache_dir
+        finally:
+            for module, name, value in saved:
+                setattr(module, name, value)
+
+
+def run_benchmarks(args) -> dict:
+    with private_state():
+        return _run_benchmarks(args)
+
+
+def _run_benchmarks(args) -> dict:
+    results = {}
+    device = FakeDevice(baudrate=args.baud, rx_buffer=args.rx_buffer, platform=args.platform)
+    device.start()
+    try:
+        port = device.port
+        AM_main.get_session(port)  # connection setup is not part of any workload
+        for name in args.workloads:
+            durations, files, num_bytes, seconds = [], 0, 0, 0.0
+            for _ in range(args.repeat):
+                device.clear()
+                AM_main.close_sessions()
+                AM_main.get_session(port)
+                work_dir = tempfile.mkdtemp(prefix="ampy_bench_")
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+                        io.StringIO()
+                    ):
+                        start = time.perf_counter()
+                        run_durations, run_files, run_bytes = WORKLOADS[name](
+                            port, device, work_dir, args
+                        )
+                        seconds += time.perf_counter() - start
+                finally:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+                durations += run_durations
+                files += run_files
+                num_bytes += run_bytes
+            results[name] = {
+                "operations": len(durations),
+                "files": files,
+                "bytes": num_bytes,
+                "seconds": round(seconds, 4),
+                "files_per_s": round(files / seconds, 2) if seconds else 0.0,
+                "bytes_per_s": round(num_bytes / seconds, 1) if seconds else 0.0,
+                "latency_p50_ms": round(percentile(durations, 50) * 1000, 2),
+                "latency_p99_ms": round(percentile(durations, 99) * 1000, 2),
+            }
+    finally:
+        AM_main.close_sessions()
+        device.stop()
+
+    return {
+        "tool_version": AM_main.__version__,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {
+            "baud": args.baud,
+            "rx_buffer": args.rx_buffer,
+            "platform": args.platform,
+            "repeat": args.repeat,
+            "small_count": args.small_count,
+            "small_size": args.small_size,
+            "large_count": args.large_count,
+            "large_size": args.large_size,
+            "delete_count": args.delete_count,
+            "listing_runs": args.listing_runs,
+        },
+        "workloads": results,
+    }
+
+
+def compare(current: dict, previous: dict, threshold: float) -> list[str]:
+    """Regressions of more than `threshold` (fraction) between two result sets."""
+    if current["config"] != previous.get("config"):
+        print("Warning: benchmark configurations differ, comparison may be meaningless.")
+    regressions = []
+    for name, now in current["workloads"].items():
+        before = previous.get("workloads", {}).get(name)
+        if not before:
+            continue
+        for key in ("files_per_s", "bytes_per_s"):
+            if before[key] and now[key] < before[key] * (1 - threshold):
+                regressions.append(f"{name}: {key} {before[key]} -> {now[key]}")
+        for key in ("latency_p50_ms", "latency_p99_ms"):
+            if before[key] and now[key] > before[key] * (1 + threshold):
+                regressions.append(f"{name}: {key} {before[key]} -> {now[key]}")
+    return regressions
+
+
+def print_results(results: dict):
+    header = f"{'workload'.ljust(12)} {'files/s':>10} {'bytes/s':>12} {'p50 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results["workloads"].items():
+        print(
+            f"{name.ljust(12)} {r['files_per_s']:>10} {r['bytes_per_s']:>12} "
+            f"{r['latency_p50_ms']:>9} {r['latency_p99_ms']:>9}"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baud", type=int, default=115200, help="simulated link speed, 0 = unlimited")
+    parser.add_argument("--rx-buffer", type=int, default=0, help="device receive burst limit in bytes, 0 = unlimited")
+    parser.add_argument("--platform", default="rp2", help="sys.platform reported by the fake board")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--small-count", type=int, default=50)
+    parser.add_argument("--small-size", type=int, default=256)
+    parser.add_argument("--large-count", type=int, default=3)
+    parser.add_argument("--large-size", type=int, default=32 * 1024)
+    parser.add_argument("--delete-count", type=int, default=100)
+    parser.add_argument("--listing-runs", type=int, default=20)
+    parser.add_argument("--workloads", default=",".join(WORKLOAD_NAMES))
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="earlier JSON result to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before a regression is reported")
+    args = parser.parse_args(argv)
+    args.workloads = [w.strip() for w in args.workloads.split(",") if w.strip()]
+    unknown = [w for w in args.workloads if w not in WORKLOADS]
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(unknown)}")
+
+    results = run_benchmarks(args)
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            previous = json.load(f)
+        regressions = compare(results, previous, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Thin command-line client of the AM_daemon connection daemon.
+
+The daemon keeps the boards' serial sessions open, so a command run through
+this client skips the port scan, the board reset and the link tuning that a
+fresh `AM_main.py` pays every time. Only the standard library is imported
+here to keep the start-up cost of each call down.
+
+    python AM_client.py start --port /dev/ttyACM0
+    python AM_client.py put app/main.py /main.py
+    python AM_client.py ls / -r
+    python AM_client.py cat /log.csv --start -200
+    python AM_client.py shutdown
+
+Requests and replies are single JSON lines over a Unix socket (POSIX only).
+Exit codes: 0 success, 1 the operation failed, 3 no daemon is running.
+"""
+
+import argparse
+import base64
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from AM_index import CACHE_DIR
+
+SOCKET_ENV = "AMPY_SOCKET"
+PORT_ENV = "AMPY_PORT"
+DEFAULT_SOCKET = os.path.join(CACHE_DIR, "daemon.sock")
+START_TIMEOUT = 10.0  # seconds to wait for a freshly started daemon to listen
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_NO_DAEMON = 3
+
+
+class DaemonUnavailable(Exception):
+    pass
+
+
+def socket_path(requested: str | None = None) -> str:
+    return requested or os.environ.get(SOCKET_ENV) or DEFAULT_SOCKET
+
+
+def request(message: dict, path: str | None = None, timeout: float | None = None) -> dict:
+    """Send one request to the daemon and return its reply."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        try:
+            sock.connect(socket_path(path))
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise DaemonUnavailable(f"no daemon listening on {socket_path(path)} ({e})")
+        sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as reply:
+            line = reply.readline()
+    finally:
+        sock.close()
+    if not line:
+        raise DaemonUnavailable("the daemon closed the connection without a reply")
+    return json.loads(line)
+
+
+def start_daemon(path: str | None, ports: list[str], extra: list[str]) -> dict:
+    """Start AM_daemon.py in the background unless it already runs."""
+    try:
+        return request({"op": "status"}, path)
+    except DaemonUnavailable:
+        pass
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "AM_daemon.py")]
+    command += ["--socket", socket_path(path)] + [arg for port in ports for arg in ("--port", port)] + extra
+    subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,  # outlives the shell that started it
+    )
+    deadline = time.monotonic() + START_TIMEOUT
+    while True:
+        try:
+            return request({"op": "status"}, path)
+        except DaemonUnavailable:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def local_arg(path: str) -> str:
+    """Absolute form of a local path, the daemon has its own working directory."""
+    absolute = os.path.abspath(path)
+    return absolute + os.sep if path.endswith(("/", os.sep)) else absolute
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", help=f"daemon socket, default ${SOCKET_ENV} or {DEFAULT_SOCKET}")
+    parser.add_argument("--port", help=f"serial port, default ${PORT_ENV} or the daemon's default board")
+    parser.add_argument("--json", action="store_true", help="print the daemon's reply as JSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    start = commands.add_parser("start", help="start the daemon in the background")
+    start.add_argument("--session-idle", type=float, help="close a board's session after this many idle seconds")
+    start.add_argument("--idle-exit", type=float, help="stop the daemon after this many idle seconds")
+    commands.add_parser("status", help="open sessions and request counts")
+    commands.add_parser("close", help="close the session of --port")
+    commands.add_parser("shutdown", help="stop the daemon")
+
+    ls = commands.add_parser("ls", help="list a remote directory")
+    ls.add_argument("path", nargs="?", default="/")
+    ls.add_argument("-l", "--long", action="store_true")
+    ls.add_argument("-r", "--recursive", action="store_true")
+
+    cat = commands.add_parser("cat", help="print a remote file or a byte range of it")
+    cat.add_argument("remote")
+    cat.add_argument("--start", type=int, default=0, help="first byte, negative counts from the end")
+    cat.add_argument("--length", type=int, help="number of bytes, default to the end")
+
+    put = commands.add_parser("put", help="upload a file or folder")
+    put.add_argument("local")
+    put.add_argument("remote", nargs="?")
+    put.add_argument("-r", "--recursive", action="store_true")
+    put.add_argument("--compress", action="store_true")
+    put.add_argument("--mpy", action="store_true")
+    put.add_argument("--delta", action="store_true")
+
+    sync = commands.add_parser("sync", help="upload the changes of a folder")
+    sync.add_argument("local")
+    sync.add_argument("-r", "--recursive", action="store_true")
+    sync.add_argument("--prune", action="store_true")
+    sync.add_argument("--compress", action="store_true")
+    sync.add_argument("--mpy", action="store_true")
+    sync.add_argument("--delta", action="store_true")
+
+    get = commands.add_parser("get", help="download a file, or a folder when REMOTE ends with /")
+    get.add_argument("remote")
+    get.add_argument("local")
+    get.add_argument("--compress", action="store_true")
+
+    rm = commands.add_parser("rm", help="delete a path, or files matching --pattern")
+    rm.add_argument("path", nargs="?")
+    rm.add_argument("--pattern")
+    rm.add_argument("-r", "--recursive", action="store_true")
+    rm.add_argument("--remove-dirs", action="store_true")
+
+    mkdir = commands.add_parser("mkdir", help="create a remote directory and its parents")
+    mkdir.add_argument("path")
+
+    run = commands.add_parser("run", help="run a local script on the board")
+    run.add_argument("local")
+    run.add_argument("--timeout", type=float)
+    run.add_argument("--no-wait", action="store_true")
+    return parser
+
+
+def build_request(args) -> dict:
+    """Turn the parsed command line into the daemon's request dict."""
+    command = args.command
+    message = {"op": command}
+    if command == "ls":
+        message.update(path=args.path, long=args.long, recursive=args.recursive)
+    elif command == "cat":
+        message.update(remote=args.remote, start=args.start, length=args.length)
+    elif command == "put":
+        message.update(local=local_arg(args.local), recursive=args.recursive)
+        if args.remote:
+            message["remote"] = args.remote
+        for flag in ("compress", "mpy", "delta"):
+            if getattr(args, flag):
+                message[flag] = True
+    elif command == "sync":
+        message.update(local=local_arg(args.local), recursive=args.recursive, prune=args.prune)
+        for flag in ("compress", "mpy", "delta"):
+            if getattr(args, flag):
+                message[flag] = True
+    elif command == "get":
+        message.update(remote=args.remote, local=local_arg(args.local), compress=args.compress)
+    elif command == "rm":
+        message.update({"pattern": args.pattern} if args.pattern else {"path": args.path})
+        message.update(recursive=args.recursive)
+        if args.pattern:
+            message["remove_dirs"] = args.remove_dirs
+    elif command == "mkdir":
+        message.update(path=args.path)
+    elif command == "run":
+        message = {"op": "run-script", "local": local_arg(args.local), "wait": not args.no_wait}
+        if args.timeout is not None:
+            message["timeout"] = args.timeout
+    port = args.port or os.environ.get(PORT_ENV)
+    if port:
+        message["port"] = port
+    return message
+
+
+def print_reply(args, reply: dict):
+    if args.json:
+        print(json.dumps(reply, indent=2))
+    elif not reply.get("ok"):
+        print(f"{args.command} failed: {reply.get('error', 'unknown error')}", file=sys.stderr)
+    elif args.command == "ls":
+        print("\n".join(reply["entries"]))
+    elif args.command == "cat":
+        sys.stdout.buffer.write(base64.b64decode(reply["data"]))
+        sys.stdout.flush()
+    elif args.command == "run" and reply.get("output"):
+        print(reply["output"], end="")
+    elif args.command in ("start", "status"):
+        for port, info in reply["sessions"].items():
+            print(f"{port} {info['device']} idle {info['idle']:.0f}s, {info['requests']} requests")
+        if not reply["sessions"]:
+            print("no open sessions")
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "rm" and (args.path is None) == (args.pattern is None):
+        print("rm: give either a path or --pattern", file=sys.stderr)
+        return EXIT_FAILED
+    try:
+        if args.command == "start":
+            extra = []
+            if args.session_idle is not None:
+                extra += ["--session-idle", str(args.session_idle)]
+            if args.idle_exit is not None:
+                extra += ["--idle-exit", str(args.idle_exit)]
+            port = args.port or os.environ.get(PORT_ENV)
+            reply = start_daemon(args.socket, [port] if port else [], extra)
+        else:
+            reply = request(build_request(args), args.socket)
+    except DaemonUnavailable as e:
+        print(f"{e}; start it with: python AM_client.py start", file=sys.stderr)
+        return EXIT_NO_DAEMON
+    print_reply(args, reply)
+    return EXIT_OK if reply.get("ok") else EXIT_FAILED
+
+
+if __name__ == "__main__":
+    sys.exit(main())
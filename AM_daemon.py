@@ -0,0 +1,310 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Connection daemon that keeps board sessions open for AM_client.
+
+Every `AM_main.py` launch scans the ports, resets the board and tunes the
+link before doing any work. The daemon does that once per board and then
+serves requests from `AM_client.py` over a Unix socket (POSIX only), one
+JSON line per request and reply:
+
+    {"op": "put", "port": "/dev/ttyACM0", "local": "/abs/main.py", "remote": "/main.py"}
+
+The put, get, rm, sync and run-script ops take the same keys as job file
+steps (see AM_jobs); ls, cat, mkdir, close, status and shutdown are served
+here. Requests for one port run one at a time, different ports in parallel.
+A board's session is closed after `--session-idle` seconds without requests
+and the daemon stops after `--idle-exit` seconds without any.
+
+    python AM_daemon.py --port /dev/ttyACM0 --session-idle 300 --idle-exit 3600
+"""
+
+import argparse
+import base64
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+
+import serial
+
+import AM_jobs
+import AM_main
+from AM_client import DaemonUnavailable, request, socket_path
+from AM_ports import discover_boards
+from AM_session import SessionError
+
+SESSION_IDLE = 300.0  # seconds without requests before a board's session is closed, 0 = never
+IDLE_EXIT = 0.0  # seconds without requests before the daemon stops, 0 = never
+JANITOR_INTERVAL = 1.0  # seconds between idle checks
+
+
+# --- daemon-only ops ---
+# Same (com_port, step, job) signature as the AM_jobs steps.
+
+
+def op_ls(com_port, step, job):
+    session = AM_main.get_session(com_port)
+    return {"entries": session.ls(step.get("path", "/"), step.get("long", False), step.get("recursive", False))}
+
+
+def op_cat(com_port, step, job):
+    data, offset, size = AM_main.get_session(com_port).read_range(
+        step["remote"], step.get("start") or 0, step.get("length")
+    )
+    return {"data": base64.b64encode(data).decode("ascii"), "offset": offset, "size": size}
+
+
+def op_mkdir(com_port, step, job):
+    AM_main.get_session(com_port).makedirs([step["path"]])
+    AM_main.index_add_dirs(com_port, [step["path"]])
+    return {"created": step["path"]}
+
+
+STEP_KEYS = {
+    **AM_jobs.STEP_KEYS,
+    "ls": ((), ("path", "long", "recursive")),
+    "cat": (("remote",), ("start", "length")),
+    "mkdir": (("path",), ()),
+}
+STEPS = {**AM_jobs.STEPS, "ls": op_ls, "cat": op_cat, "mkdir": op_mkdir}
+
+
+class SessionManager:
+    """Open sessions, per-port locks and idle bookkeeping shared by all clients."""
+
+    def __init__(self, ports=(), session_idle: float = SESSION_IDLE, idle_exit: float = IDLE_EXIT):
+        self.default_ports = list(ports)
+        self.session_idle = session_idle
+        self.idle_exit = idle_exit
+        self.lock = threading.Lock()
+        self.port_locks: dict[str, threading.Lock] = {}
+        self.last_used: dict[str, float] = {}
+        self.requests: dict[str, int] = {}
+        self.active = 0
+        self.started = self.last_request = time.monotonic()
+        self.stop_requested = False
+        self.stopping = threading.Event()
+
+    def port_lock(self, com_port: str) -> threading.Lock:
+        with self.lock:
+            return self.port_locks.setdefault(com_port, threading.Lock())
+
+    def open_session(self, com_port: str):
+        """Open a board's session outside a request and start its idle clock."""
+        with self.port_lock(com_port):
+            AM_main.get_session(com_port)
+            self.last_used[com_port] = time.monotonic()
+
+    def default_port(self) -> str | None:
+        """The board for requests without a port: the one given at start,
+        the only open one, or the first found by a single scan."""
+        with self.lock:
+            if not self.default_ports:
+                open_ports = [p for p, s in list(AM_main._sessions.items()) if s.is_open]
+                if len(open_ports) > 1:
+                    return None
+                if open_ports:
+                    return open_ports[0]
+                boards = discover_boards()
+                if boards:
+                    self.default_ports.append(boards[0].device)
+            return self.default_ports[0] if self.default_ports else None
+
+    def handle(self, message: dict) -> dict:
+        op = message.get("op")
+        if op == "status":
+            return self.status()
+        if op == "shutdown":
+            self.stop_requested = True
+            return {"ok": True}
+        com_port = message.pop("port", None) or self.default_port()
+        if com_port is None:
+            return {"ok": False, "error": "no board given and none to default to, pass a port"}
+        if op == "close":
+            with self.port_lock(com_port):
+                closed = self.close_session(com_port)
+            return {"ok": True, "closed": closed}
+        try:
+            AM_jobs.validate_job({"steps": [message]}, STEP_KEYS)
+        except AM_jobs.JobError as e:
+            return {"ok": False, "error": str(e).replace("step 1", "request", 1)}
+
+        with self.lock:
+            self.active += 1
+        try:
+            with self.port_lock(com_port):
+                try:
+                    result = AM_jobs.run_step(com_port, message, {}, STEPS)
+                finally:
+                    self.last_used[com_port] = time.monotonic()
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.requests[com_port] = self.requests.get(com_port, 0) + 1
+                self.last_request = time.monotonic()
+        result["port"] = AM_main.port_device(com_port)
+        print(f"{result['port']} {op}: {'ok' if result['ok'] else 'FAILED ' + result['error']}", flush=True)
+        return result
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        sessions = {}
+        for com_port, session in list(AM_main._sessions.items()):
+            if session.is_open:
+                sessions[AM_main.port_device(com_port)] = {
+                    "device": AM_main.device_label(com_port, session),
+                    "idle": round(now - self.last_used.get(com_port, self.started), 1),
+                    "requests": self.requests.get(com_port, 0),
+                }
+        return {
+            "ok": True,
+            "pid": os.getpid(),
+            "uptime": round(now - self.started, 1),
+            "active": self.active,
+            "sessions": sessions,
+        }
+
+    def close_session(self, com_port: str) -> bool:
+        """Close one board's session, keeping its index and link profile; caller holds the port lock."""
+        session = AM_main._sessions.get(com_port)
+        if session is None:
+            return False
+        AM_main.save_index(com_port)
+        AM_main._indexes.pop(com_port, None)
+        if AM_main.TUNE_LINK:
+            AM_main.save_link_profiles()
+        AM_main._sessions.pop(com_port, None)
+        session.close()
+        self.last_used.pop(com_port, None)
+        return True
+
+    def janitor(self, server):
+        """Close idle sessions and stop the server once idle for `idle_exit`."""
+        while not self.stopping.wait(JANITOR_INTERVAL):
+            now = time.monotonic()
+            for com_port in list(AM_main._sessions):  # however it was opened, the clock has to be running
+                self.last_used.setdefault(com_port, now)
+            for com_port, last in list(self.last_used.items()):
+                if not self.session_idle or now - last < self.session_idle:
+                    continue
+                lock = self.port_lock(com_port)
+                if lock.acquire(blocking=False):  # a busy port is not idle
+                    try:
+                        if self.close_session(com_port):
+                            print(f"{AM_main.port_device(com_port)}: closed after {self.session_idle:.0f}s idle", flush=True)
+                    finally:
+                        lock.release()
+            if self.idle_exit and not self.active and now - self.last_request > self.idle_exit:
+                print(f"idle for {self.idle_exit:.0f}s, stopping", flush=True)
+                server.shutdown()
+                return
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Serves JSON-line requests until the client hangs up."""
+
+    def handle(self):
+        manager = self.server.manager
+        for line in self.rfile:
+            try:
+                message = json.loads(line)
+                if not isinstance(message, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as e:
+                reply = {"ok": False, "error": f"invalid request: {e}"}
+            else:
+                reply = manager.handle(message)
+            self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+            self.wfile.flush()
+            if manager.stop_requested:
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, manager: SessionManager):
+        self.manager = manager
+        super().__init__(path, RequestHandler)
+
+
+def bind(path: str, manager: SessionManager) -> DaemonServer:
+    """Listen on `path`, replacing a stale socket but never a live daemon."""
+    os.makedirs(os.path.dirname(path) or ".", mode=0o700, exist_ok=True)
+    if os.path.exists(path):
+        try:
+            request({"op": "status"}, path, timeout=5)
+        except DaemonUnavailable:
+            os.remove(path)  # left behind by a daemon that did not stop cleanly
+        else:
+            raise SystemExit(f"a daemon is already listening on {path}")
+    umask = os.umask(0o177)  # the socket is for this user only
+    try:
+        return DaemonServer(path, manager)
+    finally:
+        os.umask(umask)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", help="socket path, default $AMPY_SOCKET or ~/.ampy_manager/daemon.sock")
+    parser.add_argument("--port", action="append", default=[], help="board to open at start, repeatable; the first is the default")
+    parser.add_argument("--session-idle", type=float, default=SESSION_IDLE, help="close idle sessions after this many seconds, 0 = never")
+    parser.add_argument("--idle-exit", type=float, default=IDLE_EXIT, help="stop after this many idle seconds, 0 = never")
+    args = parser.parse_args(argv)
+
+    path = socket_path(args.socket)
+    manager = SessionManager(args.port, args.session_idle, args.idle_exit)
+    server = bind(path, manager)
+    for com_port in args.port:
+        try:
+            manager.open_session(com_port)
+        except (SessionError, serial.SerialException, OSError) as e:  # may be plugged in later
+            print(f"{com_port}: not opened ({e})", flush=True)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    janitor = threading.Thread(target=manager.janitor, args=(server,), daemon=True)
+    janitor.start()
+    print(f"ampy daemon {os.getpid()} listening on {path}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.stopping.set()
+        server.server_close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        AM_main.close_sessions()
+        AM_main.export_metrics()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
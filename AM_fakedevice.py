@@ -0,0 +1,319 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Simulated MicroPython board on a pseudo-terminal (POSIX only).
+
+The fake speaks the friendly and raw REPL protocol on the slave end of a pty,
+so `AmpySession` (or `ampy`) can open `FakeDevice.port` like a real serial
+port. Code sent to it runs in CPython with `os`, `open`, `machine` and friends
+redirected to a temporary directory that stands in for the board's flash.
+
+Link speed and the UART receive buffer can be limited to make timings and
+overflow behaviour resemble real hardware.
+"""
+
+import binascii
+import builtins
+import hashlib
+import io
+import os
+import pty
+import select
+import shutil
+import tempfile
+import threading
+import time
+import tty
+import types
+import zlib
+
+RAW_REPL_BANNER = b"raw REPL; CTRL-B to exit\r\n>"
+FRIENDLY_BANNER = b"\r\nMicroPython fake; AmpyManager simulated board\r\nType \"help()\" for more information.\r\n>>> "
+
+
+class _DeflateIO:
+    """Stand-in for MicroPython's `deflate.DeflateIO` built on CPython zlib."""
+
+    def __init__(self, stream, format=0, wbits=0, close=False):
+        self.stream = stream
+        self.inflater = zlib.decompressobj()
+        self.deflater = None
+        self.pending = b""
+        self.wbits = wbits or 15
+
+    def readinto(self, buf):
+        while len(self.pending) < len(buf):
+            raw = self.stream.read(256)
+            if not raw:
+                self.pending += self.inflater.flush()
+                break
+            self.pending += self.inflater.decompress(raw)
+        n = min(len(buf), len(self.pending))
+        buf[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+
+    def read(self, size=-1):
+        buf = bytearray(size if size > 0 else 65536)
+        return bytes(buf[: self.readinto(buf)])
+
+    def write(self, data):
+        if self.deflater is None:
+            self.deflater = zlib.compressobj(9, zlib.DEFLATED, self.wbits)
+        self.stream.write(self.deflater.compress(bytes(data)))
+        return len(data)
+
+    def close(self):
+        if self.deflater is not None:
+            self.stream.write(self.deflater.flush())
+            self.deflater = None
+
+
+class FakeDevice:
+    """A pty-backed board with a temp-dir filesystem.
+
+    `baudrate` (0 = unlimited) delays every byte in both directions like a
+    UART would. `rx_buffer` (0 = unlimited) is how many bytes the board can
+    take in one burst; anything beyond is dropped, like an overflowing UART
+    FIFO. `platform` is what `sys.platform` reports on the board.
+    """
+
+    def __init__(
+        self,
+        root: str | None = None,
+        baudrate: int = 0,
+        rx_buffer: int = 0,
+        platform: str = "rp2",
+        unique_id: bytes = b"\xfa\xce\x00\x01",
+    ):
+        self._own_root = root is None
+        self.root = root or tempfile.mkdtemp(prefix="ampy_fake_")
+        self.baudrate = baudrate
+        self.rx_buffer = rx_buffer
+        self.platform = platform
+        self.unique_id = unique_id
+        self.port = None
+        self.dropped_bytes = 0
+        self._raw = False
+        self._code = bytearray()
+        self._namespace = {}
+        self._running = False
+        self._master = self._slave = None
+        self._thread = None
+
+    # --- lifecycle ---
+    def start(self) -> "FakeDevice":
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(1)
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+        if self._own_root:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- filesystem helpers ---
+    def local_path(self, path: str) -> str:
+        """Where the board path `path` lives on the host."""
+        return os.path.join(self.root, os.path.normpath("/" + path).lstrip("/"))
+
+    def clear(self):
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+    # --- serial side ---
+    def _delay(self, num_bytes: int):
+        if self.baudrate:
+            time.sleep(num_bytes * 10 / self.baudrate)  # 8N1: ten bits per byte
+
+    def _write(self, data: bytes):
+        self._delay(len(data))
+        os.write(self._master, data)
+
+    def _serve(self):
+        while self._running:
+            try:
+                readable, _, _ = select.select([self._master], [], [], 0.1)
+                if not readable:
+                    continue
+                data = os.read(self._master, 4096)
+            except OSError:
+                return
+            if self.rx_buffer and self._raw and len(data) > self.rx_buffer:
+                self.dropped_bytes += len(data) - self.rx_buffer
+                data = data[: self.rx_buffer]
+            self._delay(len(data))
+            for byte in data:
+                self._feed(byte)
+
+    def _feed(self, byte: int):
+        if not self._raw:
+            if byte == 0x01:
+                self._raw = True
+                self._code.clear()
+                self._write(b"\r\n" + RAW_REPL_BANNER)
+            elif byte == 0x03:
+                self._write(b"\r\nKeyboardInterrupt\r\n>>> ")
+            elif byte == 0x04:
+                self._namespace = {}
+                self._write(b"MPY: soft reboot" + FRIENDLY_BANNER)
+            return
+
+        if byte == 0x01:  # restart the raw REPL
+            self._code.clear()
+            self._write(b"\r\n" + RAW_REPL_BANNER)
+        elif byte == 0x02:
+            self._raw = False
+            self._write(FRIENDLY_BANNER)
+        elif byte == 0x03:
+            self._code.clear()
+        elif byte == 0x04:
+            if not self._code:
+                self._namespace = {}
+                self._write(b"OK\r\nMPY: soft reboot\r\n" + RAW_REPL_BANNER)
+                return
+            code = self._code.decode("utf-8", "replace")
+            self._code.clear()
+            self._write(b"OK")
+            out, err = self._execute(code)
+            self._write(out + b"\x04" + err + b"\x04>")
+        else:
+            self._code.append(byte)
+
+    # --- code execution ---
+    def _execute(self, code: str) -> tuple[bytes, bytes]:
+        out = io.StringIO()
+        modules = self._modules(out)
+
+        def fake_import(name, *args, **kwargs):
+            if name in modules:
+                return modules[name]
+            raise ImportError(f"no module named '{name}'")
+
+        def fake_open(path, mode="r", *args, **kwargs):
+            return open(self.local_path(path), mode, *args, **kwargs)
+
+        def fake_print(*args, **kwargs):
+            kwargs.pop("file", None)
+            builtins.print(*args, file=out, **kwargs)
+
+        fake_builtins = dict(vars(builtins))
+        fake_builtins.update(__import__=fake_import, open=fake_open, print=fake_print)
+        self._namespace["__builtins__"] = fake_builtins
+        try:
+            exec(compile(code, "<stdin>", "exec"), self._namespace)
+        except BaseException as e:  # the board reports everything, even SystemExit
+            error = f"Traceback (most recent call last):\r\n  File \"<stdin>\"\r\n{type(e).__name__}: {e}\r\n"
+            return self._crlf(out.getvalue()), error.encode()
+        return self._crlf(out.getvalue()), b""
+
+    @staticmethod
+    def _crlf(text: str) -> bytes:
+        return text.replace("\n", "\r\n").encode("utf-8")
+
+    def _modules(self, out) -> dict:
+        device = self
+
+        def stat(path):
+            st = os.stat(device.local_path(path))
+            mode = 0x4000 if os.path.isdir(device.local_path(path)) else 0x8000
+            return (mode, 0, 0, 0, 0, 0, st.st_size, int(st.st_atime), int(st.st_mtime), int(st.st_ctime))
+
+        def ilistdir(path="/"):
+            for name in sorted(os.listdir(device.local_path(path))):
+                full = os.path.join(device.local_path(path), name)
+                kind = 0x4000 if os.path.isdir(full) else 0x8000
+                yield (name, kind, 0, os.path.getsize(full) if kind == 0x8000 else 0)
+
+        fake_os = types.SimpleNamespace(
+            listdir=lambda path="/": sorted(os.listdir(device.local_path(path))),
+            ilistdir=ilistdir,
+            stat=stat,
+            remove=lambda path: os.remove(device.local_path(path)),
+            rmdir=lambda path: os.rmdir(device.local_path(path)),
+            mkdir=lambda path: os.mkdir(device.local_path(path)),
+            rename=lambda old, new: os.replace(device.local_path(old), device.local_path(new)),
+            statvfs=lambda path: (4096, 4096, 1024, 512, 512, 0, 0, 0, 0, 255),
+            uname=lambda: ("fake", "fake", "1.22.0", "fake", device.platform),
+        )
+
+        def set_uart(uart_id, baudrate=None, **kwargs):
+            if uart_id == 0 and baudrate and device.baudrate:
+                device.baudrate = baudrate  # the simulated link follows the REPL UART
+
+        fake_sys = types.SimpleNamespace(
+            stdout=out,
+            platform=self.platform,
+            implementation=types.SimpleNamespace(name="micropython", version=(1, 22, 0), _mpy=0x0206),
+        )
+        fake_time = types.SimpleNamespace(
+            sleep=time.sleep,
+            sleep_ms=lambda ms: time.sleep(ms / 1000),
+            ticks_ms=lambda: int(time.monotonic() * 1000),
+            ticks_diff=lambda a, b: a - b,
+            time=time.time,
+        )
+        fake_machine = types.SimpleNamespace(
+            unique_id=lambda: self.unique_id,
+            reset=lambda: None,
+            soft_reset=lambda: None,
+            UART=set_uart,
+        )
+        fake_deflate = types.SimpleNamespace(DeflateIO=_DeflateIO, AUTO=0, RAW=1, ZLIB=2, GZIP=3)
+        fake_gc = types.SimpleNamespace(collect=lambda: None, mem_free=lambda: 100_000, mem_alloc=lambda: 20_000)
+        return {
+            "os": fake_os,
+            "uos": fake_os,
+            "sys": fake_sys,
+            "time": fake_time,
+            "utime": fake_time,
+            "machine": fake_machine,
+            "binascii": binascii,
+            "ubinascii": binascii,
+            "hashlib": hashlib,
+            "uhashlib": hashlib,
+            "deflate": fake_deflate,
+            "zlib": zlib,
+            "io": io,
+            "gc": fake_gc,
+            "micropython": types.SimpleNamespace(const=lambda x: x),
+        }
@@ -0,0 +1,117 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Host-side cache of a device's file tree.
+
+One index per board, keyed by `machine.unique_id()`, stored as JSON so it
+survives restarts. Operations done by this tool update it in place; anything
+else that may have touched the board is covered by a freshness TTL.
+"""
+
+import json
+import os
+import time
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".ampy_manager")
+INDEX_DIR = os.path.join(CACHE_DIR, "index")
+INDEX_TTL = 300  # seconds before a cached listing is rebuilt from the device
+
+
+def parent_dir(path: str) -> str:
+    parent = path.rstrip("/").rsplit("/", 1)[0]
+    return parent or "/"
+
+
+class RemoteIndex:
+    """Paths, types and sizes of everything on one device."""
+
+    def __init__(self, device_id: str):
+        self.device_id = device_id
+        self.entries: dict[str, dict] = {}
+        self.refreshed_at = 0.0
+        self.dirty = False
+
+    @property
+    def path(self) -> str:
+        return os.path.join(INDEX_DIR, f"{self.device_id}.json")
+
+    @classmethod
+    def load(cls, device_id: str) -> "RemoteIndex":
+        index = cls(device_id)
+        try:
+            with open(index.path, "r") as f:
+                data = json.load(f)
+            index.entries = data["entries"]
+            index.refreshed_at = data["refreshed_at"]
+        except (OSError, ValueError, KeyError):
+            pass  # no usable cache yet, the caller will rebuild it
+        return index
+
+    def save(self):
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(
+                {"refreshed_at": self.refreshed_at, "entries": self.entries},
+                f,
+                sort_keys=True,
+            )
+        os.replace(temp_path, self.path)
+        self.dirty = False
+
+    def is_fresh(self, ttl: float = INDEX_TTL) -> bool:
+        return bool(self.refreshed_at) and time.time() - self.refreshed_at < ttl
+
+    def rebuild(self, entries: list[tuple[str, str, int]]):
+        """Replace the index with `(path, "f" | "d", size)` entries from a walk."""
+        self.entries = {
+            path: {"type": kind, "size": size} for path, kind, size in entries
+        }
+        self.refreshed_at = time.time()
+        self.dirty = True
+
+    # --- in-place updates for operations done by this tool ---
+    def add_dir(self, path: str):
+        while path not in ("", "/") and path not in self.entries:
+            self.entries[path] = {"type": "d", "size": 0}
+            path = parent_dir(path)
+        self.dirty = True
+
+    def add_file(self, path: str, size: int):
+        self.add_dir(parent_dir(path))
+        self.entries[path] = {"type": "f", "size": size}
+        self.dirty = True
+
+    def remove(self, path: str):
+        prefix = path.rstrip("/") + "/"
+        for entry in [p for p in self.entries if p == path or p.startswith(prefix)]:
+            del self.entries[entry]
+        self.dirty = True
+
+    def listing(self, directory: str = "/") -> list[tuple[str, str, int]]:
+        """Direct children of `directory`, sorted, as `(path, type, size)`."""
+        directory = directory.rstrip("/") or "/"
+        return sorted(
+            (path, entry["type"], entry["size"])
+            for path, entry in self.entries.items()
+            if parent_dir(path) == directory
+        )
@@ -0,0 +1,355 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Run a job file of device operations without any prompts.
+
+A job is a JSON (or, with PyYAML installed, YAML) document:
+
+    port: COM3              # optional, the first board found otherwise
+    on_error: abort         # or "continue"; steps may override it
+    compress: false
+    mpy: false              # upload folders as .mpy bytecode, see AM_mpy
+    delta: false            # patch changed blocks of large files already on the board
+    bundle: 2048            # folder files up to this size go in bundles, 0 = off
+    steps:
+      - {op: put, local: main.py, remote: /main.py}
+      - {op: sync, local: app/, recursive: true, prune: true}
+      - {op: run-script, local: selftest.py, timeout: 30}  # seconds the script may run
+      - {op: get, remote: /log.csv, local: out/}
+      - {op: rm, path: /old.py}
+      - {op: rm, pattern: "*.tmp", recursive: true, on_error: continue}
+
+All steps share one connection (and with it the tuned link, the file index
+and the metrics of the run). The result is written as JSON to stdout or
+`--output`; progress goes to stderr. Exit codes: 0 every step succeeded,
+1 a step failed, 2 the job file is invalid, 3 no device could be reached.
+
+    python AM_jobs.py provision.yaml --port /dev/ttyACM0 --output result.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+import serial
+
+import AM_main
+from AM_metrics import outcome_of
+from AM_ports import discover_boards
+from AM_session import SessionError
+
+EXIT_OK = 0
+EXIT_STEP_FAILED = 1
+EXIT_INVALID_JOB = 2
+EXIT_NO_DEVICE = 3
+
+ON_ERROR_POLICIES = ("abort", "continue")
+# op -> (required keys, optional keys)
+STEP_KEYS = {
+    "put": (("local",), ("remote", "recursive", "include", "exclude", "compress", "mpy", "delta", "bundle")),
+    "get": (("remote", "local"), ("include", "exclude", "compress")),
+    "rm": ((), ("path", "pattern", "recursive", "remove_dirs")),
+    "sync": (("local",), ("recursive", "prune", "include", "exclude", "compress", "mpy", "delta", "bundle")),
+    "run-script": (("local",), ("timeout", "wait")),
+}
+COMMON_KEYS = ("op", "on_error", "name")
+
+
+class JobError(Exception):
+    """The job file cannot be run as written."""
+
+
+class StepError(Exception):
+    """A step ran but did not do everything it was asked to."""
+
+
+def load_job(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if path.lower().endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise JobError("YAML job files need PyYAML (pip install pyyaml), or use JSON")
+        try:
+            job = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise JobError(f"invalid YAML: {e}")
+    else:
+        try:
+            job = json.loads(text)
+        except ValueError as e:
+            raise JobError(f"invalid JSON: {e}")
+    validate_job(job)
+    return job
+
+
+def validate_job(job, step_keys=STEP_KEYS):
+    """Check the whole job up front, so a typo in step 9 does not strike after step 8.
+
+    `step_keys` maps the allowed ops to their (required, optional) keys.
+    """
+    if not isinstance(job, dict) or not isinstance(job.get("steps"), list):
+        raise JobError("a job needs a 'steps' list")
+    if job.get("on_error", "abort") not in ON_ERROR_POLICIES:
+        raise JobError(f"on_error must be one of {', '.join(ON_ERROR_POLICIES)}")
+    for number, step in enumerate(job["steps"], 1):
+        if not isinstance(step, dict) or step.get("op") not in step_keys:
+            raise JobError(f"step {number}: 'op' must be one of {', '.join(step_keys)}")
+        required, optional = step_keys[step["op"]]
+        missing = [key for key in required if key not in step]
+        if missing:
+            raise JobError(f"step {number} ({step['op']}): missing {', '.join(missing)}")
+        unknown = set(step) - set(required) - set(optional) - set(COMMON_KEYS)
+        if unknown:
+            raise JobError(f"step {number} ({step['op']}): unknown keys {', '.join(sorted(unknown))}")
+        if step.get("on_error", "abort") not in ON_ERROR_POLICIES:
+            raise JobError(f"step {number}: on_error must be one of {', '.join(ON_ERROR_POLICIES)}")
+        if step["op"] == "rm" and ("path" in step) == ("pattern" in step):
+            raise JobError(f"step {number} (rm): give either 'path' or 'pattern'")
+
+
+# --- steps ---
+# Each takes (com_port, step, job) and returns a dict of details for the result.
+
+
+def step_put(com_port, step, job):
+    local = step["local"]
+    if os.path.isdir(local):
+        if step.get("remote", AM_main.ROOT_DIR) != AM_main.ROOT_DIR:
+            raise JobError("folders are uploaded below the device root, leave out 'remote'")
+        return upload_folder(com_port, local, step, job, sync=False)
+    remote = step.get("remote") or AM_main.ROOT_DIR + os.path.basename(local)
+    if not os.path.isfile(local):
+        raise StepError(f"{local} does not exist")
+    # the same retries and link recovery as every other upload
+    if not AM_main.ensure_remote_dirs(com_port, [remote], set()):
+        raise StepError(f"folders for {remote} could not be created")
+    stats = AM_main.upload_single(
+        com_port,
+        local,
+        remote,
+        compress=step.get("compress", job.get("compress", False)),
+        delta=step.get("delta", job.get("delta", False)),
+    )
+    if stats is None:
+        raise StepError(f"{remote} could not be uploaded")
+    return {"uploaded": [remote], **stats}
+
+
+def step_sync(com_port, step, job):
+    return upload_folder(com_port, step["local"], step, job, sync=True)
+
+
+def upload_folder(com_port, local_dir, step, job, sync):
+    report = AM_main.upload_from_dir(
+        com_port,
+        local_dir,
+        sync=sync,
+        prune=sync and step.get("prune", False),
+        recursive=step.get("recursive", False),
+        include=step.get("include"),
+        exclude=step.get("exclude", AM_main.DEFAULT_EXCLUDES),
+        compile_mpy=step.get("mpy", job.get("mpy", False)),
+        delta=step.get("delta", job.get("delta", False)),
+        bundle=step.get("bundle", job.get("bundle")),
+        compress=step.get("compress", job.get("compress", False)),
+    )
+    if report is None:
+        raise StepError(f"{local_dir} does not exist")
+    if report["failed"]:
+        raise StepError(f"{len(report['failed'])} file(s) failed", report)
+    return report
+
+
+def step_get(com_port, step, job):
+    remote, local = step["remote"], step["local"]
+    session = AM_main.get_session(com_port)
+    compress = step.get("compress", job.get("compress", False))
+    if remote.endswith("/"):
+        base = remote.rstrip("/")
+        files = []
+        for path, kind, _ in session.walk(remote):
+            rel_path = path[len(base) + 1 :]
+            if (
+                kind == "f"
+                and not AM_main.is_excluded(rel_path, step.get("exclude", AM_main.DEFAULT_EXCLUDES))
+                and AM_main.is_included(rel_path, step.get("include"))
+            ):
+                files.append((path, AM_main.local_path(local, rel_path)))
+    elif local.endswith(("/", os.sep)) or os.path.isdir(local):
+        files = [(remote, os.path.join(local, os.path.basename(remote)))]
+    else:
+        files = [(remote, local)]
+
+    downloaded, num_bytes = [], 0
+    for remote_file, local_file in files:
+        os.makedirs(os.path.dirname(local_file) or ".", exist_ok=True)
+        num_bytes += session.download_file(remote_file, local_file, compress)["raw_bytes"]
+        downloaded.append(local_file)
+    return {"downloaded": downloaded, "raw_bytes": num_bytes}
+
+
+def step_rm(com_port, step, job):
+    session = AM_main.get_session(com_port)
+    if "path" in step:
+        path = step["path"]
+        if step.get("recursive"):
+            session.rmdir(path)
+        else:
+            session.rm(path)
+        AM_main.index_remove(com_port, [path])
+        return {"deleted": [path], "failed": []}
+    report = session.delete_matching(
+        step["pattern"], AM_main.ROOT_DIR, step.get("recursive", False), step.get("remove_dirs", False)
+    )
+    AM_main.index_remove(com_port, report["deleted"])
+    report = {"deleted": report["deleted"], "failed": [path for path, _ in report["failed"]]}
+    if report["failed"]:
+        raise StepError(f"{len(report['failed'])} path(s) could not be deleted", report)
+    return report
+
+
+def step_run_script(com_port, step, job):
+    session = AM_main.get_session(com_port)
+    if not step.get("wait", True):
+        session.run(step["local"], wait_output=False)
+        return {"output": ""}
+    output = session.run(step["local"], limit=step.get("timeout"))
+    return {"output": output.decode("utf-8", "replace")}
+
+
+STEPS = {
+    "put": step_put,
+    "get": step_get,
+    "rm": step_rm,
+    "sync": step_sync,
+    "run-script": step_run_script,
+}
+
+
+def run_step(com_port: str, step: dict, job: dict, steps=STEPS) -> dict:
+    """Run one step and describe how it went; never raises for device trouble.
+
+    `steps` maps ops to their step functions.
+    """
+    result = {"op": step["op"], "name": step.get("name", ""), "ok": True, "error": ""}
+    start = time.monotonic()
+    try:
+        with AM_main.measured(com_port, step["op"]):
+            result.update(steps[step["op"]](com_port, step, job))
+    except StepError as e:
+        result.update(ok=False, error=str(e.args[0]))
+        if len(e.args) > 1:
+            result.update(e.args[1])
+    except (JobError, SessionError, serial.SerialException, OSError) as e:
+        result.update(ok=False, error=str(e), outcome=outcome_of(e))
+        if result["outcome"] in ("link_error", "timeout"):
+            # interrupt whatever still runs, or reconnect, so the next step finds a ready board
+            AM_main.recover_session(com_port)
+    result["seconds"] = round(time.monotonic() - start, 4)
+    return result
+
+
+def run_job(job: dict, com_port: str) -> dict:
+    steps = job["steps"]
+    results = []
+    start = time.monotonic()
+    for number, step in enumerate(steps, 1):
+        result = run_step(com_port, step, job)
+        result["step"] = number
+        results.append(result)
+        print(
+            f"step {number}/{len(steps)} {step['op']}: {'ok' if result['ok'] else 'FAILED ' + result['error']}",
+            file=sys.stderr,
+        )
+        if not result["ok"] and step.get("on_error", job.get("on_error", "abort")) == "abort":
+            break
+    for number, step in enumerate(steps[len(results) :], len(results) + 1):
+        results.append({"step": number, "op": step["op"], "name": step.get("name", ""), "ok": False, "skipped": True})
+    session = AM_main._sessions.get(com_port)
+    return {
+        "ok": all(r["ok"] for r in results),
+        "port": AM_main.port_device(com_port),
+        "device": AM_main.device_label(com_port, session),
+        "seconds": round(time.monotonic() - start, 4),
+        "steps": results,
+    }
+
+
+def pick_port(requested: str | None) -> str | None:
+    if requested:
+        return requested
+    boards = discover_boards()
+    return boards[0].device if boards else None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("job", help="job file, .json or .yaml")
+    parser.add_argument("--port", help="serial port, overrides the job's 'port'")
+    parser.add_argument("--on-error", choices=ON_ERROR_POLICIES, help="overrides the job's 'on_error'")
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    args = parser.parse_args(argv)
+
+    def finish(result: dict, code: int) -> int:
+        result["exit_code"] = code
+        text = json.dumps(result, indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(text + "\n")
+        else:
+            print(text)
+        return code
+
+    try:
+        job = load_job(args.job)
+    except (OSError, JobError) as e:
+        return finish({"ok": False, "error": f"{args.job}: {e}"}, EXIT_INVALID_JOB)
+    if args.on_error:
+        job["on_error"] = args.on_error
+
+    com_port = pick_port(args.port or job.get("port"))
+    if com_port is None:
+        return finish({"ok": False, "error": "no MicroPython board found"}, EXIT_NO_DEVICE)
+
+    # progress output of the shared helpers stays off the machine-readable stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            AM_main.get_session(com_port)
+        except (SessionError, serial.SerialException) as e:
+            result, code = {"ok": False, "port": com_port, "error": str(e)}, EXIT_NO_DEVICE
+        else:
+            try:
+                result = run_job(job, com_port)
+                code = EXIT_OK if result["ok"] else EXIT_STEP_FAILED
+            finally:
+                AM_main.close_sessions()
+                AM_main.export_metrics()
+    return finish(result, code)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Checkpoint journals for multi-file transfers.
+
+A journal records, one line per event, which files of a bulk upload or
+download were started and which finished. When the same transfer is run
+again after an interruption, finished files are skipped and the one that
+was cut off is resumed instead of restarted. The journal is removed once a
+run completes without failures, and ignored once it is `JOURNAL_MAX_AGE` old.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from AM_index import CACHE_DIR
+
+JOURNAL_DIR = os.path.join(CACHE_DIR, "journal")
+JOURNAL_MAX_AGE = 7 * 24 * 3600  # seconds; an older run is started over
+
+
+class TransferJournal:
+    """Progress of one bulk transfer, identified by its kind and parameters."""
+
+    def __init__(self, kind: str, *key):
+        digest = hashlib.sha1(json.dumps([kind, *key]).encode()).hexdigest()[:16]
+        self.path = os.path.join(JOURNAL_DIR, f"{kind}-{digest}.log")
+        self.started: set[str] = set()
+        self.done: dict[str, list] = {}  # name -> fingerprint when it finished
+        self.written: dict[str, list] = {}  # name -> [sha256, size] of what was written
+        self._file = None
+
+    @classmethod
+    def open(cls, kind: str, *key) -> "TransferJournal":
+        journal = cls(kind, *key)
+        try:
+            if time.time() - os.path.getmtime(journal.path) > JOURNAL_MAX_AGE:
+                os.remove(journal.path)
+                return journal
+            with open(journal.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event, name, fingerprint, *written = json.loads(line)
+                    except ValueError:
+                        continue  # the last line may be cut off by a crash
+                    if event == "start":
+                        journal.started.add(name)
+                    elif event == "done":
+                        journal.done[name] = fingerprint
+                        if written and written[0]:
+                            journal.written[name] = written[0]
+        except OSError:
+            pass
+        return journal
+
+    @property
+    def resuming(self) -> bool:
+        return bool(self.started or self.done)
+
+    def is_done(self, name: str, fingerprint) -> bool:
+        """True when `name` finished and still has the same `fingerprint` (e.g. size and mtime)."""
+        return self.done.get(name) == list(fingerprint)
+
+    def confirm(self, remote: dict):
+        """Forget finished files the target no longer holds as they were written.
+
+        `remote` maps names to what `AmpySession.hash_files` reports now;
+        files finished without a record of what was written are forgotten too.
+        """
+        for name in list(self.done):
+            written = self.written.get(name)
+            found = remote.get(name)
+            if not written or not found:
+                del self.done[name]
+            elif found[0] == "sha256" and found[1] != written[0]:
+                del self.done[name]
+            elif found[0] == "stat" and found[1] != written[1]:
+                del self.done[name]
+
+    def was_interrupted(self, name: str) -> bool:
+        return name in self.started and name not in self.done
+
+    def _write(self, event: str, name: str, fingerprint, written=None):
+        if self._file is None:
+            os.makedirs(JOURNAL_DIR, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps([event, name, list(fingerprint), written]) + "\n")
+        self._file.flush()  # survive the process being killed mid-transfer
+
+    def start(self, name: str):
+        self.started.add(name)
+        self._write("start", name, ())
+
+    def finish(self, name: str, fingerprint, data: bytes | None = None):
+        """Mark `name` finished; `data` is what was written, for `confirm`."""
+        self.done[name] = list(fingerprint)
+        written = None
+        if data is not None:
+            written = self.written[name] = [hashlib.sha256(data).hexdigest(), len(data)]
+        self._write("done", name, fingerprint, written)
+
+    def close(self, completed: bool):
+        """Keep the journal for the next run unless everything went through."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if completed:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
@@ -20,29 +20,339 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import codecs
+import contextlib
+import fnmatch
+import hashlib
+import itertools
+import json
 import os
+import re
+import shutil
+import sys
 import time
 import threading
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from colorama import Fore, Style
 from tqdm import tqdm
 
+import serial
+
+from AM_index import CACHE_DIR, RemoteIndex, parent_dir
+from AM_journal import TransferJournal
+from AM_metrics import Metrics
+from AM_mpy import (
+    COMPILER_ENV,
+    CompileError,
+    MpyCache,
+    bytecode_version,
+    find_compiler,
+    mpy_name,
+    should_compile,
+)
+from AM_ports import PortInfo, discover_boards, wait_for_port_change
+from AM_pipeline import Pipeline
+from AM_session import AmpySession, DeviceError, SessionError, TransferCancelled, deflate
+
 __version__ = "01.02.00.00"  # code untested ! beyond com port seeker
 
 
 # --- ampy wrapper ---
+USE_SESSION = True  # serve commands over one persistent raw-REPL connection instead of spawning ampy
+COMPRESS_TRANSFERS = False  # deflate file transfers when the firmware supports it (session backend only)
+TUNE_LINK = True  # raise the baud rate and size transfer chunks per device, remembered between runs
+COMPILE_MPY = False  # upload .py files (except main.py/boot.py) as .mpy bytecode compiled for the board
+DELTA_UPLOADS = False  # patch only the changed blocks of large files that already exist on the device
+UPLOAD_WORKERS = 4  # threads reading, compressing and compiling files ahead of the serial link
+UPLOAD_BUFFER_BYTES = 16 * 1024 * 1024  # prepared upload payloads held in memory at once
+BUNDLE_THRESHOLD = 2048  # folder uploads send files up to this size in bundles, 0 = each on its own
+BUNDLE_MAX_BYTES = 32 * 1024  # file data per bundle
+RESUME_RETRIES = 2  # reconnects per file transfer after a broken link, each continuing where it stopped
+RESUME_DELAY = 1.0  # seconds to let a glitching USB port come back before reconnecting, doubled per retry
+RESUME_MAX_DELAY = 10.0
+LINK_FAILURE_LIMIT = 3  # operations in a row failing on a lost link before the board is skipped
+LINK_RETRY_AFTER = 30.0  # seconds a skipped board is left alone before it is tried again
+AMPY_TIMEOUT = 60.0  # seconds an ampy process gets on top of its share of the link time
+AMPY_BAUDRATE = 115200  # link speed ampy runs at, for sizing its timeout
+LINK_PROFILES_FILE = os.path.join(CACHE_DIR, "links.json")
+METRICS_DIR = os.path.join(CACHE_DIR, "metrics")
+SHOW_THROUGHPUT = False  # live per-board throughput summary above the menu
+NO_BOARD_RESCAN = 10.0  # seconds between rescans while no board answers, only new or changed ports are probed
+TAIL_LINES = 10  # lines shown by head/tail and before following a file
+FOLLOW_INTERVAL = 1.0  # seconds between size polls when following a file
+_sessions: dict[str, AmpySession] = {}
+_indexes: dict[str, RemoteIndex] = {}
+_link_failures: dict[str, tuple[int, float]] = {}  # port -> (failures in a row, time of the last)
+_sync_state_lock = threading.Lock()  # fleet uploads share one folder's sync state
+METRICS = Metrics()
+
+
+def port_device(com_port: str) -> str:
+    # bare numbers are the old Windows style, e.g. "3" -> "COM3"
+    return "COM" + com_port if com_port.isdigit() else com_port
+
+
+def port_label(com_port: str) -> str:
+    """Filesystem-safe name for a port, used for per-device folders and files."""
+    return re.sub(r"[^\w.-]", "_", port_device(com_port)).strip("_")
+
+
+def board_id(com_port: str) -> str:
+    """Unique ID of the board on `com_port` for per-device state, else the port label."""
+    if USE_SESSION:
+        try:
+            return get_session(com_port).unique_id() or port_label(com_port)
+        except (SessionError, serial.SerialException):
+            pass
+    return port_label(com_port)
+
+
+def get_session(com_port: str) -> AmpySession:
+    """Return the open session for `com_port`, connecting on first use."""
+    session = _sessions.get(com_port)
+    if session is None:
+        session = AmpySession(port_device(com_port))
+        _sessions[com_port] = session
+    if not session.is_open:
+        session.open()
+        if TUNE_LINK:
+            tune_session(com_port, session)
+    return session
+
+
+def load_link_profiles() -> dict:
+    try:
+        with open(LINK_PROFILES_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def tune_session(com_port: str, session: AmpySession):
+    """Start from the link settings that worked last time, or negotiate new ones."""
+    device_id = session.unique_id() or port_label(com_port)
+    profile = load_link_profiles().get(device_id)
+    try:
+        if profile:
+            session.apply_link_profile(profile)
+        else:
+            session.upgrade_baudrate()
+    except (SessionError, serial.SerialException) as e:
+        print(f"{Fore.YELLOW}Link tuning skipped: {e}{Style.RESET_ALL}")
+
+
+def save_link_profiles():
+    profiles = load_link_profiles()
+    for com_port, session in list(_sessions.items()):
+        if not session.is_open:
+            continue
+        try:
+            device_id = session.unique_id() or port_label(com_port)
+        except (SessionError, serial.SerialException):
+            continue
+        profiles[device_id] = session.link_profile()
+    try:
+        os.makedirs(os.path.dirname(LINK_PROFILES_FILE), exist_ok=True)
+        with open(LINK_PROFILES_FILE, "w") as f:
+            json.dump(profiles, f, indent=1, sort_keys=True)
+    except OSError as e:
+        print(f"{Fore.YELLOW}Could not save link settings: {e}{Style.RESET_ALL}")
+
+
+def device_label(com_port: str, session: AmpySession | None) -> str:
+    """Device ID for metrics; falls back to the port when the board was not identified yet."""
+    device_id = session.known_unique_id if session is not None else None
+    return device_id or port_label(com_port)
+
+
+def measured(com_port: str, op: str):
+    """Record the enclosed block as one operation in `METRICS`."""
+    return METRICS.operation(
+        op,
+        port_device(com_port),
+        lambda: _sessions.get(com_port),
+        lambda session: device_label(com_port, session),
+    )
+
+
+def recover_session(com_port: str) -> bool:
+    """Get a stalled board answering again (interrupt, soft reset, reopen).
+
+    The session is dropped when nothing works, so the next call connects anew.
+    """
+    session = _sessions.get(com_port)
+    if session is None:
+        return False
+    try:
+        step = session.recover()
+    except SessionError:
+        _sessions.pop(com_port, None)
+        return False
+    print(f"{Fore.YELLOW}{port_device(com_port)} answers again after: {step}.{Style.RESET_ALL}")
+    return True
+
+
+def link_down(com_port: str) -> bool:
+    """True while a board that kept failing is being skipped."""
+    failures, last = _link_failures.get(com_port, (0, 0.0))
+    return failures >= LINK_FAILURE_LIMIT and time.monotonic() - last < LINK_RETRY_AFTER
+
+
+def retry_delay(attempt: int) -> float:
+    return min(RESUME_MAX_DELAY, RESUME_DELAY * 2**attempt)
+
+
+def session_call(com_port: str, action: str, operation, op: str = "call", retries: int = 0):
+    """Run `operation(session)` and report failures like `run_ampy_command` does.
+
+    Returns (success, result). A stalled or broken link is recovered
+    (interrupt, soft reset, reopen, see `AmpySession.recover`); up to
+    `retries` times the operation is then run again after a growing pause,
+    so it must be safe to repeat. After `LINK_FAILURE_LIMIT` calls in a row
+    lost the link, further calls fail at once for `LINK_RETRY_AFTER`
+    seconds, so bulk loops skip a dead board instead of waiting on every
+    file. Every attempt is recorded in `METRICS` as `op`.
+    """
+    if link_down(com_port):
+        print(f"{Fore.RED}{action} skipped, {port_device(com_port)} is not answering.{Style.RESET_ALL}")
+        return False, None
+    for attempt in range(retries + 1):
+        try:
+            with measured(com_port, op):
+                result = operation(get_session(com_port))
+            _link_failures.pop(com_port, None)
+            return True, result
+        except DeviceError as e:
+            print(f"{Fore.RED}{action} failed: {e}{Style.RESET_ALL}")
+        except (SessionError, serial.SerialException) as e:
+            recover_session(com_port)
+            if attempt < retries:
+                print(f"{Fore.YELLOW}{action}: connection lost ({e}), retrying...{Style.RESET_ALL}")
+                time.sleep(retry_delay(attempt))
+                continue
+            failures, _ = _link_failures.get(com_port, (0, 0.0))
+            _link_failures[com_port] = (failures + 1, time.monotonic())
+            print(f"{Fore.RED}{action} failed, connection lost: {e}{Style.RESET_ALL}")
+        except KeyboardInterrupt:
+            recover_session(com_port)  # leave the board ready for the next command
+            raise
+        except OSError as e:
+            print(f"{Fore.RED}{action} failed: {e}{Style.RESET_ALL}")
+        return False, None
+
+
+def close_sessions():
+    for com_port in list(_indexes):
+        save_index(com_port)
+    _indexes.clear()
+    if TUNE_LINK:
+        save_link_profiles()
+    for session in _sessions.values():
+        session.close()
+    _sessions.clear()
+    _link_failures.clear()
+
+
+# --- Remote file index ---
+def load_index(com_port: str) -> RemoteIndex:
+    """In-memory index of the device, loaded from its cache file on first use."""
+    index = _indexes.get(com_port)
+    if index is None:
+        device_id = get_session(com_port).unique_id() or port_label(com_port)
+        index = _indexes[com_port] = RemoteIndex.load(device_id)
+    return index
+
+
+def get_index(com_port: str, refresh: bool = False) -> RemoteIndex | None:
+    """Cached file tree of the device, rebuilt with one walk when stale."""
+    try:
+        index = load_index(com_port)
+        if refresh or not index.is_fresh():
+            with measured(com_port, "walk"):
+                index.rebuild(get_session(com_port).walk(ROOT_DIR))
+    except (SessionError, serial.SerialException) as e:
+        print(f"{Fore.RED}Could not read the device file tree: {e}{Style.RESET_ALL}")
+        return None
+    save_index(com_port)
+    return index
+
+
+def save_index(com_port: str):
+    index = _indexes.get(com_port)
+    if index is not None and index.dirty:
+        try:
+            index.save()
+        except OSError as e:
+            print(f"{Fore.YELLOW}Could not save the file index: {e}{Style.RESET_ALL}")
+
+
+def update_index(com_port: str, update):
+    """Apply `update(index)` so the cache follows our own changes to the device."""
+    if not USE_SESSION:
+        return
+    try:
+        update(load_index(com_port))
+    except (SessionError, serial.SerialException):
+        pass  # the next listing rebuilds the index anyway
+
+
+def index_add_file(com_port: str, remote_file: str, size: int):
+    update_index(com_port, lambda index: index.add_file(remote_file, size))
+
+
+def index_add_dirs(com_port: str, remote_dirs):
+    update_index(com_port, lambda index: [index.add_dir(d) for d in remote_dirs])
+
+
+def index_remove(com_port: str, remote_paths):
+    update_index(com_port, lambda index: [index.remove(p) for p in remote_paths])
+
+
+def ampy_timeout(ampy_args: list[str]) -> float | None:
+    """Seconds an ampy process may run: `AMPY_TIMEOUT` plus four times the link
+    time of the file it sends. None for `run`, which waits for the user's script."""
+    if ampy_args and ampy_args[0] == "run" and "-n" not in ampy_args and "--no-output" not in ampy_args:
+        return None
+    size = 0
+    if len(ampy_args) > 1 and ampy_args[0] == "put":
+        try:
+            size = os.path.getsize(ampy_args[1])
+        except OSError:
+            pass
+    return AMPY_TIMEOUT + 4 * size * 10 / AMPY_BAUDRATE
+
+
 def run_ampy_command(
     com_port: str,
     ampy_args: list[str],
     capture_output: bool = True,
     check_errors: bool = True,
 ) -> tuple[bool, str, str]:
-    cmd = ["ampy", "-p", "COM" + com_port] + ampy_args
+    if USE_SESSION:
+        return run_session_command(com_port, ampy_args, capture_output, check_errors)
+
+    cmd = ["ampy", "-p", port_device(com_port)] + ampy_args
+    op = ampy_args[0] if ampy_args else "ampy"
     try:
         # Universal newlines handles different line endings, text=True decodes output
-        process = subprocess.run(
-            cmd, text=True, capture_output=capture_output, check=False
-        )
+        with measured(com_port, op) as operation:
+            start = time.monotonic()
+            try:
+                process = subprocess.run(
+                    cmd, text=True, capture_output=capture_output, check=False, timeout=ampy_timeout(ampy_args)
+                )
+            except subprocess.TimeoutExpired as e:
+                # the process is killed; the next ampy call interrupts the board again
+                operation.outcome = "timeout"
+                operation.error = f"timed out after {e.timeout:.0f} s"
+                print(f"{Fore.RED}Ampy command timed out after {e.timeout:.0f} s: {' '.join(cmd)}{Style.RESET_ALL}")
+                return False, "", operation.error
+            # spawn, board reset and transfer all happen inside ampy
+            operation.phases["process"] = time.monotonic() - start
+            if process.returncode != 0:
+                operation.outcome = "error"
+                operation.error = (process.stderr or "").strip()
 
         if check_errors and process.returncode != 0:
             print(f"{Fore.RED}Ampy command failed: {' '.join(cmd)}{Style.RESET_ALL}")
@@ -71,10 +381,42 @@ def run_ampy_command(
         return False, "", ""
 
 
+def run_session_command(
+    com_port: str,
+    ampy_args: list[str],
+    capture_output: bool = True,
+    check_errors: bool = True,
+) -> tuple[bool, str, str]:
+    """Same contract as `run_ampy_command`, served by the persistent session."""
+    cmd = " ".join(["ampy", "-p", port_device(com_port)] + ampy_args)
+    op = ampy_args[0] if ampy_args else "ampy"
+    try:
+        with measured(com_port, op) as operation:
+            session = get_session(com_port)
+            success, stdout, stderr = session.run_ampy(ampy_args)
+            if not success:
+                operation.outcome = "error"
+                operation.error = stderr.strip()
+    except (SessionError, serial.SerialException) as e:
+        print(f"{Fore.RED}Could not connect to {port_device(com_port)}: {e}{Style.RESET_ALL}")
+        return False, "", str(e)
+
+    if check_errors and not success:
+        print(f"{Fore.RED}Ampy command failed: {cmd}{Style.RESET_ALL}")
+        if stderr:
+            print(f"{Fore.RED}Error: {stderr.strip()}{Style.RESET_ALL}")
+    if not capture_output and stdout:
+        print(stdout)
+    return success, stdout.strip(), stderr.strip()
+
+
 # --- Helper Functions ---
 SEPARATOR = "-" * 30
 INPUT_SIGN = ">>>"
 ROOT_DIR = "/"
+SYNC_STATE_FILE = ".ampy_sync.json"  # per-directory record of the last sync, one entry per board
+DEFAULT_EXCLUDES = ("__pycache__", "*.pyc", ".git")
+UPLOAD_BATCH = 64  # files per batch, the remote folders a batch needs are created in one call
 HELP_DOC = f"""
 --- ABOUT ---
 
@@ -93,7 +435,10 @@ It provides various options to display file content, upload and download files,
 
 1. **Display File Content:**
     - Display the content of a file on the device.
-    - Usage: Select option 1 -> Enter destination path of the file on the device.
+    - Usage: Select option 1 -> Enter destination path of the file on the device -> Choose a view:
+      all, head or tail (first/last N lines), a byte range, or follow (show the tail, then print whatever
+      is appended until Ctrl-C). Only the requested part is transferred; output pauses after every
+      screenful, press 'q' at the prompt to stop. Views other than "all" need the session backend.
 
 2. **Upload Single File:**
     - Upload a single file to the device.
@@ -101,7 +446,11 @@ It provides various options to display file content, upload and download files,
 
 3. **Upload Multiple Files:**
     - Upload multiple files from a local directory to the device.
-    - Usage: Select option 3 -> Enter the source directory path for the files.
+    - Usage: Select option 3 -> Enter the source directory path for the files -> Choose whether to include
+      subdirectories (folder structure is kept, `__pycache__`/`*.pyc` are skipped by default) -> Choose whether to
+      upload only new or changed files (compared by content hash) and whether to delete device files missing locally.
+    - Files up to 2 KB are packed into bundles of about 32 KB that the board unpacks as they arrive, so a folder
+      of many small files costs a few transfers instead of one per file.
 
 4. **Download Single File:**
     - Download a single file from the device to the local machine.
@@ -112,6 +461,7 @@ It provides various options to display file content, upload and download files,
     - Download multiple files from the device to a local directory.
     - Usage: Select option 5 -> Enter the remote file paths to download (separated by comma) -> Enter the local
       directory to save downloaded files.
+    - Enter a single folder ending with '/' (e.g. `/lib/`) to download it with all subfolders.
 
 6. **Delete Single File:**
     - Delete a single file from the device.
@@ -124,13 +474,53 @@ It provides various options to display file content, upload and download files,
 8. **Delete Everything:**
     - Delete all files from the device.
 
-9. **Rescan COM Ports:**
-    - Rescan available COM ports to select a different one.
+9. **Rescan Ports:**
+    - Rescan serial ports (COMx on Windows, /dev/ttyUSB*, /dev/ttyACM* on Linux) to select a different board.
+    - Only ports answering with a MicroPython REPL are listed. Probe results are cached, type 'r' in the port
+      list to probe every port again. With no board present the tool waits for one to be plugged in.
 
 10. **Exit:**
     - Exit the script.
 
-11. **Help:**
+11. **Compressed Transfers:**
+    - Toggle deflate-compressed uploads and downloads. Falls back to raw transfer when the device firmware
+      has no `deflate`/`zlib` module. Per-file stats show compressed versus raw size and throughput.
+
+12. **Fleet Operations:**
+    - Run an upload, download or delete on many devices at once, one worker thread per port.
+    - Usage: Select option 12 -> Enter ports (comma separated) or 'all' -> Choose the operation -> Enter how many
+      devices may be served at once. Downloads go to one sub-folder per device. A summary lists each device.
+
+13. **Refresh Device Listing:**
+    - The listing above the menu is served from a per-device cache that this tool keeps up to date and
+      rebuilds every few minutes. This option rebuilds it from the device right away.
+
+14. **Throughput Summary:**
+    - Every operation is measured: wall time split into connect, reset, send, device and host phases (or the
+      whole ampy process with the subprocess backend), bytes sent and received, retries and outcome, tagged
+      with the port and the board's unique ID.
+    - This option toggles a summary line per board above the menu (throughput, failures, retries, median
+      latency), handy for spotting slow boards and bad cables.
+
+15. **Export Metrics:**
+    - Write the measurements of this run to ~/.ampy_manager/metrics: `ampy-<time>.jsonl` with one record per
+      operation, and `ampy.prom` with totals in the Prometheus text format. Both are also written on exit.
+
+16. **Precompile to .mpy:**
+    - Toggle compiling `.py` files to `.mpy` bytecode when uploading a folder (option 3). Fewer bytes are sent
+      and the board no longer compiles at import, which avoids MemoryError on small boards. `main.py` and
+      `boot.py` stay source; a `.py` left on the device next to its new `.mpy` is removed.
+    - Needs `mpy-cross` matching the firmware's bytecode version, on PATH or listed in AMPY_MPY_CROSS.
+      Compiled files are cached in ~/.ampy_manager/mpy.
+
+17. **Delta Uploads:**
+    - Toggle patching large files (8 KB and up) that already exist on the device: the board hashes its copy
+      in 1 KB blocks, only the blocks that differ are sent and written in place, and the whole file is
+      hashed again afterwards. Small edits to big data files then take a fraction of a full upload.
+    - The file is rewritten in place rather than replaced: a patch that does not verify is followed by
+      a normal upload, but an interrupted one leaves a mixed file until the next upload.
+
+18. **Help:**
     - Display the help documentation.
     - Usage: Type 'help' when prompted for an option.
 
@@ -147,8 +537,132 @@ def clear_screen():
     os.system("cls" if os.name == "nt" else "clear")
 
 
+def page_lines() -> int:
+    """Lines per page of remote file output, 0 when stdout is not a terminal."""
+    if not sys.stdout.isatty():
+        return 0
+    return max(shutil.get_terminal_size().lines - 2, 1)
+
+
+def print_remote(selected_com, selected_file, read) -> bool:
+    """Print what `read(session, printer)` feeds to `printer.write`, paged.
+
+    Answering 'q' at a page prompt stops the transfer early; that counts as
+    success, the rest of the file is simply not fetched.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    printer = StreamPrinter(decoder, page_lines())
+    print(SEPARATOR)
+    try:
+        success, _ = session_call(
+            selected_com,
+            f"Reading {selected_file}",
+            lambda session: read(session, printer),
+            op="read",
+        )
+    except TransferCancelled:
+        success = True
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        print(tail, end="")
+    if success:
+        if not printer.printed:
+            print("(File is empty or no content to display)")
+        print()
+        print(SEPARATOR)
+    else:
+        print(f"{Fore.RED}Failed to display file content.{Style.RESET_ALL}")
+    return success
+
+
+def display_file_lines(selected_com, selected_file, first: int, count: int = TAIL_LINES):
+    """Show `count` lines from line `first` (0-based), or the last `-first` lines.
+
+    The board finds the byte range of the lines, only those bytes are sent.
+    """
+
+    def read(session, printer):
+        start, end, _ = session.line_span(selected_file, first, count)
+        session.read_range(selected_file, start, end - start, printer.write)
+
+    print("Fetching file content...")
+    if print_remote(selected_com, selected_file, read):
+        print("File content displayed.")
+
+
+def display_file_range(selected_com, selected_file, start: int, length: int | None = None):
+    """Show `length` bytes (to the end when None) from byte offset `start`."""
+    print("Fetching file content...")
+    if print_remote(
+        selected_com,
+        selected_file,
+        lambda session, printer: session.read_range(selected_file, start, length, printer.write),
+    ):
+        print("File content displayed.")
+
+
+def follow_file(selected_com, selected_file, lines: int = TAIL_LINES, interval: float = FOLLOW_INTERVAL):
+    """Print the last `lines` lines, then whatever is appended, until Ctrl-C.
+
+    Every `interval` seconds the board is asked for the file size; bytes are
+    only transferred when it grew. A file that shrinks is followed from its
+    new start.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    position = None
+    polling = False
+
+    def poll(session):
+        start = position
+        if start is None:
+            start = session.line_span(selected_file, -lines, lines)[0]
+        return session.read_range(selected_file, start)
+
+    print(f"Following {selected_file}, press Ctrl-C to stop.")
+    print(SEPARATOR)
+    try:
+        while True:
+            polling = True
+            success, result = session_call(
+                selected_com, f"Following {selected_file}", poll, op="read", retries=RESUME_RETRIES
+            )
+            polling = False
+            if not success:
+                return False
+            data, offset, size = result
+            if position is not None and size < position:
+                print(f"\n{Fore.YELLOW}({selected_file} was truncated){Style.RESET_ALL}")
+                position = 0
+                continue
+            print(decoder.decode(data), end="", flush=True)
+            position = offset + len(data)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        if polling:  # stopped mid-command, the REPL may hold half a reply
+            session = _sessions.get(selected_com)
+            try:
+                if session is not None:
+                    session.resync()
+            except (SessionError, serial.SerialException, OSError):
+                _sessions.pop(selected_com, None)
+                session.close()
+        print()
+        print(SEPARATOR)
+        print("Stopped following.")
+        return True
+
+
 def display_file_content(selected_com, selected_file):
     print("Fetching file content...")
+    if USE_SESSION:
+        if print_remote(
+            selected_com,
+            selected_file,
+            lambda session, printer: session.download(selected_file, printer, COMPRESS_TRANSFERS),
+        ):
+            print("File content displayed.")
+        return
+
     success, output, error = run_ampy_command(
         selected_com, ["get", selected_file], capture_output=True
     )
@@ -176,95 +690,877 @@ def display_file_content(selected_com, selected_file):
         print(f"{Fore.RED}Failed to display file content.{Style.RESET_ALL}")
 
 
-def upload_single(com_port, local_file, remote_file):
+class StreamPrinter:
+    """Binary file-like sink that prints decoded chunks as they arrive.
+
+    With `page_lines`, output stops after that many lines until Enter is
+    pressed; answering 'q' raises TransferCancelled to end the transfer.
+    """
+
+    def __init__(self, decoder, page_lines: int = 0):
+        self.decoder = decoder
+        self.page_lines = page_lines
+        self.lines = 0
+        self.printed = 0
+
+    def write(self, chunk: bytes):
+        self.printed += len(chunk)
+        text = self.decoder.decode(chunk)
+        while text:
+            cut = len(text)
+            if self.page_lines:
+                end = -1
+                for _ in range(self.page_lines - self.lines):
+                    end = text.find("\n", end + 1)
+                    if end < 0:
+                        break
+                else:
+                    cut = end + 1
+            print(text[:cut], end="", flush=True)
+            self.lines += text.count("\n", 0, cut)
+            text = text[cut:]
+            if self.page_lines and self.lines >= self.page_lines:
+                self.lines = 0
+                answer = input(f"{Style.DIM}-- more -- Enter: next page, q: stop{Style.RESET_ALL} ")
+                if answer.strip().lower() == "q":
+                    raise TransferCancelled("stopped at the pager")
+
+
+def byte_progress(bar: tqdm):
+    """Adapt a tqdm bar to the `progress(new_bytes, total_bytes)` callback."""
+
+    def update(new_bytes: int, total_bytes: int):
+        if bar.total != total_bytes:
+            bar.total = total_bytes
+            bar.refresh()
+        bar.update(new_bytes)
+
+    return update
+
+
+def format_size(num_bytes: float) -> str:
+    if num_bytes < 1024:
+        return f"{int(num_bytes)} B"
+    if num_bytes < 1024 * 1024:
+        return f"{num_bytes / 1024:.1f} KB"
+    return f"{num_bytes / (1024 * 1024):.1f} MB"
+
+
+def print_transfer_stats(name: str, stats: dict):
+    rate = stats["raw_bytes"] / stats["seconds"] if stats["seconds"] > 0 else 0
+    if stats.get("patched"):
+        print(
+            f"{name}: {format_size(stats['raw_bytes'])} patched, "
+            f"{format_size(stats['wire_bytes'])} of changed blocks sent in {stats['seconds']:.2f}s"
+        )
+    elif stats["compressed"]:
+        ratio = stats["raw_bytes"] / stats["wire_bytes"] if stats["wire_bytes"] else 0
+        print(
+            f"{name}: {format_size(stats['raw_bytes'])} -> {format_size(stats['wire_bytes'])} "
+            f"compressed ({ratio:.1f}x), {format_size(rate)}/s effective"
+        )
+    else:
+        print(f"{name}: {format_size(stats['raw_bytes'])} raw, {format_size(rate)}/s")
+
+
+def print_stage_times(stages: dict, workers: int):
+    """Say whether the serial link or the host-side preparation held a bulk upload back."""
+    link, waited = stages.get("consume", 0.0), stages.get("wait", 0.0)
+    host = ", ".join(
+        f"{stage} {stages[stage]:.2f}s" for stage in ("stage", "read", "compress") if stages.get(stage)
+    )
+    bound = "host-bound" if waited > 0.1 * link else "link-bound"
+    print(
+        f"Link busy {link:.2f}s, idle {waited:.2f}s waiting for the host; "
+        f"host work {stages.get('prepare', 0.0):.2f}s on {workers} worker(s)"
+        + (f" ({host})" if host else "")
+        + f" -> {bound}"
+    )
+
+
+def print_failures(what: str, paths):
+    """List the files a bulk operation skipped after they failed."""
+    if paths:
+        print(f"{Fore.RED}{len(paths)} file(s) could not be {what}:{Style.RESET_ALL}")
+        for path in paths:
+            print(f"  {path}")
+
+
+def print_throughput_summary():
+    """One line per board: operations, errors, retries, link throughput and median latency."""
+    rows = METRICS.summary()
+    if not rows:
+        print("No operations measured yet.")
+    for row in rows:
+        color = Fore.RED if row["errors"] else Fore.GREEN
+        print(
+            f"{color}{row['port']} [{row['device']}]{Style.RESET_ALL}: {row['operations']} ops, "
+            f"{row['errors']} failed, {row['retries']} retries, "
+            f"{format_size(row['bytes_per_s'])}/s, median {row['median_s'] * 1000:.0f} ms"
+        )
+
+
+def export_metrics() -> tuple[str, str] | None:
+    """Write this run's measurements to METRICS_DIR as JSON lines and Prometheus text."""
+    if not METRICS.records:
+        return None
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    jsonl_path = os.path.join(METRICS_DIR, f"ampy-{stamp}.jsonl")
+    prom_path = os.path.join(METRICS_DIR, "ampy.prom")
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        METRICS.dump_jsonl(jsonl_path)
+        METRICS.dump_prometheus(prom_path)
+    except OSError as e:
+        print(f"{Fore.YELLOW}Could not save metrics: {e}{Style.RESET_ALL}")
+        return None
+    return jsonl_path, prom_path
+
+
+def upload_single(
+    com_port, local_file, remote_file, compress=None, resume=False, delta=None, payload=None
+):
+    """Upload one file; with `resume`, continue an earlier interrupted upload of it.
+
+    With `delta` (default `DELTA_UPLOADS`) a large file already on the device
+    is patched block by block instead of sent whole. `payload` is the
+    file's `(data, packed)` when it was read (and compressed) beforehand.
+    Returns the transfer stats (only `raw_bytes` with the ampy backend), or
+    None when the upload failed.
+    """
     print(f"Uploading {local_file} to {remote_file}...")
+    if USE_SESSION:
+        compress = COMPRESS_TRANSFERS if compress is None else compress
+        delta = DELTA_UPLOADS if delta is None else delta
+        resume_next = resume
+
+        def put(session):
+            nonlocal resume_next
+            resume, resume_next = resume_next, True  # a retry continues this attempt
+            if payload is not None:
+                data, packed = payload
+                return session.put_bytes(
+                    data, remote_file, compress, resume=resume, delta=delta, packed=packed
+                )
+            return session.put(local_file, remote_file, compress, resume=resume, delta=delta)
+
+        success, stats = session_call(
+            com_port, f"Upload of {local_file}", put, op="put", retries=RESUME_RETRIES
+        )
+        if success:
+            index_add_file(com_port, remote_file, stats["raw_bytes"])
+            if compress or stats["patched"]:
+                print_transfer_stats(remote_file, stats)
+            return stats
+        return None
+
     success, _, _ = run_ampy_command(
         com_port, ["put", local_file, remote_file], capture_output=False
     )  # Output not usually needed for put
+    if not success:
+        return None
+    size = os.path.getsize(local_file)
+    index_add_file(com_port, remote_file, size)
+    return {"raw_bytes": size}
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path: str) -> tuple[int, int] | None:
+    """Size and mtime of a local file, None when it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, int(st.st_mtime)
+
+
+def load_sync_state(local_dir: str, device_id: str | None = None) -> dict:
+    """What the last sync of `local_dir` left on the board `device_id`, all boards without it."""
+    try:
+        with open(os.path.join(local_dir, SYNC_STATE_FILE), "r") as f:
+            boards = json.load(f)
+    except (OSError, ValueError):
+        boards = {}
+    if device_id is None:
+        return boards
+    return boards.get(device_id, {})
+
+
+def save_sync_state(local_dir: str, device_id: str, state: dict):
+    """Replace the entry of `device_id`, keeping the other boards; callers hold `_sync_state_lock`."""
+    path = os.path.join(local_dir, SYNC_STATE_FILE)
+    boards = load_sync_state(local_dir)
+    boards[device_id] = state
+    try:
+        with open(path + ".tmp", "w") as f:
+            json.dump(boards, f, indent=1, sort_keys=True)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"{Fore.YELLOW}Could not save sync state: {e}{Style.RESET_ALL}")
+
+
+def is_excluded(rel_path: str, patterns) -> bool:
+    """True when any component of `rel_path`, or the whole path, matches."""
+    parts = rel_path.split("/")
+    return any(
+        fnmatch.fnmatch(rel_path, pattern) or any(fnmatch.fnmatch(part, pattern) for part in parts)
+        for pattern in patterns
+    )
+
+
+def is_included(rel_path: str, patterns) -> bool:
+    if not patterns:
+        return True
+    name = rel_path.rsplit("/", 1)[-1]
+    return any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(rel_path, p) for p in patterns)
+
+
+def walk_local_tree(local_dir, recursive=True, include=None, exclude=DEFAULT_EXCLUDES, prefix=""):
+    """Lazily yield the relative '/'-separated paths of files under `local_dir`.
+
+    Only one directory level is held in memory at a time, so huge trees
+    stream. Excluded directories are not descended into.
+    """
+    with os.scandir(local_dir) as entries:
+        entries = sorted(entries, key=lambda e: e.name)
+    for entry in entries:
+        rel_path = prefix + entry.name
+        if exclude and is_excluded(rel_path, exclude):
+            continue
+        if entry.is_dir():
+            if recursive:
+                yield from walk_local_tree(entry.path, True, include, exclude, rel_path + "/")
+        elif entry.is_file() and is_included(rel_path, include):
+            yield rel_path
+
+
+def local_path(local_dir: str, rel_path: str) -> str:
+    return os.path.join(local_dir, *rel_path.split("/"))
+
+
+def ensure_remote_dirs(com_port: str, remote_files, created: set) -> bool:
+    """Create the parent folders of `remote_files` that are not in `created` yet."""
+    missing = set()
+    for remote_file in remote_files:
+        folder = parent_dir(remote_file)
+        while folder != "/" and folder not in created:
+            missing.add(folder)
+            folder = parent_dir(folder)
+    if not missing:
+        return True
+
+    if USE_SESSION:
+        success, _ = session_call(
+            com_port,
+            "Creating folders",
+            lambda session: session.makedirs(missing),
+            op="mkdir",
+        )
+    else:
+        success = all(
+            run_ampy_command(com_port, ["mkdir", "--exists-okay", folder])[0]
+            for folder in sorted(missing, key=lambda p: p.count("/"))
+        )
+    if success:
+        created.update(missing)
+        index_add_dirs(com_port, missing)
     return success
 
 
-def upload_from_dir(selected_com, local_dir_id):
+def source_stage(local_dir: str):
+    """Upload plan of a file name: the file itself, same layout below the root directory."""
+    return lambda name: (local_path(local_dir, name), ROOT_DIR + name)
+
+
+def mpy_stage(com_port: str, local_dir: str):
+    """Like `source_stage`, but `.py` files become `.mpy` compiled for the board.
+
+    Returns None, after saying why, when the firmware cannot import `.mpy`
+    files or no installed mpy-cross emits its bytecode version.
+    """
+    try:
+        version = bytecode_version(get_session(com_port).mpy_version())
+    except (SessionError, serial.SerialException) as e:
+        print(f"{Fore.YELLOW}Could not read the bytecode version, uploading source: {e}{Style.RESET_ALL}")
+        return None
+    if version is None:
+        print(f"{Fore.YELLOW}The firmware cannot import .mpy files, uploading source.{Style.RESET_ALL}")
+        return None
+    compiler = find_compiler(version)
+    if compiler is None:
+        print(
+            f"{Fore.YELLOW}No mpy-cross for bytecode v{version[0]}.{version[1]} found "
+            f"(see {COMPILER_ENV}), uploading source.{Style.RESET_ALL}"
+        )
+        return None
+
+    cache = MpyCache(compiler)
+    plain = source_stage(local_dir)
+    staged = {}
+
+    def stage(name):
+        if name not in staged:
+            staged[name] = plain(name)
+            if should_compile(name):
+                try:
+                    staged[name] = (cache.compile(staged[name][0], name), ROOT_DIR + mpy_name(name))
+                except CompileError as e:
+                    print(f"{Fore.YELLOW}Could not compile {name}, uploading source: {e}{Style.RESET_ALL}")
+        return staged[name]
+
+    return stage
+
+
+def plan_sync(
+    session: AmpySession,
+    local_dir: str,
+    file_names: list[str],
+    prune: bool = False,
+    recursive: bool = False,
+    stage=None,
+    device_id: str | None = None,
+) -> tuple[list[str], list[str], dict, list[str]]:
+    """Work out which files actually need to go to the device.
+
+    Remote files are fingerprinted in one batched call. On firmware without
+    `hashlib` the remote size+mtime is compared against what was recorded in
+    `SYNC_STATE_FILE` right after the last upload of that file to the board
+    `device_id` (default: the session's unique ID); a board with no record
+    gets every such file. `stage` maps a file name to the (local file,
+    remote path) actually uploaded.
+
+    Returns (file names to upload, remote files to delete, local hashes,
+    remote folders to delete). Folders are only pruned when `recursive`.
+    """
+    stage = stage or source_stage(local_dir)
+    targets = {name: stage(name) for name in file_names}
+    state = load_sync_state(local_dir, device_id or session.unique_id())
+    local_hashes = {name: file_sha256(targets[name][0]) for name in file_names}
+    remote = session.hash_files([targets[name][1] for name in file_names])
+
+    to_upload = []
+    for name in file_names:
+        remote_path = targets[name][1]
+        fingerprint = remote.get(remote_path)
+        if fingerprint is None:
+            to_upload.append(name)
+        elif fingerprint[0] == "sha256":
+            if fingerprint[1] != local_hashes[name]:
+                to_upload.append(name)
+        else:
+            recorded = state.get(remote_path, {})
+            if (
+                recorded.get("sha256") != local_hashes[name]
+                or recorded.get("stat") != list(fingerprint[1:])
+            ):
+                to_upload.append(name)
+
+    to_delete = []
+    stale_dirs = []
+    if prune:
+        local_paths = {remote_path for _, remote_path in targets.values()}
+        local_dirs = set()
+        for remote_path in local_paths:
+            while (remote_path := parent_dir(remote_path)) != ROOT_DIR:
+                local_dirs.add(remote_path)
+        for remote_path, kind, _ in session.walk(ROOT_DIR):
+            if not recursive and parent_dir(remote_path) != ROOT_DIR:
+                continue
+            if kind == "f" and remote_path not in local_paths:
+                to_delete.append(remote_path)
+            elif kind == "d" and recursive and remote_path not in local_dirs:
+                stale_dirs.append(remote_path)
+        # removing the topmost stale folder takes its subfolders along
+        stale = set(stale_dirs)
+        stale_dirs = [path for path in stale_dirs if parent_dir(path) not in stale]
+        to_delete = [path for path in to_delete if not any(path.startswith(d + "/") for d in stale_dirs)]
+    return to_upload, to_delete, local_hashes, stale_dirs
+
+
+def upload_from_dir(
+    selected_com,
+    local_dir_id,
+    sync=False,
+    prune=False,
+    recursive=False,
+    include=None,
+    exclude=DEFAULT_EXCLUDES,
+    compile_mpy=None,
+    delta=None,
+    bundle=None,
+    bar=None,
+    compress=None,
+):
+    """Upload a local folder below the device root.
+
+    With `compile_mpy` (default `COMPILE_MPY`) sources go up as `.mpy` and
+    the `.py` files they replace are removed from the device. `delta`
+    and `compress` (default `COMPRESS_TRANSFERS`) are passed on to
+    `upload_single`. Files up to `bundle` bytes (default
+    `BUNDLE_THRESHOLD`, 0 turns it off) are sent together in bundles.
+    `bar` is a tqdm bar to count files on instead of drawing a new one.
+
+    Returns `{"uploaded": [...], "failed": [...], "deleted": [...],
+    "unchanged": n}` with remote paths, or None when the folder is missing.
+    Files an interrupted earlier run left on the device count as unchanged.
+    """
     if not os.path.exists(local_dir_id):
         print("Source directory does not exist.")
     else:
-        # Get a list of files in the local directory
-        files_to_upload = [
-            f
-            for f in os.listdir(local_dir_id)
-            if os.path.isfile(os.path.join(local_dir_id, f))
-        ]
-
-        if not files_to_upload:
-            print("No files found in the source directory.")
+        # Files of the local directory, streamed lazily unless sync needs them all up front
+        files_to_upload = walk_local_tree(
+            local_dir_id, recursive, include, tuple(exclude or ()) + (SYNC_STATE_FILE,)
+        )
 
-        else:
-            for file_name in tqdm(files_to_upload, desc="Uploading files", unit="file"):
-                local_file = os.path.join(local_dir_id, file_name)
-                remote_file = ROOT_DIR + file_name  # Upload to root directory
+        compile_mpy = COMPILE_MPY if compile_mpy is None else compile_mpy
+        stage = None
+        if compile_mpy and USE_SESSION:
+            stage = mpy_stage(selected_com, local_dir_id)
+        elif compile_mpy:
+            print(f"{Fore.YELLOW}Precompiling needs the session backend, uploading source.{Style.RESET_ALL}")
+        stage = stage or source_stage(local_dir_id)
+
+        to_delete = []
+        stale_dirs = []
+        local_hashes = {}
+        unchanged = 0
+        if sync and USE_SESSION:
+            files_to_upload = list(files_to_upload)
+            try:
+                session = get_session(selected_com)
+                all_files = files_to_upload
+                files_to_upload, to_delete, local_hashes, stale_dirs = plan_sync(
+                    session, local_dir_id, all_files, prune, recursive, stage, board_id(selected_com)
+                )
+            except (SessionError, serial.SerialException) as e:
+                print(f"{Fore.RED}Sync check failed, uploading everything: {e}{Style.RESET_ALL}")
+                sync = False
+            else:
+                unchanged = len(all_files) - len(files_to_upload)
+                print(
+                    f"{unchanged} file(s) unchanged, "
+                    f"{len(files_to_upload)} to upload, {len(to_delete) + len(stale_dirs)} to delete."
+                )
+        elif sync:
+            print(f"{Fore.YELLOW}Sync needs the session backend, uploading everything.{Style.RESET_ALL}")
+            sync = False
+
+        uploaded = []
+        resumed = []  # already on the device from an interrupted earlier run
+        failed = []
+        compiled = {}  # remote .mpy -> the device .py it replaces once it is uploaded
+        names = {}  # remote path -> local file name
+        seen = 0
+        created_dirs = set()
+        # a run cut short by a crash or unplugged board continues where it stopped
+        journal = TransferJournal.open(
+            "upload",
+            board_id(selected_com),
+            os.path.abspath(local_dir_id),
+            recursive,
+            sorted(include or ()),
+            sorted(exclude or ()),
+            compile_mpy,
+        )
+        if journal.done:
+            # only files still on the board exactly as written are skipped
+            remote = {}
+            if USE_SESSION:
+                remote = session_call(
+                    selected_com,
+                    "Checking files of the interrupted upload",
+                    lambda session: session.hash_files(list(journal.done)),
+                    op="put",
+                )[1] or {}
+            journal.confirm(remote)
+        if journal.resuming:
+            print(f"Resuming an interrupted upload, {len(journal.done)} file(s) already done.")
+        compress = (COMPRESS_TRANSFERS if compress is None else compress) and USE_SESSION
+        bundle = (BUNDLE_THRESHOLD if bundle is None else bundle) if USE_SESSION else 0
+        if compress:
+            try:
+                compress = get_session(selected_com).compression_support()["decompress"]
+            except (SessionError, serial.SerialException):
+                compress = False
+
+        def prepare(item):
+            """Host-side work for one file, done on a pipeline worker."""
+            _, file_name = item
+            with pipeline.times.measure("stage"):
+                local_file, remote_file = stage(file_name)
+            fingerprint = file_fingerprint(local_path(local_dir_id, file_name))
+            if fingerprint and journal.is_done(remote_file, fingerprint):
+                return local_file, remote_file, fingerprint, True, None
+            payload = None
+            if USE_SESSION:
+                with pipeline.times.measure("read"):
+                    with open(local_file, "rb") as f:
+                        data = f.read()
+                packed = None
+                if compress and len(data) > bundle:  # bundles are compressed as a whole
+                    with pipeline.times.measure("compress"):
+                        packed = deflate(data)
+                payload = (data, packed)
+            return local_file, remote_file, fingerprint, False, payload
+
+        def cost(item):
+            try:
+                return os.path.getsize(local_path(local_dir_id, item[1])) * (2 if compress else 1)
+            except OSError:
+                return 0
+
+        # each file comes with its batch, the remote folders of a batch are created together
+        pending = iter(files_to_upload)
+        batches = iter(lambda: list(itertools.islice(pending, UPLOAD_BATCH)), [])
+        pipeline = Pipeline(
+            ((batch, name) for batch in batches for name in batch),
+            prepare,
+            cost,
+            UPLOAD_WORKERS,
+            UPLOAD_BUFFER_BYTES,
+        )
+        bundled = []  # (file name, local file, remote file, fingerprint, data)
+
+        def flush_bundle(bar):
+            if not bundled:
+                return
+            files = list(bundled)
+            bundled.clear()
+            for _, _, remote_file, _, _ in files:
+                journal.start(remote_file)
+            success, stats = session_call(
+                selected_com,
+                f"Upload of {len(files)} bundled file(s)",
+                lambda session: session.put_bundle(
+                    [(remote_file, data) for _, _, remote_file, _, data in files], compress
+                ),
+                op="put",
+                retries=RESUME_RETRIES,
+            )
+            if success and compress:
+                print_transfer_stats(f"{len(files)} bundled files", stats)
+            elif not success:
+                print(f"{Fore.YELLOW}Uploading the {len(files)} bundled file(s) one by one.{Style.RESET_ALL}")
+            for file_name, local_file, remote_file, fingerprint, data in files:
+                if success or upload_single(
+                    selected_com, local_file, remote_file, compress=compress, payload=(data, None)
+                ):
+                    if success:
+                        index_add_file(selected_com, remote_file, len(data))
+                    journal.finish(remote_file, fingerprint or (), data)
+                    uploaded.append(remote_file)
+                else:
+                    print(f"{Fore.RED}Failed to upload {file_name}{Style.RESET_ALL}")
+                    failed.append(remote_file)
+                bar.update(1)
+
+        total = len(files_to_upload) if isinstance(files_to_upload, list) else None
+        batch = skipped = None
+        if bar is None:
+            bar_context = tqdm(total=total, desc="Uploading files", unit="file")
+        else:  # a fleet run counts on the board's own bar
+            bar.reset(total=total)
+            bar_context = contextlib.nullcontext(bar)
+        with bar_context as bar:
+            for (item_batch, file_name), prepared, error in pipeline:
+                if item_batch is not batch:
+                    batch = item_batch
+                    seen += len(batch)
+                    skipped = recursive and not ensure_remote_dirs(
+                        selected_com, [ROOT_DIR + name for name in batch], created_dirs
+                    )
+                    if skipped:
+                        print(f"{Fore.RED}Skipping {len(batch)} file(s), folders could not be created.{Style.RESET_ALL}")
+                if skipped:
+                    failed.append(ROOT_DIR + file_name)
+                    bar.update(1)
+                    continue
+                if error is not None:
+                    print(f"{Fore.RED}Failed to upload {file_name}: {error}{Style.RESET_ALL}")
+                    failed.append(ROOT_DIR + file_name)
+                    bar.update(1)
+                    continue
+                local_file, remote_file, fingerprint, done, payload = prepared
+                names[remote_file] = file_name
+                if remote_file != ROOT_DIR + file_name:
+                    compiled[remote_file] = ROOT_DIR + file_name
+                if done:  # finished by an interrupted earlier run
+                    resumed.append(remote_file)
+                    bar.update(1)
+                    continue
+                if bundle and payload is not None and len(payload[0]) <= bundle:
+                    bundled.append((file_name, local_file, remote_file, fingerprint, payload[0]))
+                    if sum(len(entry[4]) for entry in bundled) >= BUNDLE_MAX_BYTES:
+                        flush_bundle(bar)
+                    continue
+                resume = journal.was_interrupted(remote_file)
+                journal.start(remote_file)
                 if upload_single(
-                    selected_com, local_file, remote_file
+                    selected_com,
+                    local_file,
+                    remote_file,
+                    compress=compress,
+                    resume=resume,
+                    delta=delta,
+                    payload=payload,
                 ):  # selected_com is now a parameter
-                    # Tqdm will show progress, specific print might be too verbose
-                    pass  # print(f"Successfully uploaded {file_name}")
+                    journal.finish(remote_file, fingerprint or (), payload[0] if payload else None)
+                    uploaded.append(remote_file)
                 else:
                     # Error is printed by run_ampy_command, tqdm will continue
                     print(f"{Fore.RED}Failed to upload {file_name}{Style.RESET_ALL}")
+                    failed.append(remote_file)
+                bar.update(1)
+            with pipeline.times.measure("consume"):
+                flush_bundle(bar)
+        stages = pipeline.times.totals()
+        if seen:
+            print_stage_times(stages, UPLOAD_WORKERS)
+        journal.close(completed=not failed)
+        print_failures("uploaded", failed)
+
+        # a source goes only when its .mpy made it, otherwise the module would be gone
+        succeeded = set(uploaded) | set(resumed)
+        replaced_sources = [source for target, source in compiled.items() if target in succeeded]
+        kept_sources = {compiled.get(path, path) for path in failed}
+        to_delete = [path for path in to_delete if path not in kept_sources]
+        if replaced_sources:
+            success, removed = session_call(
+                selected_com,
+                "Removing replaced sources",
+                lambda session: session.remove_files(replaced_sources),
+                op="delete",
+            )
+            if success and removed:
+                index_remove(selected_com, removed)
+                print(f"Removed {len(removed)} source file(s) replaced by .mpy.")
+            to_delete = [path for path in to_delete if path not in set(replaced_sources)]
 
+        if not seen and not to_delete and not sync:
+            print("No files found in the source directory.")
 
-def download_single(com_port, remote_file, local_file):
-    print(f"Downloading {remote_file} to {local_file}...")
-    success, file_content, error_message = run_ampy_command(
-        com_port, ["get", remote_file], capture_output=True
-    )
-    if success:
-        if file_content is not None:  # Ensure content is not None before writing
-            try:
-                with open(local_file, "w") as f:  # ampy get usually returns text
-                    f.write(file_content)
-                # Success message handled by caller or in main loop
-            except IOError as e:
-                print(
-                    f"{Fore.RED}Error writing downloaded file {local_file}: {e}{Style.RESET_ALL}"
-                )
-                success = False  # Mark as failed if file write fails
-        # If ampy get "succeeds" (exit 0) but gives error (e.g. file not found), file_content might be empty and error_message populated
-        elif error_message:
-            print(
-                f"{Fore.YELLOW}Could not retrieve file for download. Ampy reported: {error_message}{Style.RESET_ALL}"
+        report = {"deleted": [], "failed": []}
+        if to_delete:
+            success, removed = session_call(
+                selected_com,
+                f"Removing {len(to_delete)} stale file(s)",
+                lambda session: session.remove_files(to_delete),
+                op="delete",
+            )
+            removed = set(removed or ())
+            report["deleted"] = [path for path in to_delete if path in removed]
+            error = "not removed" if success else "connection lost"
+            report["failed"] = [(path, error) for path in to_delete if path not in removed]
+        for remote_dir in stale_dirs:
+            success, _ = session_call(
+                selected_com, f"Removing {remote_dir}", lambda session: session.rmdir(remote_dir), op="delete"
             )
-            success = False  # Mark as failed
-        else:  # No content and no error_message, could be an empty file
+            if success:
+                report["deleted"].append(remote_dir)
+            else:
+                report["failed"].append((remote_dir, "not removed"))
+        if to_delete or stale_dirs:
+            index_remove(selected_com, report["deleted"])
+            print_delete_report(report)
+
+        if sync and uploaded:
+            # record what is on the device now, for boards without hashlib
             try:
-                with open(local_file, "w") as f:  # Create empty file
-                    f.write("")
-            except IOError as e:
-                print(
-                    f"{Fore.RED}Error writing empty downloaded file {local_file}: {e}{Style.RESET_ALL}"
-                )
-                success = False
-    return success  # Return success status
+                remote = get_session(selected_com).hash_files(uploaded)
+            except (SessionError, serial.SerialException):
+                remote = {}
+            device_id = board_id(selected_com)
+            with _sync_state_lock:
+                state = load_sync_state(local_dir_id, device_id)
+                for remote_file in uploaded:
+                    entry = {"sha256": local_hashes[names[remote_file]]}
+                    fingerprint = remote.get(remote_file)
+                    if fingerprint and fingerprint[0] == "stat":
+                        entry["stat"] = list(fingerprint[1:])
+                    state[remote_file] = entry
+                for remote_file in to_delete:
+                    state.pop(remote_file, None)
+                save_sync_state(local_dir_id, device_id, state)
+
+        return {
+            "uploaded": uploaded,
+            "failed": failed + [path for path, _ in report["failed"]],
+            "deleted": report["deleted"],
+            "unchanged": unchanged + len(resumed),
+            "stages": stages,
+        }
+
+
+def download_single(com_port, remote_file, local_file, compress=None, position=0, byte_bar=True):
+    print(f"Downloading {remote_file} to {local_file}...")
+    if not USE_SESSION:
+        # ampy writes the local file itself in binary mode when given a target
+        success, _, _ = run_ampy_command(
+            com_port, ["get", remote_file, local_file], capture_output=True
+        )
+        return success
+
+    compress = COMPRESS_TRANSFERS if compress is None else compress
+    with tqdm(
+        desc=os.path.basename(remote_file),
+        unit="B",
+        unit_scale=True,
+        unit_divisor=1024,
+        position=position,
+        leave=position == 0,
+        disable=not byte_bar,
+    ) as bar:
+
+        def get(session):
+            bar.reset()  # a resumed attempt reports the bytes it already has first
+            # a partial file from a broken link is continued, never left as the result
+            return session.download_file(remote_file, local_file, compress, byte_progress(bar))
+
+        success, stats = session_call(
+            com_port, f"Download of {remote_file}", get, op="get", retries=RESUME_RETRIES
+        )
+
+    if not success:
+        return False
+    if compress:
+        print_transfer_stats(remote_file, stats)
+    return True
+
 
+def download_multiple(selected_com, remote_files_id, local_dir_id, bar=None):
+    """Download comma-separated remote files into `local_dir_id`.
 
-def download_multiple(selected_com, remote_files_id, local_dir_id):
+    `bar` is a tqdm bar to count files on instead of drawing an overall bar
+    and per-file byte bars. Returns the remote files that failed.
+    """
     if not os.path.exists(local_dir_id):
         os.makedirs(local_dir_id)
 
     remote_file_list = [f.strip() for f in remote_files_id.split(",")]
-
-    for remote_file in tqdm(remote_file_list, desc="Downloading files", unit="file"):
+    journal = TransferJournal.open(
+        "download", board_id(selected_com), os.path.abspath(local_dir_id), remote_file_list
+    )
+    if journal.resuming:
+        print(f"Resuming an interrupted download, {len(journal.done)} file(s) already done.")
+
+    failed = []
+    own_bar = bar is None
+    if own_bar:
+        bar = tqdm(desc="Downloading files", unit="file")
+    bar.reset(total=len(remote_file_list))
+    for remote_file in remote_file_list:
         local_file_path = os.path.join(local_dir_id, os.path.basename(remote_file))
+        fingerprint = file_fingerprint(local_file_path)
+        if fingerprint and journal.is_done(remote_file, fingerprint):
+            bar.update(1)
+            continue
+        journal.start(remote_file)
         # The print inside download_single is already quite informative
         if download_single(
-            selected_com, remote_file, local_file_path
-        ):  # selected_com is now a parameter
-            # tqdm shows progress, specific print might be too verbose here
-            pass  # print(f"Successfully downloaded {os.path.basename(remote_file)} to {local_file_path}")
+            selected_com, remote_file, local_file_path, position=1, byte_bar=own_bar
+        ):  # per-file byte progress is drawn below the overall bar
+            journal.finish(remote_file, file_fingerprint(local_file_path) or ())
         else:
+            failed.append(remote_file)
             # Error is printed by run_ampy_command or download_single's file write error
             print(
                 f"{Fore.RED}Failed to download {os.path.basename(remote_file)}{Style.RESET_ALL}"
             )
+        bar.update(1)
+    if own_bar:
+        bar.close()
+    journal.close(completed=not failed)
+    print_failures("downloaded", failed)
+    return failed
+
+
+def download_tree(
+    selected_com, remote_dir, local_dir_id, include=None, exclude=DEFAULT_EXCLUDES
+):
+    """Download everything below `remote_dir`, keeping the folder structure."""
+    if not USE_SESSION:
+        print("Recursive download needs the session backend.")
+        return
+    success, entries = session_call(
+        selected_com,
+        f"Listing {remote_dir}",
+        lambda session: session.walk(remote_dir),
+        op="walk",
+    )
+    if not success:
+        return
+
+    base = remote_dir.rstrip("/")
+    remote_files = []
+    for path, kind, _ in entries:
+        rel_path = path[len(base) + 1 :]
+        if kind == "f" and not is_excluded(rel_path, exclude or ()) and is_included(rel_path, include):
+            remote_files.append((path, rel_path))
+    if not remote_files:
+        print("No files found in the remote directory.")
+        return
+
+    failed = []
+    for remote_file, rel_path in tqdm(remote_files, desc="Downloading files", unit="file"):
+        local_file_path = local_path(local_dir_id, rel_path)
+        os.makedirs(os.path.dirname(local_file_path) or ".", exist_ok=True)
+        if not download_single(selected_com, remote_file, local_file_path, position=1):
+            print(f"{Fore.RED}Failed to download {remote_file}{Style.RESET_ALL}")
+            failed.append(remote_file)
+    print_failures("downloaded", failed)
+
+
+def bulk_delete(
+    com_port: str, pattern: str = "*", recursive: bool = False, remove_dirs: bool = False
+) -> dict[str, list] | None:
+    """Delete matching files in one device round-trip.
+
+    Returns `{"deleted": [...], "failed": [(path, error), ...]}` or None when
+    the device could not be reached.
+    """
+    if USE_SESSION:
+        success, report = session_call(
+            com_port,
+            "Bulk delete",
+            lambda session: session.delete_matching(
+                pattern, ROOT_DIR, recursive, remove_dirs
+            ),
+            op="delete",
+        )
+        if success:
+            index_remove(com_port, report["deleted"])
+        return report
+
+    # ampy fallback: list, filter on the host and remove one file per call
+    success_ls, files_output, _ = run_ampy_command(com_port, ["ls"], capture_output=True)
+    if not success_ls:
+        return None
+    report = {"deleted": [], "failed": []}
+    for file_name in (line.strip() for line in files_output.splitlines()):
+        if file_name and fnmatch.fnmatchcase(os.path.basename(file_name), pattern):
+            success_rm, _, error = run_ampy_command(
+                com_port, ["rm", file_name], capture_output=True
+            )
+            if success_rm:
+                report["deleted"].append(file_name)
+            else:
+                report["failed"].append((file_name, error))
+    index_remove(com_port, report["deleted"])
+    return report
+
+
+def print_delete_report(report: dict[str, list]):
+    for path in report["deleted"]:
+        print(f"Successfully deleted {path}.")
+    for path, error in report["failed"]:
+        print(f"{Fore.RED}Could not delete {path}: {error}{Style.RESET_ALL}")
 
 
 def delete_by_extension(selected_com, extension_to_delete):
@@ -273,35 +1569,27 @@ def delete_by_extension(selected_com, extension_to_delete):
     )
 
     if confirm.lower() == "y":
-        success_ls, files_output, _ = run_ampy_command(
-            selected_com, ["ls"], capture_output=True
-        )
-        if not success_ls:
+        # plain extensions keep their old "name ends with" meaning, globs are passed through
+        if any(c in extension_to_delete for c in "*?"):
+            pattern = extension_to_delete
+        else:
+            pattern = "*" + extension_to_delete
+
+        report = bulk_delete(selected_com, pattern)
+        if report is None:
             print(f"{Fore.RED}Could not list files for deletion.{Style.RESET_ALL}")
             return  # Exit function
 
-        files = [line.strip() for line in files_output.splitlines() if line.strip()]
-        if not files:
-            print("No files found on device.")
-            return
-
-        deleted_count = 0
-        for file_name in files:
-            if file_name.endswith(extension_to_delete):
-                print(f"Attempting to delete: {file_name}...")
-                # For 'rm', we don't need to capture output unless debugging.
-                success_rm, _, _ = run_ampy_command(
-                    selected_com, ["rm", file_name], capture_output=False
-                )
-                if success_rm:
-                    print(f"Successfully deleted {file_name}.")
-                    deleted_count += 1
-                # else: run_ampy_command will print the error
-
+        print_delete_report(report)
+        deleted_count = len(report["deleted"])
         if deleted_count > 0:
             print(
                 f"All '{extension_to_delete}' files processed. {deleted_count} file(s) deleted."
             )
+        elif report["failed"]:
+            print(
+                "No files were deleted (possibly due to errors during deletion attempts)."
+            )
         else:
             print(f"No files with extension '{extension_to_delete}' found to delete.")
     else:
@@ -315,33 +1603,19 @@ def delete_everything(selected_com):
     )
 
     if choice_1.lower() == "y" and choice_2.lower() == "y":
-        success_ls, files_output, _ = run_ampy_command(
-            selected_com, ["ls"], capture_output=True
-        )
-        if not success_ls:
+        report = bulk_delete(selected_com, "*", recursive=True, remove_dirs=True)
+        if report is None:
             print(f"{Fore.RED}Could not list files for deletion.{Style.RESET_ALL}")
             return
 
-        files = [line.strip() for line in files_output.splitlines() if line.strip()]
-        if not files:
+        if not report["deleted"] and not report["failed"]:
             print("No files found on device to delete.")
             return
 
-        deleted_count = 0
-        for file_name in files:
-            print(f"Attempting to delete: {file_name}...")
-            success_rm, _, _ = run_ampy_command(
-                selected_com, ["rm", file_name], capture_output=False
-            )
-            if success_rm:
-                print(f"Successfully deleted {file_name}.")
-                deleted_count += 1
-            # else: run_ampy_command will print the error
-
+        print_delete_report(report)
+        deleted_count = len(report["deleted"])
         if deleted_count > 0:
             print(f"All files processed. {deleted_count} file(s) deleted.")
-        elif not files:  # Should be caught earlier
-            print("No files found on device.")
         else:
             print(
                 "No files were deleted (possibly due to errors during deletion attempts)."
@@ -350,62 +1624,69 @@ def delete_everything(selected_com):
         print(f"Operation canceled.")
 
 
-def find_COM():
-    clear_screen()
-    # print("Waiting for COM port...") # Moved
-    # loading_animation.start() # Removed
-
-    while True:
-        print("Scanning for COM ports...")
-        com_ports = []  # declare/clean port list
+def scan_COM_ports(refresh: bool = False) -> list[PortInfo]:
+    """Serial ports with a MicroPython board behind them (probe answers are cached)."""
+    open_ports = {session.port for session in _sessions.values() if session.is_open}
+    return discover_boards(refresh=refresh, assume_boards=open_ports)
 
-        # Find available COM ports
-        output = subprocess.check_output("mode", shell=True).decode("utf-8")
 
-        for line in output.splitlines():
-            if "COM" in line:
-                com_port = line.split("COM")[1].strip()
-                if com_port != "1:":  # append every found COM port ignoring COM1
-                    com_ports.append(com_port.replace(":", ""))
+def find_COM(refresh=False):
+    clear_screen()
 
-        if com_ports:  # if found any COM ports except 1:
-            # loading_animation.stop() # Removed
+    while True:
+        print("Scanning for serial ports...")
+        com_ports = scan_COM_ports(refresh)
+        refresh = False
 
+        if com_ports:
             while True:
                 clear_screen()
 
                 if not len(com_ports) == 1:
-                    print(f"Available COM Ports:\n{', '.join(com_ports)}")
+                    print("Available boards:")
+                    for number, port in enumerate(com_ports, start=1):
+                        print(f"{str(number).ljust(2)} {port}")
                     com_choice = input(
                         f"Type number or 'r' for 'refresh'.\nEnter your choice: "
-                    )
-
-                    if com_choice.isdigit():
-                        if com_choice.replace(":", "") in com_ports:
-                            print(f"Selected COM Port: {com_choice}")
-                            return com_choice
+                    ).strip()
 
-                        else:
-                            print("Invalid COM Port. Please try again.")
+                    if com_choice.isdigit() and 1 <= int(com_choice) <= len(com_ports):
+                        selected = com_ports[int(com_choice) - 1].device
+                        print(f"Selected port: {selected}")
+                        return selected
 
                     elif com_choice == "r" or com_choice == "refresh":
                         clear_screen()
-                        # print("Waiting for COM port...") # Moved to the beginning of the outer loop
-                        # loading_animation.start() # Removed
+                        refresh = True  # probe every port again
                         break
 
                     else:
                         print("Invalid choice. Please try again.")
 
                 else:
-                    return com_ports[0].replace(":", "")
+                    return com_ports[0].device
         else:
-            print("No COM ports found. Retrying...")
-            time.sleep(1)  # Add a small delay before retrying
+            print("No MicroPython boards found. Waiting for a device to be plugged in...")
+            # hotplug events make the next scan probe the ports that changed
+            wait_for_port_change(timeout=NO_BOARD_RESCAN)
 
 
-def display_content(selected_com):
+def display_content(selected_com, refresh=False):
     print("Storage on device:")
+    if USE_SESSION:
+        index = get_index(selected_com, refresh)
+        if index is None:
+            print(f"{Fore.RED}Failed to fetch directory listing.{Style.RESET_ALL}")
+            return
+        listing = index.listing(ROOT_DIR)
+        for path, kind, size in listing:
+            print(path if kind == "d" else f"{path} - {size} bytes")
+        if not listing:
+            print("(No files found or directory is empty)")
+        age = int(time.time() - index.refreshed_at)
+        print(f"Directory listing displayed (cached {age}s ago, option 13 refreshes).")
+        return
+
     print("Fetching directory listing...")
     success, output, _ = run_ampy_command(selected_com, ["ls"], capture_output=True)
     if success:
@@ -418,6 +1699,168 @@ def display_content(selected_com):
         print(f"{Fore.RED}Failed to fetch directory listing.{Style.RESET_ALL}")
 
 
+# --- Fleet mode ---
+FLEET_MAX_WORKERS = 4  # ports served at once, keeps a shared USB hub from saturating
+
+
+def fleet_upload_from_dir(com_port, bar, local_dir, sync=False):
+    with measured(com_port, "put"):
+        report = upload_from_dir(com_port, local_dir, sync=sync, bar=bar)
+    if report is None:
+        raise OSError(f"{local_dir} does not exist")
+    return len(report["uploaded"]), [f"{path}: not uploaded" for path in report["failed"]]
+
+
+def fleet_download_multiple(com_port, bar, remote_files, local_dir):
+    device_dir = os.path.join(local_dir, port_label(com_port))  # one folder per device
+    with measured(com_port, "get"):
+        failed = download_multiple(com_port, ",".join(remote_files), device_dir, bar=bar)
+    return len(remote_files) - len(failed), [f"{path}: not downloaded" for path in failed]
+
+
+def fleet_delete(com_port, bar, pattern, recursive=False, remove_dirs=False):
+    with measured(com_port, "delete"):
+        report = bulk_delete(com_port, pattern, recursive, remove_dirs)
+    if report is None:
+        raise SessionError(f"{port_device(com_port)} could not be reached")
+    # the board deletes everything in one round-trip, there is nothing to count before it answers
+    bar.reset(total=len(report["deleted"]) + len(report["failed"]))
+    bar.update(bar.total)
+    return len(report["deleted"]), [f"{path}: {error}" for path, error in report["failed"]]
+
+
+def run_fleet(com_ports, worker, *args, max_workers=FLEET_MAX_WORKERS):
+    """Run `worker(com_port, bar, *args)` on every port, one thread per port.
+
+    Workers return `(items done, [failure messages])`. At most `max_workers`
+    ports are served at once. Returns `{com_port: (done, failures, error)}`
+    where `error` is set when the device could not be served at all.
+    """
+    results = {}
+    bars = {
+        com_port: tqdm(desc=port_device(com_port), unit="file", position=i)
+        for i, com_port in enumerate(com_ports)
+    }
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {
+            pool.submit(worker, com_port, bars[com_port], *args): com_port
+            for com_port in com_ports
+        }
+        for future in as_completed(futures):
+            com_port = futures[future]
+            try:
+                done, failures = future.result()
+                results[com_port] = (done, failures, None)
+            except Exception as e:  # one board's failure must not stop the others
+                results[com_port] = (0, [], str(e) or type(e).__name__)
+                if isinstance(e, (SessionError, serial.SerialException)):
+                    recover_session(com_port)
+    for bar in bars.values():
+        bar.close()
+    print_fleet_summary(results)
+    return results
+
+
+def print_fleet_summary(results):
+    print(SEPARATOR)
+    print("Fleet summary:")
+    ok_devices = 0
+    total_done = 0
+    for com_port in sorted(results):
+        done, failures, error = results[com_port]
+        total_done += done
+        if error:
+            print(f"{Fore.RED}{port_device(com_port).ljust(14)} FAILED  {error}{Style.RESET_ALL}")
+            continue
+        if failures:
+            print(
+                f"{Fore.YELLOW}{port_device(com_port).ljust(14)} PARTIAL {done} done, "
+                f"{len(failures)} failed{Style.RESET_ALL}"
+            )
+            for failure in failures:
+                print(f"    {failure}")
+        else:
+            ok_devices += 1
+            print(f"{Fore.GREEN}{port_device(com_port).ljust(14)} OK      {done} done{Style.RESET_ALL}")
+    print(
+        f"Devices: {ok_devices} ok, {len(results) - ok_devices} with errors. "
+        f"Items processed: {total_done}."
+    )
+
+
+def select_fleet_ports() -> list[str]:
+    com_ports = [port.device for port in scan_COM_ports()]
+    if not com_ports:
+        print("No MicroPython boards found.")
+        return []
+    print(f"Available boards:\n{', '.join(com_ports)}")
+    choice = input("Enter ports separated by comma or 'all': ").strip()
+    if choice.lower() == "all":
+        return com_ports
+    selected = [port_device(c.strip()) for c in choice.split(",") if c.strip()]
+    unknown = [c for c in selected if c not in com_ports]
+    if unknown:
+        print(f"Ignoring unknown ports: {', '.join(unknown)}")
+    return [c for c in selected if c in com_ports]
+
+
+def fleet_menu():
+    if not USE_SESSION:
+        print("Fleet mode needs the session backend.")
+        return
+    com_ports = select_fleet_ports()
+    if not com_ports:
+        return
+
+    print("Fleet operations:")
+    print("1  Upload multiple files")
+    print("2  Download multiple files")
+    print("3  Delete by extension")
+    print("4  Delete everything")
+    operation = input(f"Choose an operation {INPUT_SIGN} ").strip()
+    workers = input(f"Devices at once (default {FLEET_MAX_WORKERS}): ").strip()
+    max_workers = int(workers) if workers.isdigit() else FLEET_MAX_WORKERS
+
+    if operation == "1":
+        local_dir = input("Enter the source directory path for the files: ").strip()
+        if not os.path.isdir(local_dir):
+            print("Source directory does not exist.")
+            return
+        sync = input("Upload only new or changed files? (y/n): ").strip().lower() == "y"
+        run_fleet(com_ports, fleet_upload_from_dir, local_dir, sync, max_workers=max_workers)
+
+    elif operation == "2":
+        remote_files = input(
+            "Enter the remote file paths to download (separated by comma): "
+        ).strip()
+        local_dir = input(
+            "Enter the local directory to save downloaded files (one folder per device): "
+        ).strip()
+        remote_file_list = [f.strip() for f in remote_files.split(",") if f.strip()]
+        run_fleet(
+            com_ports, fleet_download_multiple, remote_file_list, local_dir, max_workers=max_workers
+        )
+
+    elif operation == "3":
+        extension = input("Enter the file extension to delete (e.g., txt, py): ").strip()
+        confirm = input(
+            f"Delete all '{extension}' files from {len(com_ports)} device(s)? (y/n): "
+        )
+        if confirm.lower() == "y":
+            pattern = extension if any(c in extension for c in "*?") else "*" + extension
+            run_fleet(com_ports, fleet_delete, pattern, max_workers=max_workers)
+
+    elif operation == "4":
+        confirm = input(
+            f"{Fore.RED}Delete ALL files from {len(com_ports)} device(s)? (y/n): {Style.RESET_ALL}"
+        )
+        if confirm.lower() == "y":
+            run_fleet(com_ports, fleet_delete, "*", True, True, max_workers=max_workers)
+
+    else:
+        print("Invalid choice.")
+
+
 if __name__ == "__main__":
     selected_com = find_COM()
 
@@ -426,9 +1869,12 @@ if __name__ == "__main__":
         clear_screen()
 
         print(
-            f"Ampy Manager {Fore.CYAN}{Style.BRIGHT}v{__version__}{Style.RESET_ALL}\nselected port: {Fore.LIGHTRED_EX}{Style.BRIGHT}COM{selected_com}{Style.RESET_ALL}"
+            f"Ampy Manager {Fore.CYAN}{Style.BRIGHT}v{__version__}{Style.RESET_ALL}\nselected port: {Fore.LIGHTRED_EX}{Style.BRIGHT}{port_device(selected_com)}{Style.RESET_ALL}"
         )
 
+        if SHOW_THROUGHPUT:
+            print_throughput_summary()
+
         print(SEPARATOR)
 
         display_content(selected_com)  # Pass selected_com
@@ -444,8 +1890,15 @@ if __name__ == "__main__":
             6: "Delete single file",
             7: "Delete by extension",
             8: "Delete everything",
-            9: "Rescan COM ports",
+            9: "Rescan ports",
             10: "Exit",
+            11: f"Compressed transfers: {'on' if COMPRESS_TRANSFERS else 'off'}",
+            12: "Fleet operations (multiple ports)",
+            13: "Refresh device listing",
+            14: f"Throughput summary: {'on' if SHOW_THROUGHPUT else 'off'}",
+            15: "Export metrics",
+            16: f"Precompile to .mpy: {'on' if COMPILE_MPY else 'off'}",
+            17: f"Delta uploads: {'on' if DELTA_UPLOADS else 'off'}",
         }
 
         print("Options:")
@@ -461,9 +1914,30 @@ if __name__ == "__main__":
             selected_file_path = input(
                 "Enter destination path of the file on the device: "
             ).strip()
-            display_file_content(
-                selected_com, selected_file_path
-            )  # selected_com is global
+            view = "a"
+            if USE_SESSION:
+                view = input(
+                    "View [a]ll, [h]ead, [t]ail, byte [r]ange or [f]ollow? (default: all): "
+                ).strip().lower()[:1] or "a"
+            try:
+                if view in ("h", "t"):
+                    count = int(input(f"Number of lines (default: {TAIL_LINES}): ").strip() or TAIL_LINES)
+                    first = 0 if view == "h" else -count
+                    display_file_lines(selected_com, selected_file_path, first, count)
+                elif view == "r":
+                    start = int(input("Start byte (negative: from the end): ").strip() or 0)
+                    length = input("Number of bytes (default: to the end): ").strip()
+                    display_file_range(
+                        selected_com, selected_file_path, start, int(length) if length else None
+                    )
+                elif view == "f":
+                    follow_file(selected_com, selected_file_path)
+                else:
+                    display_file_content(
+                        selected_com, selected_file_path
+                    )  # selected_com is global
+            except ValueError:
+                print(f"{Fore.RED}Expected a whole number.{Style.RESET_ALL}")
 
         # Upload single file
         elif choice == "2":
@@ -485,7 +1959,29 @@ if __name__ == "__main__":
         # Upload multiple files
         elif choice == "3":
             local_dir = input("Enter the source directory path for the files: ").strip()
-            upload_from_dir(selected_com, local_dir)
+            recursive = (
+                input("Include subdirectories (keeps folder structure)? (y/n): ")
+                .strip()
+                .lower()
+                == "y"
+            )
+            exclude = DEFAULT_EXCLUDES
+            if recursive:
+                patterns = input(
+                    f"Exclude patterns, comma separated (default: {', '.join(DEFAULT_EXCLUDES)}): "
+                ).strip()
+                if patterns:
+                    exclude = tuple(p.strip() for p in patterns.split(",") if p.strip())
+            sync = (
+                input("Upload only new or changed files? (y/n): ").strip().lower() == "y"
+            )
+            prune = sync and (
+                input("Delete device files missing locally? (y/n): ").strip().lower()
+                == "y"
+            )
+            upload_from_dir(
+                selected_com, local_dir, sync, prune, recursive, exclude=exclude
+            )
 
         # Download single file
         elif choice == "4":
@@ -518,12 +2014,16 @@ if __name__ == "__main__":
         # Download multiple files
         elif choice == "5":
             remote_files = input(
-                "Enter the remote file paths to download (separated by comma): "
+                "Enter the remote file paths to download (separated by comma), "
+                "or a folder ending with '/' to download it with its subfolders: "
             ).strip()
             local_dir = input(
                 "Enter the local directory to save downloaded files: "
             ).strip()
-            download_multiple(selected_com, remote_files, local_dir)
+            if remote_files.endswith("/") and "," not in remote_files:
+                download_tree(selected_com, remote_files, local_dir)
+            else:
+                download_multiple(selected_com, remote_files, local_dir)
 
         # Delete single file
         elif choice == "6":
@@ -541,6 +2041,7 @@ if __name__ == "__main__":
                     selected_com, ["rm", file_name_to_delete], capture_output=False
                 )  # selected_com global
                 if success:
+                    index_remove(selected_com, [file_name_to_delete])
                     print(f"File '{file_name_to_delete}' deleted from the device.")
                 else:
                     print(
@@ -564,13 +2065,52 @@ if __name__ == "__main__":
 
         # Rescan COM ports
         elif choice == "9":
+            close_sessions()
             selected_com = find_COM()
 
         # Exit
         elif choice == "10":
+            close_sessions()
+            export_metrics()
             print("Script terminated.")
             break
 
+        # Toggle compressed transfers
+        elif choice == "11":
+            COMPRESS_TRANSFERS = not COMPRESS_TRANSFERS
+            print(f"Compressed transfers {'enabled' if COMPRESS_TRANSFERS else 'disabled'}.")
+
+        # Run an operation on many devices at once
+        elif choice == "12":
+            fleet_menu()
+
+        # Rebuild the cached listing from the device
+        elif choice == "13":
+            display_content(selected_com, refresh=True)
+
+        # Toggle the live throughput summary
+        elif choice == "14":
+            SHOW_THROUGHPUT = not SHOW_THROUGHPUT
+            print(f"Throughput summary {'shown' if SHOW_THROUGHPUT else 'hidden'}.")
+
+        # Write the measurements collected so far
+        elif choice == "15":
+            paths = export_metrics()
+            if paths:
+                print(f"Metrics written to {paths[0]} and {paths[1]}.")
+            else:
+                print("No metrics to write yet.")
+
+        # Toggle .mpy precompilation for folder uploads
+        elif choice == "16":
+            COMPILE_MPY = not COMPILE_MPY
+            print(f"Precompiling {'enabled' if COMPILE_MPY else 'disabled'}.")
+
+        # Toggle block-level patching of large files already on the device
+        elif choice == "17":
+            DELTA_UPLOADS = not DELTA_UPLOADS
+            print(f"Delta uploads {'enabled' if DELTA_UPLOADS else 'disabled'}.")
+
         elif choice == "help":
             print(HELP_DOC)
 
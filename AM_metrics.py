@@ -0,0 +1,215 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Per-operation measurements for the session backend.
+
+Every operation gets one record: wall time, a breakdown into phases
+(connect, reset, send, device, host — or process for the ampy subprocess),
+bytes sent and received on the serial link, chunk retries and the outcome,
+tagged with the port and the board's unique ID. Records can be written as
+JSON lines or as a Prometheus text-format file, e.g. for node_exporter's
+textfile collector.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+import serial
+
+from AM_session import DeadlineExceeded, DeviceError, SessionError
+
+COUNTERS = ("bytes_sent", "bytes_received", "retries")
+
+
+def outcome_of(error: BaseException) -> str:
+    if isinstance(error, DeviceError):
+        return "device_error"  # the board raised, the link is fine
+    if isinstance(error, DeadlineExceeded):
+        return "timeout"
+    if isinstance(error, (SessionError, serial.SerialException)):
+        return "link_error"
+    return "error"
+
+
+def counters_delta(before: dict | None, after: dict | None) -> dict:
+    """Difference of two `AmpySession.snapshot()` results; None counts as zero."""
+    before = before or {"phases": {}}
+    after = after or {"phases": {}}
+    delta = {key: after.get(key, 0) - before.get(key, 0) for key in COUNTERS}
+    delta["phases"] = {
+        phase: seconds - before["phases"].get(phase, 0.0)
+        for phase, seconds in after["phases"].items()
+        if seconds - before["phases"].get(phase, 0.0) > 0
+    }
+    return delta
+
+
+class Operation:
+    """Handle for one running operation; set `outcome` to flag a soft failure."""
+
+    def __init__(self, op: str, port: str):
+        self.op = op
+        self.port = port
+        self.outcome = "ok"
+        self.error = ""
+        self.phases: dict[str, float] = {}  # extra phases measured by the caller
+
+
+class Metrics:
+    """Thread-safe collection of operation records for one run of the tool."""
+
+    def __init__(self):
+        self.records: list[dict] = []
+        self.lock = threading.Lock()
+        self._active = threading.local()
+
+    @contextlib.contextmanager
+    def operation(self, op: str, port: str, session_of, device_of):
+        """Measure the enclosed block as operation `op` on `port`.
+
+        `session_of()` returns the port's current session (or None) and
+        `device_of(session)` its device ID. Exceptions are recorded as the
+        outcome and re-raised. Operations nested in another one on the same
+        thread are part of the outer record, so totals are not counted twice.
+        """
+        if getattr(self._active, "depth", 0):
+            self._active.depth += 1
+            try:
+                yield Operation(op, port)
+            finally:
+                self._active.depth -= 1
+            return
+        self._active.depth = 1
+        session = session_of()
+        before = session.snapshot() if session is not None else None
+        operation = Operation(op, port)
+        started = time.time()
+        start = time.monotonic()
+        try:
+            yield operation
+        except BaseException as e:
+            operation.outcome = outcome_of(e)
+            operation.error = str(e)
+            raise
+        finally:
+            self._active.depth = 0
+            seconds = time.monotonic() - start
+            current = session_of() or session
+            if current is not session:
+                before = None  # a new connection was made, all of its traffic is ours
+            delta = counters_delta(before, current.snapshot() if current is not None else None)
+            phases = {**delta.pop("phases"), **operation.phases}
+            phases["host"] = max(0.0, seconds - sum(phases.values()))
+            self.add(
+                {
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+                    "op": op,
+                    "port": port,
+                    "device": device_of(current),
+                    "seconds": round(seconds, 6),
+                    "phases": {k: round(v, 6) for k, v in phases.items()},
+                    **delta,
+                    "outcome": operation.outcome,
+                    "error": operation.error,
+                }
+            )
+
+    def add(self, record: dict):
+        with self.lock:
+            self.records.append(record)
+
+    def snapshot(self) -> list[dict]:
+        with self.lock:
+            return list(self.records)
+
+    # --- export ---
+    def dump_jsonl(self, path: str):
+        with open(path, "w") as f:
+            for record in self.snapshot():
+                f.write(json.dumps(record, sort_keys=True) + "\n")
+
+    def dump_prometheus(self, path: str):
+        """Totals per port and device in the Prometheus text exposition format."""
+        ops, seconds, phases, counters = {}, {}, {}, {}
+        for r in self.snapshot():
+            tags = (("port", r["port"]), ("device", r["device"]))
+            key = tags + (("op", r["op"]), ("outcome", r["outcome"]))
+            ops[key] = ops.get(key, 0) + 1
+            key = tags + (("op", r["op"]),)
+            seconds[key] = seconds.get(key, 0.0) + r["seconds"]
+            for phase, value in r["phases"].items():
+                key = tags + (("phase", phase),)
+                phases[key] = phases.get(key, 0.0) + value
+            for name in COUNTERS:
+                counters.setdefault(name, {})
+                counters[name][tags] = counters[name].get(tags, 0) + r[name]
+
+        families = [
+            ("ampy_operations_total", "Operations run, by outcome.", ops),
+            ("ampy_operation_seconds_total", "Wall time spent in operations.", seconds),
+            ("ampy_phase_seconds_total", "Wall time by phase of the operations.", phases),
+            ("ampy_bytes_sent_total", "Bytes written to the serial link.", counters.get("bytes_sent", {})),
+            ("ampy_bytes_received_total", "Bytes read from the serial link.", counters.get("bytes_received", {})),
+            ("ampy_retries_total", "Transfer chunks sent again after an error.", counters.get("retries", {})),
+        ]
+        lines = []
+        for name, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(samples.items()):
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f"{name}{{{label_text}}} {round(value, 6)}")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)  # scrapers never see a half-written file
+
+    def summary(self) -> list[dict]:
+        """Per port and device: operations, errors, bytes, throughput and median latency."""
+        groups = {}
+        for r in self.snapshot():
+            groups.setdefault((r["port"], r["device"]), []).append(r)
+        rows = []
+        for (port, device), records in sorted(groups.items()):
+            seconds = sum(r["seconds"] for r in records)
+            num_bytes = sum(r["bytes_sent"] + r["bytes_received"] for r in records)
+            durations = sorted(r["seconds"] for r in records)
+            rows.append(
+                {
+                    "port": port,
+                    "device": device,
+                    "operations": len(records),
+                    "errors": sum(r["outcome"] != "ok" for r in records),
+                    "retries": sum(r["retries"] for r in records),
+                    "bytes": num_bytes,
+                    "bytes_per_s": num_bytes / seconds if seconds else 0.0,
+                    "median_s": durations[len(durations) // 2],
+                }
+            )
+        return rows
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
@@ -0,0 +1,177 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Precompiling sources to .mpy bytecode before upload.
+
+Compiling on the host saves bytes on the wire and spares the board the RAM
+and time of compiling at import. The compiler is an `mpy-cross` executable;
+several can be offered (e.g. one per MicroPython release) through the
+AMPY_MPY_CROSS environment variable, separated like PATH entries, and the
+one emitting the bytecode version the board reports is used.
+
+Compiled files are cached in ~/.ampy_manager/mpy, keyed by the source hash
+and the compiler version, so unchanged files are never compiled again.
+"""
+
+import glob
+import hashlib
+import os
+import re
+import shlex
+import subprocess
+import tempfile
+
+from AM_index import CACHE_DIR
+
+MPY_CACHE_DIR = os.path.join(CACHE_DIR, "mpy")
+COMPILER_ENV = "AMPY_MPY_CROSS"
+SOURCE_ONLY = ("main.py", "boot.py")  # run by the firmware by name, must stay source
+COMPILE_TIMEOUT = 60  # seconds
+
+_VERSION_PATTERN = re.compile(r"mpy v(\d+)(?:\.(\d+))?")
+
+
+class CompileError(Exception):
+    """mpy-cross rejected a file or could not be run."""
+
+
+def bytecode_version(mpy: int) -> tuple[int, int] | None:
+    """(version, sub-version) from `sys.implementation._mpy`, None when unsupported."""
+    if not mpy:
+        return None
+    return mpy & 0xFF, (mpy >> 8) & 3
+
+
+def should_compile(rel_path: str) -> bool:
+    return rel_path.endswith(".py") and os.path.basename(rel_path) not in SOURCE_ONLY
+
+
+def mpy_name(rel_path: str) -> str:
+    return rel_path[: -len(".py")] + ".mpy"
+
+
+class MpyCross:
+    """One `mpy-cross` command line, e.g. "mpy-cross" or "python -m mpy_cross"."""
+
+    def __init__(self, command):
+        self.command = shlex.split(command) if isinstance(command, str) else list(command)
+        self._version_text = None
+
+    @property
+    def version_text(self) -> str:
+        """What `--version` prints; part of the cache key."""
+        if self._version_text is None:
+            try:
+                process = subprocess.run(
+                    self.command + ["--version"],
+                    capture_output=True,
+                    text=True,
+                    timeout=COMPILE_TIMEOUT,
+                )
+            except (OSError, subprocess.TimeoutExpired) as e:
+                raise CompileError(f"{' '.join(self.command)}: {e}")
+            self._version_text = (process.stdout + process.stderr).strip()
+        return self._version_text
+
+    @property
+    def bytecode_version(self) -> tuple[int, int] | None:
+        match = _VERSION_PATTERN.search(self.version_text)
+        if match is None:
+            return None
+        return int(match.group(1)), int(match.group(2) or 0)
+
+    def compile(self, source: str, output: str, source_name: str):
+        """Compile `source` to `output`; `source_name` is what tracebacks show."""
+        try:
+            process = subprocess.run(
+                self.command + ["-o", output, "-s", source_name, source],
+                capture_output=True,
+                text=True,
+                timeout=COMPILE_TIMEOUT,
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise CompileError(f"{' '.join(self.command)}: {e}")
+        if process.returncode != 0:
+            raise CompileError((process.stderr or process.stdout).strip())
+
+
+def candidate_compilers() -> list[MpyCross]:
+    """Compilers from AMPY_MPY_CROSS first, then every mpy-cross* on PATH."""
+    commands = [c for c in os.environ.get(COMPILER_ENV, "").split(os.pathsep) if c.strip()]
+    for folder in os.environ.get("PATH", "").split(os.pathsep):
+        for path in sorted(glob.glob(os.path.join(folder, "mpy-cross*"))):
+            if os.access(path, os.X_OK) and path not in commands:
+                commands.append(path)
+    return [MpyCross(command) for command in commands]
+
+
+_compilers: dict[tuple[int, int], MpyCross | None] = {}
+
+
+def find_compiler(version: tuple[int, int], candidates=None) -> MpyCross | None:
+    """The first compiler emitting bytecode `version`, remembered per version."""
+    if candidates is None and version in _compilers:
+        return _compilers[version]
+    found = None
+    for compiler in candidate_compilers() if candidates is None else candidates:
+        try:
+            if compiler.bytecode_version == version:
+                found = compiler
+                break
+        except CompileError:
+            continue
+    if candidates is None:
+        _compilers[version] = found
+    return found
+
+
+class MpyCache:
+    """Compiled files on the host, keyed by source hash and compiler version."""
+
+    def __init__(self, compiler: MpyCross, directory: str | None = None):
+        self.compiler = compiler
+        self.directory = directory or MPY_CACHE_DIR
+
+    def compile(self, source: str, source_name: str) -> str:
+        """Path of the compiled `source`, compiling only on a cache miss."""
+        digest = hashlib.sha256()
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(64 * 1024), b""):
+                digest.update(block)
+        digest.update(b"\0" + source_name.encode() + b"\0" + self.compiler.version_text.encode())
+        output = os.path.join(self.directory, digest.hexdigest() + ".mpy")
+        if os.path.exists(output):
+            return output
+        os.makedirs(self.directory, exist_ok=True)
+        # a private temp file per compile: threads and other processes share the cache
+        fd, temp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        os.close(fd)
+        try:
+            self.compiler.compile(source, temp, source_name)
+            os.replace(temp, output)
+        except BaseException:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            raise
+        return output
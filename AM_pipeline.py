@@ -0,0 +1,181 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Overlap host-side preparation with a single serial consumer.
+
+A producer thread walks the input and hands every item to a worker pool;
+the consumer gets the prepared results back in input order, so the serial
+link never waits for a file to be read, hashed, compressed or compiled
+unless the host really is the slower side. Prepared payloads held at once
+are capped in bytes, and the time of every stage is recorded to show which
+side is the bottleneck.
+"""
+
+import contextlib
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_DEPTH = 64  # prepared items queued ahead of the consumer
+
+_DONE = object()
+
+
+class StageTimes:
+    """Seconds spent per stage, summed over all threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seconds: dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        with self.lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def measure(self, stage: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(stage, time.monotonic() - start)
+
+    def totals(self) -> dict[str, float]:
+        with self.lock:
+            return {stage: round(seconds, 4) for stage, seconds in self.seconds.items()}
+
+
+class ByteBudget:
+    """Blocks producers while the prepared bytes in memory exceed `limit`.
+
+    A single item larger than the whole budget is still let through once
+    everything before it was consumed, so nothing can wait forever.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, num_bytes: int, stop: threading.Event) -> bool:
+        with self.condition:
+            while self.used and self.used + num_bytes > self.limit:
+                if stop.is_set():
+                    return False
+                self.condition.wait(0.1)
+            self.used += num_bytes
+            return True
+
+    def release(self, num_bytes: int):
+        with self.condition:
+            self.used -= num_bytes
+            self.condition.notify_all()
+
+
+class Pipeline:
+    """Iterate over `(item, result, error)` with `prepare(item)` run ahead on a pool.
+
+    `cost(item)` estimates the bytes `prepare` will hold; the estimates of
+    the items prepared but not yet consumed stay under `max_bytes`. The
+    stages "prepare" (worker time), "wait" (consumer waiting for the host)
+    and "consume" (consumer busy between two items) are recorded in
+    `times`, next to whatever `prepare` measures itself.
+    """
+
+    def __init__(
+        self,
+        items,
+        prepare,
+        cost=lambda item: 0,
+        workers: int = DEFAULT_WORKERS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        depth: int = DEFAULT_DEPTH,
+    ):
+        self.items = items
+        self.prepare = prepare
+        self.cost = cost
+        self.workers = max(1, workers)
+        self.budget = ByteBudget(max_bytes)
+        self.depth = depth
+        self.times = StageTimes()
+
+    def _prepare(self, item):
+        with self.times.measure("prepare"):
+            return self.prepare(item)
+
+    def _produce(self, pool, pending: queue.Queue, stop: threading.Event):
+        def put(entry) -> bool:
+            while not stop.is_set():
+                try:
+                    pending.put(entry, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            for item in self.items:
+                num_bytes = self.cost(item)
+                if not self.budget.acquire(num_bytes, stop):
+                    return
+                if not put((item, num_bytes, pool.submit(self._prepare, item))):
+                    return
+        except Exception as e:  # a failing input walk ends the run after what was queued
+            put((None, 0, e))
+        finally:
+            put(_DONE)
+
+    def __iter__(self):
+        pending = queue.Queue(self.depth)
+        stop = threading.Event()
+        pool = ThreadPoolExecutor(self.workers)
+        producer = threading.Thread(target=self._produce, args=(pool, pending, stop), daemon=True)
+        producer.start()
+        try:
+            while True:
+                start = time.monotonic()
+                entry = pending.get()
+                if entry is _DONE:
+                    return
+                item, num_bytes, future = entry
+                if isinstance(future, Exception):
+                    raise future
+                result = error = None
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                self.times.add("wait", time.monotonic() - start)
+                start = time.monotonic()
+                try:
+                    yield item, result, error
+                finally:
+                    self.budget.release(num_bytes)
+                    self.times.add("consume", time.monotonic() - start)
+        finally:
+            stop.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+            producer.join()
@@ -0,0 +1,238 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Serial port discovery that works on Windows, Linux and macOS.
+
+Ports come from pyserial's port list plus the usual Linux device nodes. Each
+candidate is probed in parallel for a MicroPython REPL. Answers are cached
+per port and USB identity, so a rescan only probes ports that are new or
+changed. Hotplug is picked up through inotify on Linux and by polling
+elsewhere; a port that is unplugged, replugged or touched is forgotten and
+probed again on the next scan. As a safety net, a port that did not answer
+is probed again after `NEGATIVE_PROBE_TTL`.
+"""
+
+import ctypes
+import ctypes.util
+import glob
+import os
+import select
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import serial
+from serial.tools import list_ports
+
+PROBE_TIMEOUT = 1.5  # seconds a port gets to show a REPL prompt
+PROBE_INTERRUPT_INTERVAL = 0.5  # Ctrl-C is sent again this often while a port is probed
+NEGATIVE_PROBE_TTL = 300.0  # seconds a silent port counts as no board, unless hotplug says otherwise
+PROBE_BAUDRATE = 115200
+POLL_INTERVAL = 1.0  # hotplug fallback where inotify is not available
+LINUX_PATTERNS = ("/dev/ttyUSB*", "/dev/ttyACM*")
+REPL_MARKERS = (b">>> ", b"raw REPL", b"MicroPython")
+
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_ATTRIB = 0x004
+_INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, length of the name that follows
+
+
+class PortInfo:
+    """One serial port candidate and what probing it revealed."""
+
+    def __init__(self, device, description="", vid=None, pid=None, serial_number=None):
+        self.device = device
+        self.description = description
+        self.vid = vid
+        self.pid = pid
+        self.serial_number = serial_number
+        self.is_board = None  # unknown until probed
+
+    @property
+    def identity(self) -> tuple:
+        """Changes when a different USB device appears on the same port."""
+        return self.device, self.vid, self.pid, self.serial_number
+
+    def __str__(self):
+        usb = f" [{self.vid:04X}:{self.pid:04X}]" if self.vid is not None else ""
+        description = f" - {self.description}" if self.description and self.description != "n/a" else ""
+        return f"{self.device}{usb}{description}"
+
+
+_probe_cache: dict[tuple, tuple[bool, float]] = {}  # identity -> (is_board, time.monotonic())
+_probe_lock = threading.Lock()
+
+
+def list_candidate_ports() -> list[PortInfo]:
+    """Every serial port the OS knows about, without opening any of them."""
+    ports = {}
+    for info in list_ports.comports():
+        ports[info.device] = PortInfo(
+            info.device, info.description, info.vid, info.pid, info.serial_number
+        )
+    for pattern in LINUX_PATTERNS:
+        for device in glob.glob(pattern):
+            ports.setdefault(device, PortInfo(device))
+    return sorted(ports.values(), key=lambda p: p.device)
+
+
+def probe_port(device: str, timeout: float = PROBE_TIMEOUT) -> bool:
+    """True when a MicroPython REPL answers on `device` within `timeout`."""
+    try:
+        with serial.Serial(device, PROBE_BAUDRATE, timeout=0.1) as port:
+            data = b""
+            deadline = time.monotonic() + timeout
+            interrupt_at = 0.0
+            while time.monotonic() < deadline:
+                if time.monotonic() >= interrupt_at:
+                    # interrupt a running script, prompt follows; a script that
+                    # catches KeyboardInterrupt or a booting board needs another
+                    port.write(b"\r\x03\x03")
+                    interrupt_at = time.monotonic() + PROBE_INTERRUPT_INTERVAL
+                data += port.read(max(1, port.in_waiting))
+                if any(marker in data for marker in REPL_MARKERS):
+                    return True
+    except (OSError, serial.SerialException):
+        pass
+    return False
+
+
+def is_cached(identity: tuple) -> bool:
+    entry = _probe_cache.get(identity)
+    if entry is None:
+        return False
+    is_board, probed = entry
+    return is_board or time.monotonic() - probed < NEGATIVE_PROBE_TTL
+
+
+def discover_boards(
+    refresh: bool = False, timeout: float = PROBE_TIMEOUT, assume_boards=()
+) -> list[PortInfo]:
+    """Ports that answered the REPL probe, probed concurrently.
+
+    Cached answers are reused unless `refresh` is set, the port was
+    forgotten after a hotplug event or, for ports that did not answer,
+    `NEGATIVE_PROBE_TTL` has passed. Devices in
+    `assume_boards` (e.g. ports this process already holds open) are not
+    probed and count as boards.
+    """
+    candidates = list_candidate_ports()
+    to_probe = []
+    for port in candidates:
+        if port.device in assume_boards:
+            port.is_board = True
+        elif not refresh and is_cached(port.identity):
+            port.is_board = _probe_cache[port.identity][0]
+        else:
+            to_probe.append(port)
+
+    if to_probe:
+        with ThreadPoolExecutor(max_workers=len(to_probe)) as pool:
+            answers = pool.map(lambda p: probe_port(p.device, timeout), to_probe)
+            for port, is_board in zip(to_probe, answers):
+                port.is_board = is_board
+                with _probe_lock:
+                    _probe_cache[port.identity] = (is_board, time.monotonic())
+    return [port for port in candidates if port.is_board]
+
+
+def forget_port(device: str):
+    """Drop cached probe answers for `device`, e.g. after it was unplugged."""
+    with _probe_lock:
+        for identity in [i for i in _probe_cache if i[0] == device]:
+            del _probe_cache[identity]
+
+
+def _inotify_watch(path: str):
+    """Return an inotify file descriptor watching `path`, or None."""
+    if not hasattr(select, "poll") or not os.path.isdir(path):
+        return None
+    libc_name = ctypes.util.find_library("c")
+    if not libc_name:
+        return None
+    try:
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, path.encode(), _IN_CREATE | _IN_DELETE | _IN_ATTRIB) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _touched_devices(events: bytes) -> set[str]:
+    """/dev paths named in a buffer of inotify events."""
+    devices = set()
+    offset = 0
+    while offset + _INOTIFY_EVENT.size <= len(events):
+        _, _, _, length = _INOTIFY_EVENT.unpack_from(events, offset)
+        offset += _INOTIFY_EVENT.size
+        name = events[offset : offset + length].rstrip(b"\0")
+        offset += length
+        if name:
+            devices.add("/dev/" + name.decode("utf-8", "replace"))
+    return devices
+
+
+def wait_for_port_change(known=None, timeout: float | None = None) -> list[PortInfo]:
+    """Block until the set of candidate ports differs from `known`, or one of them is touched.
+
+    Sleeps on inotify events for /dev where available instead of polling;
+    ports named in an event are forgotten, so the next scan probes them
+    again (e.g. a board replugged faster than a rescan). Returns the new
+    candidate list, or the unchanged one after `timeout`.
+    """
+    known = {p.device for p in list_candidate_ports()} if known is None else set(known)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    fd = _inotify_watch("/dev")
+    try:
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            touched = set()
+            if fd is not None:
+                readable, _, _ = select.select([fd], [], [], remaining)
+                if readable:
+                    try:
+                        touched = _touched_devices(os.read(fd, 65536))
+                    except BlockingIOError:
+                        pass
+                    time.sleep(0.2)  # let udev finish creating the node
+            else:
+                time.sleep(POLL_INTERVAL if remaining is None else min(POLL_INTERVAL, remaining))
+
+            current = list_candidate_ports()
+            devices = {p.device for p in current}
+            touched &= devices | known
+            for device in (known - devices) | touched:
+                forget_port(device)
+            if devices != known or touched:
+                return current
+            if deadline is not None and time.monotonic() >= deadline:
+                return current
+    finally:
+        if fd is not None:
+            os.close(fd)
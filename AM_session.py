@@ -0,0 +1,1660 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Persistent raw-REPL session to a MicroPython board.
+
+Opens the serial port once, enters raw REPL once and then serves every file
+operation over that same connection, instead of spawning a new `ampy` process
+(and resetting the board) for each command.
+"""
+
+import base64
+import hashlib
+import io
+import math
+import os
+import threading
+import time
+import zlib
+
+import serial
+
+DEFAULT_BAUDRATE = 115200
+WRITE_CHUNK = 256  # bytes written to the raw REPL at once
+TRANSFER_CHUNK = 512  # payload bytes per put/get round-trip, starting point for tuning
+MIN_TRANSFER_CHUNK = 64
+MAX_TRANSFER_CHUNK = 4096
+GROW_AFTER = 8  # clean round-trips before a bigger chunk is tried
+MAX_WRITE_DELAY = 0.05  # seconds between raw REPL writes after repeated overflows
+MAX_CHUNK_RETRIES = 6
+WRITE_TIMEOUT = 5.0  # seconds one serial write may block before the link counts as dead
+DEADLINE_MIN = 10.0  # seconds every round-trip gets on top of its share of the link time
+DEADLINE_FACTOR = 4  # times the expected link time a round-trip may take at most
+RECOVER_TIMEOUT = 3.0  # seconds each recovery step waits for the board
+
+# Boards whose REPL sits behind a USB-serial bridge, where the UART baud rate
+# really limits throughput. Native USB (CDC) ports ignore the baud rate.
+BAUD_UPGRADE_PLATFORMS = ("esp32", "esp8266")
+BAUD_CANDIDATES = (921600, 460800, 230400)
+
+COMPRESS_WBITS = 10  # 1 KB window, small enough for the decompressor on ESP8266
+COMPRESSED_SUFFIX = ".z.tmp"  # temporary remote file holding compressed payload
+PARTIAL_SUFFIX = ".part"  # uploads land here and are renamed once complete
+BUNDLE_FILE = "/.ampy_bundle"  # compressed bundles are unpacked from here
+DELTA_BLOCK = 1024  # bytes per block compared when patching a remote file
+DELTA_MIN_SIZE = 8 * 1024  # smaller files are cheaper to resend than to compare
+DELTA_DIGEST = 16  # hex digits of each block's sha256 sent back by the board
+HASH_BATCH = 32  # files hashed by the board per call, keeps every call short
+
+RAW_REPL_BANNER = b"raw REPL; CTRL-B to exit\r\n"
+SOFT_REBOOT = b"soft reboot\r\n"
+
+
+class SessionError(Exception):
+    """Raised when the board stops answering or the link breaks."""
+
+
+class DeviceError(SessionError):
+    """Raised when code executed on the board ends with a traceback.
+
+    The connection itself is still usable afterwards.
+    """
+
+
+class DeadlineExceeded(SessionError):
+    """Raised when a round-trip keeps trickling in past its size-based deadline."""
+
+
+class TransferCancelled(Exception):
+    """Raised by a progress callback to stop a transfer between two chunks.
+
+    The open remote file is closed before it propagates, so the connection
+    stays usable.
+    """
+
+
+# --- device-side snippets ---
+# Kept compatible with both MicroPython and CPython; every snippet imports what
+# it needs because the raw REPL namespace is wiped on soft reset.
+
+_LS = """
+import os
+def _ls(d, r, l):
+    for n in sorted(os.listdir(d)):
+        p = (d.rstrip('/') + '/' + n) if d != '/' else '/' + n
+        s = os.stat(p)
+        dr = s[0] & 0x4000
+        if l and not dr:
+            print('%s - %d bytes' % (p, s[6]))
+        else:
+            print(p)
+        if r and dr:
+            _ls(p, r, l)
+_ls({directory!r}, {recursive!r}, {long_format!r})
+"""
+
+_GET_OPEN = """
+import os
+try:
+    import binascii
+except ImportError:
+    import ubinascii as binascii
+print(os.stat({path!r})[6])
+_f = open({path!r}, 'rb')
+"""
+
+# Continue after `offset` bytes the host already has. Their sha256 is printed
+# along with the size so the host can check they still match ("-" without hashlib).
+_GET_RESUME = """
+import os
+try:
+    import binascii
+except ImportError:
+    import ubinascii as binascii
+try:
+    import hashlib
+except ImportError:
+    try:
+        import uhashlib as hashlib
+    except ImportError:
+        hashlib = None
+_f = open({path!r}, 'rb')
+if hashlib:
+    _h = hashlib.sha256()
+    _n = {offset}
+    while _n:
+        _b = _f.read(min(_n, 512))
+        if not _b:
+            break
+        _h.update(_b)
+        _n -= len(_b)
+    print(os.stat({path!r})[6], binascii.hexlify(_h.digest()).decode())
+else:
+    print(os.stat({path!r})[6], '-')
+"""
+
+# Opens a file at `start` (negative: that many bytes before the end) and
+# prints its size and the offset. Nothing is left open when there is nothing
+# to read, so polling a file that does not grow costs one round-trip.
+_RANGE_OPEN = """
+import os
+try:
+    import binascii
+except ImportError:
+    import ubinascii as binascii
+_s = os.stat({path!r})[6]
+_o = {start} if {start} >= 0 else max(0, _s + {start})
+print(_s, min(_o, _s))
+if _o < _s:
+    _f = open({path!r}, 'rb')
+    _f.seek(_o)
+"""
+
+# Byte offsets [start, end) of `count` lines starting at line `first`
+# (0-based; negative counts from the end), found by scanning on the board.
+_LINE_SPAN = """
+import os
+def _span(p, first, count):
+    s = os.stat(p)[6]
+    f = open(p, 'rb')
+    start, end = 0, s
+    if first >= 0:
+        start = 0 if first == 0 else s
+        n = pos = 0
+        while n < first + count:
+            b = f.read(512)
+            if not b:
+                break
+            i = b.find(b'\\n')
+            while i >= 0:
+                n += 1
+                if n == first:
+                    start = pos + i + 1
+                if n == first + count:
+                    end = pos + i + 1
+                    break
+                i = b.find(b'\\n', i + 1)
+            pos += len(b)
+    else:
+        n, pos = 0, s
+        stop = s - 1  # a final newline ends the last line, it does not start one
+        while pos > 0 and n < -first:
+            k = min(512, pos)
+            pos -= k
+            f.seek(pos)
+            b = f.read(k)
+            i = b.rfind(b'\\n', 0, min(k, stop - pos))
+            while i >= 0:
+                n += 1
+                if n == -first:
+                    start = pos + i + 1
+                    break
+                i = b.rfind(b'\\n', 0, i)
+        end = s
+    f.close()
+    print(s, start, end)
+_span({path!r}, {first}, {count})
+"""
+
+_GET_CHUNK = """
+_b = _f.read({size})
+if _b:
+    print(binascii.b2a_base64(_b).decode().strip())
+else:
+    _f.close()
+"""
+
+# Uploads are written to a partial file that is renamed once complete.
+_PUT_OPEN = """
+try:
+    import binascii
+except ImportError:
+    import ubinascii as binascii
+_f = open({path!r}, 'wb')
+_w = _f.write
+_d = binascii.a2b_base64
+"""
+
+# Reopen the partial file of an interrupted upload and print its size and
+# sha256, so the host can continue after the bytes it verifies. Prints 0 and
+# starts over when there is none or nothing to hash with.
+_PUT_RESUME = """
+import os
+try:
+    import binascii
+except ImportError:
+    import ubinascii as binascii
+_n = 0
+try:
+    try:
+        import hashlib
+    except ImportError:
+        import uhashlib as hashlib
+    _n = os.stat({path!r})[6]
+except (ImportError, OSError):
+    pass
+if _n:
+    _h = hashlib.sha256()
+    _f = open({path!r}, 'rb')
+    _b = _f.read(512)
+    while _b:
+        _h.update(_b)
+        _b = _f.read(512)
+    _f.close()
+    print(_n, binascii.hexlify(_h.digest()).decode())
+    _f = open({path!r}, 'r+b')
+else:
+    print(0)
+    _f = open({path!r}, 'wb')
+_w = _f.write
+_d = binascii.a2b_base64
+"""
+
+_PUT_RESTART = "_f.close()\n_f = open({path!r}, 'wb')\n_w = _f.write"
+
+# FAT cannot rename onto an existing file, littlefs replaces it atomically
+_PUT_DONE = """
+import os
+_f.close()
+try:
+    os.rename({src!r}, {dst!r})
+except OSError:
+    os.remove({dst!r})
+    os.rename({src!r}, {dst!r})
+"""
+
+# The length check turns bytes lost to a receive buffer overflow into an error
+# instead of a silently corrupted file; the seek makes a retried chunk harmless.
+_PUT_CHUNK = """
+_f.seek({offset})
+if _w(_d({data!r})) != {size}:
+    raise ValueError('short chunk')
+"""
+
+# Patching rewrites changed blocks of the existing file in place.
+_PATCH_OPEN = """
+try:
+    import binascii
+except ImportError:
+    import ubinascii as binascii
+_f = open({path!r}, 'r+b')
+_w = _f.write
+_d = binascii.a2b_base64
+"""
+
+_RM = "import os\nos.remove({path!r})"
+
+_RMDIR = """
+import os
+def _rmdir(d):
+    for n in os.listdir(d):
+        p = d.rstrip('/') + '/' + n
+        if os.stat(p)[0] & 0x4000:
+            _rmdir(p)
+        else:
+            os.remove(p)
+    os.rmdir(d)
+_rmdir({path!r})
+"""
+
+_MKDIR = """
+import os
+try:
+    os.mkdir({path!r})
+except OSError as e:
+    if not {exists_okay!r}:
+        raise
+"""
+
+# Lists, filters and removes in one round-trip. Prints one report line per
+# entry: "D<TAB>path" when deleted, "F<TAB>path<TAB>error" when it failed.
+_DELETE_MATCHING = """
+import os
+def _m(s, p):
+    i = j = 0
+    st = -1
+    mk = 0
+    while i < len(s):
+        if j < len(p) and (p[j] == '?' or p[j] == s[i]):
+            i += 1
+            j += 1
+        elif j < len(p) and p[j] == '*':
+            st = j
+            mk = i
+            j += 1
+        elif st >= 0:
+            j = st + 1
+            mk += 1
+            i = mk
+        else:
+            return False
+    while j < len(p) and p[j] == '*':
+        j += 1
+    return j == len(p)
+def _del(d, pat, rec, dirs):
+    for n in os.listdir(d):
+        p = (d.rstrip('/') + '/' + n) if d != '/' else '/' + n
+        try:
+            isdir = os.stat(p)[0] & 0x4000
+            if isdir:
+                if dirs and _m(n, pat):
+                    _del(p, '*', True, True)
+                    os.rmdir(p)
+                    print('D\t' + p)
+                elif rec:
+                    _del(p, pat, rec, dirs)
+            elif _m(n, pat):
+                os.remove(p)
+                print('D\t' + p)
+        except Exception as e:
+            print('F\t%s\t%s' % (p, e))
+_del({directory!r}, {pattern!r}, {recursive!r}, {remove_dirs!r})
+"""
+
+# Hashes many files in one round-trip. Prints per path "H<TAB>path<TAB>sha256",
+# "S<TAB>path<TAB>size<TAB>mtime" when hashlib is missing, "M<TAB>path" if absent.
+_HASH_FILES = """
+import os
+try:
+    import hashlib
+except ImportError:
+    try:
+        import uhashlib as hashlib
+    except ImportError:
+        hashlib = None
+try:
+    import binascii
+except ImportError:
+    import ubinascii as binascii
+_buf = bytearray({chunk})
+for p in {paths!r}:
+    try:
+        st = os.stat(p)
+    except OSError:
+        print('M\t' + p)
+        continue
+    if st[0] & 0x4000:
+        continue
+    if hashlib is None or not hasattr(hashlib, 'sha256'):
+        print('S\t%s\t%d\t%d' % (p, st[6], st[8]))
+        continue
+    h = hashlib.sha256()
+    mv = memoryview(_buf)
+    with open(p, 'rb') as f:
+        while True:
+            n = f.readinto(_buf)
+            if not n:
+                break
+            h.update(mv[:n])
+    print('H\t%s\t%s' % (p, binascii.hexlify(h.digest()).decode()))
+"""
+
+# Prints the file size, then the truncated sha256 of every block as one hex
+# string; "-" instead when the file is missing or there is nothing to hash with.
+_BLOCK_SUMS = """
+import os
+try:
+    import hashlib
+except ImportError:
+    try:
+        import uhashlib as hashlib
+    except ImportError:
+        hashlib = None
+try:
+    import binascii
+except ImportError:
+    import ubinascii as binascii
+try:
+    _s = os.stat({path!r})[6]
+except OSError:
+    _s = -1
+if _s < 0 or hashlib is None or not hasattr(hashlib, 'sha256'):
+    print(_s, '-')
+else:
+    print(_s, end=' ')
+    _buf = bytearray({block})
+    _mv = memoryview(_buf)
+    with open({path!r}, 'rb') as f:
+        while True:
+            n = f.readinto(_buf)
+            if not n:
+                break
+            print(binascii.hexlify(hashlib.sha256(_mv[:n]).digest()).decode()[:{digits}], end='')
+    print()
+"""
+
+# Prints "<module> <can_compress>": module is "deflate" (MicroPython >= 1.21),
+# "decompio" (older uzlib-based zlib) or "none".
+_COMPRESSION_PROBE = """
+try:
+    import deflate
+    import io
+    try:
+        _d = deflate.DeflateIO(io.BytesIO(), deflate.ZLIB, 8)
+        _d.write(b'a')
+        _d.close()
+        print('deflate 1')
+    except Exception:
+        print('deflate 0')
+except ImportError:
+    try:
+        import zlib
+        print('decompio 0' if hasattr(zlib, 'DecompIO') else 'none 0')
+    except ImportError:
+        print('none 0')
+"""
+
+# Inflates a compressed temp file in small chunks, so the board never holds the
+# whole payload in RAM. The output goes to `<target>.part` and replaces the
+# target only once complete, like an uncompressed upload.
+_INFLATE = """
+import os
+_i = open({src!r}, 'rb')
+try:
+    import deflate
+    _z = deflate.DeflateIO(_i, deflate.ZLIB)
+except ImportError:
+    import zlib
+    _z = zlib.DecompIO(_i, {wbits})
+_buf = bytearray({chunk})
+_mv = memoryview(_buf)
+with open({partial!r}, 'wb') as _o:
+    while True:
+        n = _z.readinto(_buf)
+        if not n:
+            break
+        _o.write(_mv[:n])
+_i.close()
+try:
+    os.rename({partial!r}, {dst!r})
+except OSError:
+    os.remove({dst!r})
+    os.rename({partial!r}, {dst!r})
+os.remove({src!r})
+"""
+
+_DEFLATE = """
+import os
+import deflate
+print(os.stat({src!r})[6])
+_buf = bytearray({chunk})
+_mv = memoryview(_buf)
+with open({src!r}, 'rb') as _i:
+    with open({dst!r}, 'wb') as _o:
+        _z = deflate.DeflateIO(_o, deflate.ZLIB, {wbits})
+        while True:
+            n = _i.readinto(_buf)
+            if not n:
+                break
+            _z.write(_mv[:n])
+        _z.close()
+"""
+
+# A bundle is a stream of "<size>\t<path>\n<data>" records ended by an empty
+# line. `_feed` unpacks it as it arrives, one file open at a time, so the
+# board never holds more than one chunk. Every file is written to a partial
+# name and renamed once complete. Offsets make a retried chunk harmless.
+_BUNDLE_OPEN = """
+import os
+try:
+    import binascii
+except ImportError:
+    import ubinascii as binascii
+_d = binascii.a2b_base64
+_bh = b''
+_bo = None
+_bn = 0
+_bp = 0
+_bpath = None
+_bdirs = set()
+_bdone = []
+def _bmk(d):
+    if d and d not in _bdirs:
+        _bmk(d[:d.rfind('/')])
+        try:
+            os.mkdir(d)
+        except OSError:
+            pass
+        _bdirs.add(d)
+def _bclose():
+    global _bo
+    _bo.close()
+    _bo = None
+    try:
+        os.rename(_bpath + {partial!r}, _bpath)
+    except OSError:
+        os.remove(_bpath)
+        os.rename(_bpath + {partial!r}, _bpath)
+    _bdone.append(_bpath)
+def _bunpack(b):
+    global _bh, _bo, _bn, _bpath
+    i = 0
+    while i < len(b):
+        if _bo is None:
+            j = b.find(b'\\n', i)
+            if j < 0:
+                _bh += b[i:]
+                return
+            _bh += b[i:j]
+            i = j + 1
+            if not _bh:
+                continue
+            n, _bpath = _bh.decode().split('\\t', 1)
+            _bh = b''
+            _bn = int(n)
+            _bmk(_bpath[:_bpath.rfind('/')])
+            _bo = open(_bpath + {partial!r}, 'wb')
+        k = min(_bn, len(b) - i)
+        _bo.write(b[i:i + k])
+        i += k
+        _bn -= k
+        if not _bn:
+            _bclose()
+def _feed(o, b, s):
+    global _bp
+    if len(b) != s:
+        raise ValueError('short chunk')
+    if o > _bp:
+        raise ValueError('bundle gap')
+    if o + s > _bp:
+        _bunpack(b[_bp - o:])
+        _bp = o + s
+def _babort():
+    if _bo is not None:
+        _bo.close()
+        os.remove(_bpath + {partial!r})
+"""
+
+_BUNDLE_CHUNK = "_feed({offset}, _d({data!r}), {size})"
+
+# Unpacks a compressed bundle uploaded to `src`, streaming through the inflater.
+_BUNDLE_INFLATE = """
+import os
+_i = open({src!r}, 'rb')
+try:
+    import deflate
+    _z = deflate.DeflateIO(_i, deflate.ZLIB)
+except ImportError:
+    import zlib
+    _z = zlib.DecompIO(_i, {wbits})
+_buf = bytearray({chunk})
+_mv = memoryview(_buf)
+while True:
+    n = _z.readinto(_buf)
+    if not n:
+        break
+    _bunpack(bytes(_mv[:n]))
+_i.close()
+os.remove({src!r})
+"""
+
+_BUNDLE_DONE = """
+if _bo is not None or _bh:
+    _babort()
+    raise ValueError('truncated bundle')
+print(len(_bdone))
+"""
+
+# Whole tree in one round-trip: "d<TAB>path" or "f<TAB>path<TAB>size".
+_WALK = """
+import os
+def _walk(d, r):
+    for n in os.listdir(d):
+        p = (d.rstrip('/') + '/' + n) if d != '/' else '/' + n
+        st = os.stat(p)
+        if st[0] & 0x4000:
+            print('d\t' + p)
+            if r:
+                _walk(p, r)
+        else:
+            print('f\t%s\t%d' % (p, st[6]))
+_walk({directory!r}, {recursive!r})
+"""
+
+_UNIQUE_ID = """
+try:
+    import machine
+    try:
+        import binascii
+    except ImportError:
+        import ubinascii as binascii
+    print(binascii.hexlify(machine.unique_id()).decode())
+except Exception:
+    print('')
+"""
+
+# Creates every missing directory of the list in one round-trip, parents first.
+_MAKEDIRS = """
+import os
+for p in {paths!r}:
+    try:
+        os.mkdir(p)
+    except OSError:
+        if not os.stat(p)[0] & 0x4000:
+            raise
+"""
+
+# Removes the files of the list that exist, printing each one removed.
+_REMOVE_FILES = """
+import os
+for p in {paths!r}:
+    try:
+        os.remove(p)
+        print(p)
+    except OSError:
+        pass
+"""
+
+_MPY_VERSION = "import sys\nprint(getattr(sys.implementation, '_mpy', 0))"
+
+_FIRMWARE = """
+import sys
+print(sys.platform)
+print('.'.join(str(v) for v in sys.implementation.version[:3]))
+"""
+
+_SET_BAUDRATE = """
+import machine
+import time
+machine.UART(0, {baudrate})
+time.sleep_ms(200)
+"""
+
+# Error text that means the code or payload arrived damaged, not that the
+# operation itself failed on the board.
+_CORRUPTION_MARKERS = ("SyntaxError", "ValueError", "Incorrect padding", "short chunk")
+
+
+def transfer_stats(
+    raw_bytes: int, wire_bytes: int, start: float, compressed: bool, patched: bool = False
+) -> dict:
+    return {
+        "raw_bytes": raw_bytes,
+        "wire_bytes": wire_bytes,
+        "seconds": time.monotonic() - start,
+        "compressed": compressed,
+        "patched": patched,
+    }
+
+
+def deflate(data: bytes) -> bytes:
+    """Compress `data` the way the board's decompressor expects it."""
+    packer = zlib.compressobj(9, zlib.DEFLATED, COMPRESS_WBITS)
+    return packer.compress(data) + packer.flush()
+
+
+class AmpySession:
+    """One open serial connection kept in raw REPL mode.
+
+    The object is safe to share between threads; every device round-trip is
+    serialized through an internal lock.
+    """
+
+    def __init__(
+        self,
+        port: str,
+        baudrate: int = DEFAULT_BAUDRATE,
+        timeout: float = 10.0,
+        soft_reset: bool = True,
+    ):
+        self.port = port
+        self.baudrate = baudrate
+        self._initial_baudrate = baudrate
+        self.timeout = timeout
+        self.soft_reset = soft_reset
+        self.serial = None
+        self.lock = threading.RLock()
+        self._prompt_pending = False
+        self._rx = bytearray()
+        self._deadline = None  # time.monotonic() the running exec must finish by
+        self._limit = None  # wall-clock end of the running exec's `limit`, never moved
+        self._compression = None
+        self._unique_id = None
+        self._mpy_version = None
+        # link parameters, adjusted by tuning and restored from a saved profile
+        self.transfer_chunk = TRANSFER_CHUNK
+        self.write_delay = 0.0
+        self._clean_chunks = 0
+        self._chunk_rates: dict[int, float] = {}
+        self._chunk_settled = False
+        # running totals, read by AM_metrics to attribute cost to operations
+        self.counters = {"bytes_sent": 0, "bytes_received": 0, "retries": 0}
+        self.phase_seconds: dict[str, float] = {}
+
+    # --- connection ---
+    def open(self):
+        if self.serial is not None:
+            return self
+        start = time.monotonic()
+        self.serial = serial.Serial(self.port, self.baudrate, timeout=0.1, write_timeout=WRITE_TIMEOUT)
+        self._add_phase("connect", start)
+        try:
+            start = time.monotonic()
+            self.enter_raw_repl()
+            self._add_phase("reset", start)
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def close(self):
+        if self.serial is None:
+            return
+        if self.baudrate != self._initial_baudrate:
+            # leave the board on the rate other tools expect
+            try:
+                self._switch_baudrate(self._initial_baudrate)
+            except (OSError, serial.SerialException, SessionError):
+                pass
+            self.baudrate = self._initial_baudrate
+        try:
+            self.serial.write(b"\r\x02")  # back to the friendly REPL
+        except (OSError, serial.SerialException):
+            pass
+        try:
+            self.serial.close()
+        finally:
+            self.serial = None
+
+    def _drop_port(self):
+        """Close the port without talking to the board, which may not listen any more."""
+        if self.serial is not None:
+            try:
+                self.serial.close()
+            except (OSError, serial.SerialException):
+                pass
+            self.serial = None
+        self._rx.clear()
+        self._prompt_pending = False
+
+    def _add_phase(self, phase: str, start: float):
+        self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + time.monotonic() - start
+
+    def snapshot(self) -> dict:
+        """Copy of the running counters and per-phase times."""
+        return {**self.counters, "phases": dict(self.phase_seconds)}
+
+    @property
+    def is_open(self) -> bool:
+        return self.serial is not None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- raw REPL protocol ---
+    def read_until(self, ending: bytes, timeout: float | None = None) -> bytes:
+        """Read up to and including `ending`; bytes past it stay buffered.
+
+        Fails after `timeout` seconds without a byte, and inside a bounded
+        `exec_raw` once its deadline has passed; every byte received moves
+        that deadline on by its share of the link time. An `exec_raw` with a
+        `limit` fails once that many seconds have passed, output or not.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        start = 0
+        while True:
+            idx = self._rx.find(ending, start)
+            if idx >= 0:
+                end = idx + len(ending)
+                data = bytes(self._rx[:end])
+                del self._rx[:end]
+                return data
+            start = max(0, len(self._rx) - len(ending) + 1)
+            chunk = self.serial.read(max(1, self.serial.in_waiting))
+            if chunk:
+                self.counters["bytes_received"] += len(chunk)
+                self._rx += chunk
+                deadline = time.monotonic() + timeout
+                if self._deadline is not None:
+                    self._deadline += len(chunk) * DEADLINE_FACTOR / self.link_rate()
+            elif time.monotonic() > deadline:
+                raise SessionError(
+                    f"Timeout waiting for {ending!r} on {self.port} (got {bytes(self._rx[-40:])!r})"
+                )
+            if self._deadline is not None and time.monotonic() > self._deadline:
+                raise DeadlineExceeded(f"{self.port} is too slow to answer, the link looks stalled")
+            if self._limit is not None and time.monotonic() > self._limit:
+                raise DeadlineExceeded(f"Code on {self.port} still running after its time limit")
+
+    def link_rate(self) -> float:
+        """Bytes per second the link is expected to carry: measured if known, else the baud rate."""
+        return max(self._chunk_rates.values(), default=0.0) or self.baudrate / 10
+
+    def deadline_for(self, num_bytes: int) -> float:
+        """Seconds a round-trip moving `num_bytes` may take before it counts as stalled."""
+        return DEADLINE_MIN + DEADLINE_FACTOR * num_bytes / self.link_rate()
+
+    def enter_raw_repl(self, timeout: float | None = None, soft_reset: bool | None = None):
+        self.serial.write(b"\r\x03\x03")  # interrupt whatever is running
+        time.sleep(0.1)
+        self.serial.reset_input_buffer()
+        self._rx.clear()
+        self.serial.write(b"\r\x01")
+        self.read_until(RAW_REPL_BANNER + b">", timeout)
+        self._prompt_pending = False
+        if self.soft_reset if soft_reset is None else soft_reset:
+            self.serial.write(b"\x04")
+            self.read_until(SOFT_REBOOT, timeout)
+            self.read_until(RAW_REPL_BANNER, timeout)
+            self._prompt_pending = True  # ">" is read by the next exec
+
+    def exec_raw(
+        self, code: str, timeout: float | None = None, bounded: bool = True, limit: float | None = None
+    ) -> tuple[bytes, bytes]:
+        """Execute `code` on the board and return its (stdout, stderr).
+
+        `timeout` is how long the board may stay silent. A `bounded` call must
+        also be done within `deadline_for` the bytes it moves. Code whose run
+        time is set by work on the board rather than by the link (hashing,
+        walking, compressing, deleting many files, a user's script) passes
+        False and is guarded by the silence timeout alone. `limit` caps the
+        whole call in seconds; the code keeps running on the board after it
+        expires, until the session is recovered.
+        """
+        with self.lock:
+            if self.serial is None:
+                self.open()
+            if self._prompt_pending:
+                self.read_until(b">", timeout)
+            start = time.monotonic()
+            data = code.encode("utf-8") + b"\x04"
+            for i in range(0, len(data), WRITE_CHUNK):
+                self.serial.write(data[i : i + WRITE_CHUNK])
+                if self.write_delay:
+                    time.sleep(self.write_delay)
+            self.counters["bytes_sent"] += len(data)
+            self._prompt_pending = True
+            self._add_phase("send", start)
+            start = time.monotonic()
+            if bounded:  # writes are bounded by WRITE_TIMEOUT, the deadline covers the reply
+                self._deadline = start + self.deadline_for(len(data))
+            if limit is not None:
+                self._limit = start + limit
+            try:
+                ack = self.read_until(b"OK", timeout)
+                if ack != b"OK":
+                    raise SessionError(f"Could not execute command: {ack!r}")
+                out = self.read_until(b"\x04", timeout)[:-1]
+                err = self.read_until(b"\x04", timeout)[:-1]
+            finally:
+                self._deadline = self._limit = None
+                self._add_phase("device", start)
+            return out, err
+
+    def exec_(
+        self, code: str, timeout: float | None = None, bounded: bool = True, limit: float | None = None
+    ) -> bytes:
+        out, err = self.exec_raw(code, timeout, bounded, limit)
+        if err:
+            raise DeviceError(err.decode("utf-8", "replace").strip())
+        return out
+
+    # --- file operations ---
+    def ls(
+        self, directory: str = "/", long_format: bool = False, recursive: bool = False
+    ) -> list[str]:
+        out = self.exec_(
+            _LS.format(
+                directory=directory, recursive=recursive, long_format=long_format
+            )
+        )
+        return [line.strip() for line in out.decode("utf-8").splitlines() if line.strip()]
+
+    def compression_support(self) -> dict[str, bool]:
+        """Which direction of compressed transfer the firmware can handle."""
+        if self._compression is None:
+            module, can_compress = self.exec_(_COMPRESSION_PROBE).decode().split()
+            self._compression = {
+                "decompress": module in ("deflate", "decompio"),
+                "compress": module == "deflate" and can_compress == "1",
+            }
+        return self._compression
+
+    def _read_remote(self, remote_file: str, sink, on_open=None, offset=0, prefix_sha256=None) -> int:
+        """Feed a remote file to `sink(chunk)` one chunk at a time.
+
+        Returns the size the board reported for the file when it was opened,
+        which is also passed to `on_open(size, offset)` before the first chunk.
+        With `offset`, reading continues there if the board's first `offset`
+        bytes hash to `prefix_sha256`; otherwise it starts over and `on_open`
+        gets an offset of 0.
+        """
+        if offset:
+            fields = self.exec_(_GET_RESUME.format(path=remote_file, offset=offset), bounded=False).split()
+            size = int(fields[0])
+            if offset > size or fields[1].decode() != prefix_sha256:
+                self.exec_raw("_f.seek(0)")
+                offset = 0
+        else:
+            size = int(self.exec_(_GET_OPEN.format(path=remote_file)))
+        if on_open is not None:
+            on_open(size, offset)
+        try:
+            while True:
+                out = self.exec_(_GET_CHUNK.format(size=self.transfer_chunk)).strip()
+                if not out:
+                    return size
+                sink(base64.b64decode(out))
+        except (DeviceError, TransferCancelled):
+            self.exec_raw("_f.close()")
+            raise
+
+    def download(
+        self,
+        remote_file: str,
+        dest,
+        compress: bool = False,
+        progress=None,
+        offset: int = 0,
+        prefix_sha256: str | None = None,
+    ) -> dict:
+        """Stream a remote file into the binary file object `dest`.
+
+        Memory use is bounded by one chunk regardless of file size. `progress`
+        is called as `progress(new_bytes, total_bytes)` after every chunk. The byte
+        count is checked against the remote `os.stat` size. Returns the same
+        stats dict as `put_bytes`.
+
+        To resume, pass `dest` positioned after the `offset` bytes it already
+        holds and their sha256; if the board's file no longer starts with them
+        (or the transfer is compressed) `dest` is truncated and filled anew.
+        """
+        start = time.monotonic()
+        written = 0
+        size = 0
+
+        def set_size(remote_size: int, start_offset: int):
+            nonlocal size, written
+            size = remote_size
+            written = start_offset
+            if start_offset != offset:
+                dest.seek(start_offset)
+                dest.truncate()
+            if start_offset and progress is not None:
+                progress(start_offset, size)
+
+        def emit(chunk: bytes):
+            nonlocal written
+            if chunk:
+                dest.write(chunk)
+                written += len(chunk)
+                if progress is not None:
+                    progress(len(chunk), size)
+
+        with self.lock:
+            compressed = compress and self.compression_support()["compress"]
+            if compressed:
+                if offset:
+                    set_size(0, 0)  # a deflate stream cannot be entered halfway
+                temp_file = remote_file + COMPRESSED_SUFFIX
+                size = int(
+                    self.exec_(
+                        _DEFLATE.format(
+                            src=remote_file, dst=temp_file, chunk=TRANSFER_CHUNK, wbits=COMPRESS_WBITS
+                        ),
+                        bounded=False,
+                    )
+                )
+                inflater = zlib.decompressobj()
+                try:
+                    wire_bytes = self._read_remote(
+                        temp_file, lambda chunk: emit(inflater.decompress(chunk))
+                    )
+                finally:
+                    self.rm(temp_file)
+                emit(inflater.flush())
+            else:
+                wire_bytes = self._read_remote(remote_file, emit, set_size, offset, prefix_sha256)
+
+        if written != size:
+            raise SessionError(
+                f"Size mismatch for {remote_file}: device reports {size} bytes, received {written}"
+            )
+        return transfer_stats(written, wire_bytes, start, compressed)
+
+    def read_range(self, remote_file: str, start: int = 0, length: int | None = None, sink=None):
+        """Read `length` bytes (all to the end when None) from offset `start`.
+
+        A negative `start` counts back from the end of the file, so tails
+        and appended data come without transferring the rest. Chunks go to
+        `sink(chunk)` as they arrive; without a sink they are returned.
+        Returns (data or b"", offset read from, file size).
+        """
+        parts = []
+        sink = sink or parts.append
+        with self.lock:
+            size, offset = (int(v) for v in self.exec_(_RANGE_OPEN.format(path=remote_file, start=start)).split())
+            remaining = size - offset if length is None else min(length, size - offset)
+            if offset >= size:
+                return b"", offset, size
+            try:
+                while remaining > 0:
+                    out = self.exec_(_GET_CHUNK.format(size=min(self.transfer_chunk, remaining))).strip()
+                    if not out:
+                        break  # the file shrank while reading
+                    chunk = base64.b64decode(out)
+                    remaining -= len(chunk)
+                    sink(chunk)
+            finally:
+                self.exec_raw("_f.close()")
+        return b"".join(parts), offset, size
+
+    def line_span(self, remote_file: str, first: int, count: int) -> tuple[int, int, int]:
+        """Byte range (start, end, file size) of `count` lines from line `first`.
+
+        `first` is 0-based; a negative one selects the last `-first` lines.
+        The file is scanned on the board, only three numbers come back.
+        """
+        out = self.exec_(_LINE_SPAN.format(path=remote_file, first=first, count=count), bounded=False)
+        size, start, end = (int(v) for v in out.split())
+        return start, end, size
+
+    def download_file(
+        self, remote_file: str, local_file: str, compress: bool = False, progress=None
+    ) -> dict:
+        """Download into `local_file` by way of `local_file + PARTIAL_SUFFIX`.
+
+        A partial file left by an interrupted download is continued once the
+        board confirms its copy still starts with the same bytes. The partial
+        file is renamed into place when complete and kept after a broken link
+        for the next attempt.
+        """
+        partial = local_file + PARTIAL_SUFFIX
+        with open(partial, "r+b" if os.path.exists(partial) else "w+b") as f:
+            digest = hashlib.sha256()
+            for block in iter(lambda: f.read(64 * 1024), b""):
+                digest.update(block)
+            offset = f.tell()
+            try:
+                stats = self.download(
+                    remote_file, f, compress, progress, offset, digest.hexdigest()
+                )
+            except DeviceError:
+                f.close()
+                os.remove(partial)  # the board answered, there is nothing to resume
+                raise
+        os.replace(partial, local_file)
+        return stats
+
+    def get(self, remote_file: str, compress: bool = False) -> bytes:
+        return self.get_with_stats(remote_file, compress)[0]
+
+    def get_with_stats(self, remote_file: str, compress: bool = False) -> tuple[bytes, dict]:
+        """Download a whole file into memory, see `download` for the details."""
+        buffer = io.BytesIO()
+        stats = self.download(remote_file, buffer, compress)
+        return buffer.getvalue(), stats
+
+    def _put_raw(self, data: bytes, remote_file: str, progress=None, resume: bool = False):
+        with self.lock:
+            partial = remote_file + PARTIAL_SUFFIX
+            offset = 0
+            if resume:
+                fields = self.exec_(_PUT_RESUME.format(path=partial), bounded=False).split()
+                if len(fields) == 2:
+                    size = int(fields[0])
+                    if size <= len(data) and hashlib.sha256(data[:size]).hexdigest() == fields[1].decode():
+                        offset = size
+                    else:
+                        self.exec_(_PUT_RESTART.format(path=partial))
+            else:
+                self.exec_(_PUT_OPEN.format(path=partial))
+            complete = False
+            try:
+                if offset and progress is not None:
+                    progress(offset, len(data))
+                self._send_range(data, offset, len(data), progress, len(data))
+                complete = True
+            finally:
+                if complete:
+                    self.exec_(_PUT_DONE.format(src=partial, dst=remote_file))
+                else:
+                    self.exec_("_f.close()")
+
+    def _send_range(
+        self, data: bytes, offset: int, end: int, progress, total: int, template: str = _PUT_CHUNK
+    ):
+        """Write `data[offset:end]` at the same offset of the open remote `_f`.
+
+        `template` is the code run per chunk, given `data`, `size` and `offset`.
+        """
+        retries = 0
+        while offset < end:
+            size = min(self.transfer_chunk, end - offset)
+            chunk = base64.b64encode(data[offset : offset + size])
+            start = time.monotonic()
+            try:
+                self.exec_(template.format(data=chunk, size=size, offset=offset))
+            except SessionError as e:
+                if retries >= MAX_CHUNK_RETRIES or not self._is_overflow(e):
+                    raise
+                retries += 1
+                self._back_off()
+                continue
+            offset += size
+            retries = 0
+            self._chunk_done(size, time.monotonic() - start)
+            if progress is not None:
+                progress(size, total)
+
+    def changed_blocks(self, data: bytes, remote_file: str, block: int = DELTA_BLOCK):
+        """Byte ranges `(start, end)` of `data` that differ from `remote_file`.
+
+        The board hashes its copy block by block in one call. Returns None
+        when the file cannot be patched in place: it is missing, longer than
+        `data` (MicroPython files cannot be truncated) or unhashable.
+        """
+        fields = self.exec_(
+            _BLOCK_SUMS.format(path=remote_file, block=block, digits=DELTA_DIGEST), bounded=False
+        ).split()
+        size = int(fields[0])
+        if size < 0 or size > len(data) or (len(fields) > 1 and fields[1] == b"-"):
+            return None
+        digests = fields[1].decode() if len(fields) > 1 else ""
+        ranges = []
+        for number, offset in enumerate(range(0, len(data), block)):
+            piece = data[offset : offset + block]
+            remote = digests[number * DELTA_DIGEST : (number + 1) * DELTA_DIGEST]
+            if (
+                offset + len(piece) <= size
+                and hashlib.sha256(piece).hexdigest()[:DELTA_DIGEST] == remote
+            ):
+                continue
+            if ranges and ranges[-1][1] == offset:
+                ranges[-1] = (ranges[-1][0], offset + len(piece))
+            else:
+                ranges.append((offset, offset + len(piece)))
+        return ranges
+
+    def patch(self, data: bytes, remote_file: str, progress=None) -> dict | None:
+        """Make `remote_file` equal `data` by rewriting only the blocks that differ.
+
+        The whole file is hashed afterwards; returns transfer stats when it
+        matches, or None when the file could not be patched (see
+        `changed_blocks`) or came out different, in which case the caller
+        uploads it whole. `progress` gets `(new_bytes, bytes_to_send)`.
+        """
+        start = time.monotonic()
+        with self.lock:
+            ranges = self.changed_blocks(data, remote_file)
+            if ranges is None:
+                return None
+            total = sum(end - offset for offset, end in ranges)
+            if ranges:
+                self.exec_(_PATCH_OPEN.format(path=remote_file))
+                try:
+                    for offset, end in ranges:
+                        self._send_range(data, offset, end, progress, total)
+                finally:
+                    self.exec_("_f.close()")
+            digest = self.hash_files([remote_file]).get(remote_file)
+            if digest != ("sha256", hashlib.sha256(data).hexdigest()):
+                return None
+        return transfer_stats(len(data), total, start, False, patched=True)
+
+    # --- link tuning ---
+    @staticmethod
+    def _is_overflow(error: SessionError) -> bool:
+        if not isinstance(error, DeviceError):
+            return True  # lost bytes, e.g. the end-of-code marker, show up as a timeout
+        return any(marker in str(error) for marker in _CORRUPTION_MARKERS)
+
+    def _back_off(self):
+        """Recover from a damaged chunk: resync, send less and more slowly."""
+        self.counters["retries"] += 1
+        self.resync()
+        self.transfer_chunk = max(MIN_TRANSFER_CHUNK, self.transfer_chunk // 2)
+        self.write_delay = min(MAX_WRITE_DELAY, max(0.002, self.write_delay * 2))
+        self._clean_chunks = 0
+        self._chunk_settled = True  # do not grow back into the overflow
+
+    def _chunk_done(self, size: int, seconds: float):
+        """Measure acknowledged throughput and try bigger chunks while it improves."""
+        if size < self.transfer_chunk or seconds <= 0:
+            return  # the short tail of a file says nothing about the link
+        rate = size / seconds
+        best = self._chunk_rates.get(self.transfer_chunk, 0.0)
+        self._chunk_rates[self.transfer_chunk] = max(best, rate)
+        self._clean_chunks += 1
+        if self._chunk_settled or self._clean_chunks < GROW_AFTER:
+            return
+        self._clean_chunks = 0
+        smaller = self._chunk_rates.get(self.transfer_chunk // 2)
+        if smaller is not None and smaller > self._chunk_rates[self.transfer_chunk]:
+            self.transfer_chunk //= 2  # doubling did not pay off, stay at the best size
+            self._chunk_settled = True
+        elif self.transfer_chunk < MAX_TRANSFER_CHUNK:
+            self.transfer_chunk *= 2
+        else:
+            self._chunk_settled = True
+
+    def resync(self, timeout: float | None = None):
+        """Get back to a clean raw REPL prompt after garbled traffic."""
+        with self.lock:
+            self.serial.write(b"\r\x03")  # abort the half-received code
+            time.sleep(0.05)
+            self.serial.reset_input_buffer()
+            self._rx.clear()
+            self.serial.write(b"\x01")  # re-announces the raw REPL
+            self.read_until(RAW_REPL_BANNER + b">", timeout)
+            self._prompt_pending = False
+
+    def recover(self) -> str:
+        """Get a stalled board answering again, escalating until a step works.
+
+        Interrupts the running code (Ctrl-C) first, then soft-resets the
+        board, then reopens the port; each step is checked with a round-trip.
+        Returns the step that worked. When none did, the port is closed and
+        SessionError is raised.
+        """
+        with self.lock:
+            for step in ("interrupt", "soft reset", "reopen"):
+                try:
+                    if step == "reopen":
+                        self._drop_port()
+                        self.open()
+                    elif self.serial is None:
+                        continue
+                    elif step == "interrupt":
+                        self.resync(RECOVER_TIMEOUT)
+                    else:
+                        self.enter_raw_repl(RECOVER_TIMEOUT, soft_reset=True)
+                    if self.exec_("print('ping')", timeout=RECOVER_TIMEOUT).strip() == b"ping":
+                        return step
+                except (OSError, serial.SerialException, SessionError):
+                    pass
+            self._drop_port()
+            raise SessionError(f"{self.port} does not answer, not even after reopening the port")
+
+    def link_profile(self) -> dict:
+        """Tuned link parameters, to be saved and restored with `apply_link_profile`."""
+        return {
+            "baudrate": self.baudrate,
+            "transfer_chunk": self.transfer_chunk,
+            "write_delay": self.write_delay,
+            "settled": self._chunk_settled,
+        }
+
+    def apply_link_profile(self, profile: dict):
+        self.transfer_chunk = int(profile.get("transfer_chunk", self.transfer_chunk))
+        self.write_delay = float(profile.get("write_delay", self.write_delay))
+        self._chunk_settled = bool(profile.get("settled", False))
+        baudrate = int(profile.get("baudrate", self.baudrate))
+        if baudrate != self.baudrate:
+            self.upgrade_baudrate((baudrate,))
+
+    def upgrade_baudrate(self, candidates=BAUD_CANDIDATES) -> int:
+        """Switch the board's REPL UART to the fastest working rate in `candidates`.
+
+        Only done on platforms with a USB-serial bridge. Every rate is verified
+        with a round-trip before it is kept. Returns the rate in use afterwards.
+        """
+        platform = self.exec_("import sys\nprint(sys.platform)").decode().strip()
+        if platform not in BAUD_UPGRADE_PLATFORMS:
+            return self.baudrate
+        for baudrate in sorted(candidates, reverse=True):
+            if baudrate != self.baudrate and self._switch_baudrate(baudrate):
+                break
+        return self.baudrate
+
+    def _switch_baudrate(self, baudrate: int) -> bool:
+        old_baudrate = self.baudrate
+        with self.lock:
+            if self._prompt_pending:
+                self.read_until(b">")
+            self.serial.write(_SET_BAUDRATE.format(baudrate=baudrate).encode() + b"\x04")
+            self._prompt_pending = True
+            try:
+                self.read_until(b"OK", 2)
+                time.sleep(0.05)  # the board switches while it sleeps
+                self.serial.baudrate = baudrate
+                self.resync(2)
+                if self.exec_("print('ping')", timeout=2).strip() == b"ping":
+                    self.baudrate = baudrate
+                    return True
+            except SessionError:
+                pass
+            # the board may or may not have switched, put both ends back on the old rate
+            try:
+                self.serial.baudrate = baudrate
+                self.resync(2)
+                self.exec_(_SET_BAUDRATE.format(baudrate=old_baudrate), timeout=2)
+            except SessionError:
+                pass
+            self.serial.baudrate = old_baudrate
+            self.resync()
+            return False
+
+    def put_bytes(
+        self,
+        data: bytes,
+        remote_file: str,
+        compress: bool = False,
+        progress=None,
+        resume: bool = False,
+        delta: bool = False,
+        packed: bytes | None = None,
+    ) -> dict:
+        """Upload `data`, sending it deflate-compressed when that helps.
+
+        Falls back to a raw transfer when the firmware has no decompressor or
+        the payload does not shrink. `progress` is called as
+        `progress(new_bytes, total_bytes)` in bytes on the wire after every
+        acknowledged chunk. Returns the same stats as `get_with_stats`.
+
+        The file is written under `PARTIAL_SUFFIX` and renamed when complete.
+        With `resume`, the partial file of an interrupted upload of the same
+        data is continued from the last byte the board can prove it holds.
+
+        With `delta`, an existing remote file of at least `DELTA_MIN_SIZE`
+        bytes is patched in place instead (see `patch`); that is not atomic,
+        but the result is verified and uploaded whole when it is wrong.
+
+        `packed` is `deflate(data)` when the caller already computed it,
+        e.g. on another thread while the link was busy.
+        """
+        start = time.monotonic()
+        with self.lock:
+            if delta and len(data) >= DELTA_MIN_SIZE:
+                stats = self.patch(data, remote_file, progress)
+                if stats is not None:
+                    return stats
+            if compress and self.compression_support()["decompress"]:
+                if packed is None:
+                    packed = deflate(data)
+                if len(packed) >= len(data):
+                    packed = None
+            else:
+                packed = None
+            if packed is None:
+                self._put_raw(data, remote_file, progress, resume)
+                return transfer_stats(len(data), len(data), start, False)
+
+            temp_file = remote_file + COMPRESSED_SUFFIX
+            self._put_raw(packed, temp_file, progress, resume)
+            self.exec_(
+                _INFLATE.format(
+                    src=temp_file,
+                    dst=remote_file,
+                    partial=remote_file + PARTIAL_SUFFIX,
+                    chunk=TRANSFER_CHUNK,
+                    wbits=COMPRESS_WBITS,
+                ),
+                bounded=False,
+            )
+        return transfer_stats(len(data), len(packed), start, True)
+
+    def put_bundle(self, files, compress: bool = False, progress=None) -> dict:
+        """Write many small files with a single transfer.
+
+        `files` is a list of `(remote_path, data)`; missing folders are
+        created on the way. The board unpacks the stream as it arrives, or,
+        when compressed, from a temporary file through the inflater; either
+        way only one chunk is held in its RAM. Returns transfer stats.
+        """
+        start = time.monotonic()
+        archive = b"".join(f"{len(data)}\t{path}\n".encode("utf-8") + data for path, data in files)
+        archive += b"\n"
+        with self.lock:
+            packed = None
+            if compress and self.compression_support()["decompress"]:
+                packed = deflate(archive)
+                if len(packed) >= len(archive):
+                    packed = None
+            self.exec_(_BUNDLE_OPEN.format(partial=PARTIAL_SUFFIX))
+            complete = False
+            try:
+                if packed is None:
+                    self._send_range(archive, 0, len(archive), progress, len(archive), _BUNDLE_CHUNK)
+                else:
+                    self._put_raw(packed, BUNDLE_FILE + COMPRESSED_SUFFIX, progress)
+                    self.exec_(
+                        _BUNDLE_INFLATE.format(
+                            src=BUNDLE_FILE + COMPRESSED_SUFFIX, chunk=TRANSFER_CHUNK, wbits=COMPRESS_WBITS
+                        ),
+                        bounded=False,
+                    )
+                written = int(self.exec_(_BUNDLE_DONE))
+                complete = True
+            finally:
+                if not complete:
+                    self.exec_raw("_babort()")
+        if written != len(files):
+            raise DeviceError(f"bundle unpacked {written} of {len(files)} files")
+        return transfer_stats(len(archive), len(packed or archive), start, packed is not None)
+
+    def put(
+        self,
+        local_file: str,
+        remote_file: str,
+        compress: bool = False,
+        progress=None,
+        resume: bool = False,
+        delta: bool = False,
+    ) -> dict:
+        with open(local_file, "rb") as f:
+            return self.put_bytes(f.read(), remote_file, compress, progress, resume, delta)
+
+    def rm(self, path: str):
+        self.exec_(_RM.format(path=path))
+
+    def rmdir(self, path: str):
+        self.exec_(_RMDIR.format(path=path), bounded=False)
+
+    def mkdir(self, path: str, exists_okay: bool = False):
+        self.exec_(_MKDIR.format(path=path, exists_okay=exists_okay))
+
+    def walk(self, directory: str = "/", recursive: bool = True) -> list[tuple[str, str, int]]:
+        """Every entry below `directory` as `(path, "f" | "d", size)`.
+
+        Without `recursive` only the entries directly in `directory` are listed.
+        """
+        entries = []
+        out = self.exec_(_WALK.format(directory=directory, recursive=recursive), bounded=False)
+        for line in out.decode("utf-8", "replace").splitlines():
+            fields = line.rstrip("\r").split("\t")
+            if fields[0] == "d" and len(fields) == 2:
+                entries.append((fields[1], "d", 0))
+            elif fields[0] == "f" and len(fields) == 3:
+                entries.append((fields[1], "f", int(fields[2])))
+        return entries
+
+    @property
+    def known_unique_id(self) -> str | None:
+        """The board ID if it was already read, without touching the link."""
+        return self._unique_id
+
+    def unique_id(self) -> str:
+        """Hex `machine.unique_id()` of the board, empty if it has none."""
+        if self._unique_id is None:
+            self._unique_id = self.exec_(_UNIQUE_ID).decode().strip()
+        return self._unique_id
+
+    def delete_matching(
+        self,
+        pattern: str = "*",
+        directory: str = "/",
+        recursive: bool = False,
+        remove_dirs: bool = False,
+    ) -> dict[str, list]:
+        """Delete every file under `directory` whose name matches the glob.
+
+        Runs entirely on the board in one round-trip. With `remove_dirs`,
+        matching directories are emptied and removed as well. Returns
+        `{"deleted": [path, ...], "failed": [(path, error), ...]}`.
+        """
+        out = self.exec_(
+            _DELETE_MATCHING.format(
+                directory=directory,
+                pattern=pattern,
+                recursive=recursive,
+                remove_dirs=remove_dirs,
+            ),
+            bounded=False,
+        )
+        report = {"deleted": [], "failed": []}
+        for line in out.decode("utf-8", "replace").splitlines():
+            fields = line.rstrip("\r").split("\t", 2)
+            if fields[0] == "D" and len(fields) > 1:
+                report["deleted"].append(fields[1])
+            elif fields[0] == "F" and len(fields) > 1:
+                report["failed"].append((fields[1], fields[2] if len(fields) > 2 else ""))
+        return report
+
+    def hash_files(self, paths: list[str]) -> dict[str, tuple | None]:
+        """Fingerprint remote files, `HASH_BATCH` per round-trip.
+
+        Maps each path to `("sha256", hexdigest)`, to `("stat", size, mtime)`
+        on firmware without `hashlib`, or to None when the file is missing.
+        """
+        paths = list(paths)
+        out = b""
+        for start in range(0, len(paths), HASH_BATCH):
+            batch = paths[start : start + HASH_BATCH]
+            out += self.exec_(_HASH_FILES.format(paths=batch, chunk=TRANSFER_CHUNK), bounded=False)
+        result = {}
+        for line in out.decode("utf-8", "replace").splitlines():
+            fields = line.rstrip("\r").split("\t")
+            if fields[0] == "H" and len(fields) == 3:
+                result[fields[1]] = ("sha256", fields[2])
+            elif fields[0] == "S" and len(fields) == 4:
+                result[fields[1]] = ("stat", int(fields[2]), int(fields[3]))
+            elif fields[0] == "M" and len(fields) == 2:
+                result[fields[1]] = None
+        return result
+
+    def makedirs(self, paths):
+        """Create all `paths` (and their parents) in one call, existing ones are fine."""
+        wanted = set()
+        for path in paths:
+            parts = path.strip("/").split("/")
+            for depth in range(1, len(parts) + 1):
+                if parts[depth - 1]:
+                    wanted.add("/" + "/".join(parts[:depth]))
+        if wanted:
+            self.exec_(_MAKEDIRS.format(paths=sorted(wanted, key=lambda p: p.count("/"))))
+
+    def remove_files(self, paths) -> list[str]:
+        """Remove those of `paths` that exist, in one call; returns the removed ones."""
+        if not paths:
+            return []
+        out = self.exec_(_REMOVE_FILES.format(paths=list(paths)), bounded=False)
+        return [line.strip() for line in out.decode("utf-8", "replace").splitlines() if line.strip()]
+
+    def mpy_version(self) -> int:
+        """`sys.implementation._mpy` of the firmware, 0 when it cannot import .mpy files."""
+        if self._mpy_version is None:
+            self._mpy_version = int(self.exec_(_MPY_VERSION).strip() or 0)
+        return self._mpy_version
+
+    def firmware(self) -> dict[str, str]:
+        """`sys.platform` and the MicroPython version of the board."""
+        platform, version = self.exec_(_FIRMWARE).decode().split()
+        return {"platform": platform, "version": version}
+
+    def run(self, local_file: str, wait_output: bool = True, limit: float | None = None) -> bytes:
+        """Run a local script on the board and return its output.
+
+        The script may stay quiet and run for as long as it likes, unless
+        `limit` caps its run time in seconds (DeadlineExceeded, with the
+        script still running until the session is recovered).
+        """
+        with open(local_file, "r", encoding="utf-8") as f:
+            code = f.read()
+        if not wait_output:
+            with self.lock:
+                if self._prompt_pending:
+                    self.read_until(b">")
+                self.serial.write(code.encode("utf-8") + b"\x04")
+                # the board no longer answers until the script returns
+                self.close()
+            return b""
+        return self.exec_(code, timeout=math.inf, bounded=False, limit=limit)
+
+    def reset(self):
+        with self.lock:
+            if self._prompt_pending:
+                self.read_until(b">")
+            self.serial.write(b"import machine\nmachine.reset()\x04")
+            self.serial.flush()
+            # the board drops off the bus, there is nothing left to talk to
+            self.serial.close()
+            self.serial = None
+
+    # --- ampy compatible front-end ---
+    def run_ampy(self, ampy_args: list[str]) -> tuple[bool, str, str]:
+        """Serve an `ampy` command line (without `-p PORT`) over this session.
+
+        Returns the same `(success, stdout, stderr)` triple as
+        `run_ampy_command`, so callers do not care which backend answered.
+        """
+        if not ampy_args:
+            return False, "", "No command given."
+        command, args = ampy_args[0], list(ampy_args[1:])
+        try:
+            if command == "ls":
+                long_format = "-l" in args or "--long_format" in args
+                recursive = "-r" in args or "--recursive" in args
+                paths = [a for a in args if not a.startswith("-")]
+                lines = self.ls(paths[0] if paths else "/", long_format, recursive)
+                return True, "\n".join(lines), ""
+            if command == "get":
+                if len(args) > 1:
+                    with open(args[1], "wb") as f:
+                        self.download(args[0], f)
+                    return True, "", ""
+                return True, self.get(args[0]).decode("utf-8", "replace"), ""
+            if command == "put":
+                local = args[0]
+                remote = args[1] if len(args) > 1 else "/" + local.replace("\\", "/").split("/")[-1]
+                self.put(local, remote)
+                return True, "", ""
+            if command == "rm":
+                self.rm(args[0])
+                return True, "", ""
+            if command == "rmdir":
+                self.rmdir(args[0])
+                return True, "", ""
+            if command == "mkdir":
+                exists_okay = "--exists-okay" in args
+                self.mkdir([a for a in args if not a.startswith("-")][0], exists_okay)
+                return True, "", ""
+            if command == "run":
+                wait = "-n" not in args and "--no-output" not in args
+                script = [a for a in args if not a.startswith("-")][0]
+                out = self.run(script, wait)
+                return True, out.decode("utf-8", "replace"), ""
+            if command == "reset":
+                self.reset()
+                return True, "", ""
+        except DeviceError as e:
+            return False, "", str(e)
+        except (SessionError, serial.SerialException) as e:
+            self.close()  # link state is unknown, reconnect on next use
+            return False, "", str(e)
+        except (OSError, IndexError) as e:  # local file or bad arguments
+            return False, "", str(e)
+        return False, "", f"Unsupported command: {command}"
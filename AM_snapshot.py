@@ -0,0 +1,379 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Full-device snapshots and streaming restores.
+
+A snapshot records every folder and file of a board in a manifest: JSON
+with the board's ID and firmware and the size and sha256 of every file.
+The file contents go into a content-addressed store next to it, each
+zlib-compressed under its sha256, so backups of many similar boards keep a
+shared file once. Files whose hash the board reports and the store already
+holds are not transferred at all. `--output` also writes the snapshot as a
+single self-contained .tar archive, which `restore` accepts too.
+
+    python AM_snapshot.py snapshot --port /dev/ttyACM0 --output board.tar
+    python AM_snapshot.py restore board.tar --port /dev/ttyUSB0 --diff --prune
+    python AM_snapshot.py list
+
+A restore streams one file at a time to the board (small files in bundles).
+With `--diff` only files whose content differs from the board are sent,
+with `--prune` files and folders the snapshot does not have are deleted.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import tarfile
+import tempfile
+import time
+import zlib
+
+import serial
+from tqdm import tqdm
+
+import AM_main
+from AM_index import CACHE_DIR
+from AM_jobs import pick_port
+from AM_session import SessionError
+
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, "snapshots")
+SNAPSHOT_FORMAT = 1
+MANIFEST_NAME = "manifest.json"  # inside a .tar archive, next to objects/<sha256>
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_NO_DEVICE = 3
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def unpack_blob(packed: bytes, digest: str) -> bytes:
+    try:
+        data = zlib.decompress(packed)
+    except zlib.error:
+        data = None
+    if data is None or hashlib.sha256(data).hexdigest() != digest:
+        raise SnapshotError(f"object {digest} is corrupt")
+    return data
+
+
+class BlobWriter:
+    """Binary sink that hashes and compresses into the store; `commit` names it by content."""
+
+    def __init__(self, store: "SnapshotStore"):
+        self.store = store
+        os.makedirs(store.objects, exist_ok=True)
+        fd, self.temp = tempfile.mkstemp(dir=store.objects, suffix=".tmp")
+        self.file = os.fdopen(fd, "wb")
+        self.digest = hashlib.sha256()
+        self.packer = zlib.compressobj(9)
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self.digest.update(chunk)
+        self.size += len(chunk)
+        self.file.write(self.packer.compress(chunk))
+
+    def commit(self) -> str:
+        self.file.write(self.packer.flush())
+        self.file.close()
+        digest = self.digest.hexdigest()
+        path = self.store.object_path(digest)
+        if os.path.exists(path):
+            os.remove(self.temp)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self.temp, path)
+        return digest
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.remove(self.temp)
+        except OSError:
+            pass
+
+
+class SnapshotStore:
+    """Manifests and content-addressed objects below `root`."""
+
+    def __init__(self, root: str | None = None):
+        self.root = root or SNAPSHOT_DIR
+        self.objects = os.path.join(self.root, "objects")
+        self.manifests = os.path.join(self.root, "manifests")
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.objects, digest[:2], digest[2:])
+
+    def has(self, digest: str) -> bool:
+        return os.path.exists(self.object_path(digest))
+
+    def read(self, digest: str) -> bytes:
+        try:
+            with open(self.object_path(digest), "rb") as f:
+                return unpack_blob(f.read(), digest)
+        except FileNotFoundError:
+            raise SnapshotError(f"object {digest} is missing from {self.objects}")
+
+    def save(self, manifest: dict) -> str:
+        os.makedirs(self.manifests, exist_ok=True)
+        path = os.path.join(self.manifests, manifest["name"] + ".json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(path + ".tmp", path)
+        return path
+
+    def load(self, name: str) -> dict:
+        path = name if os.path.isfile(name) else os.path.join(self.manifests, name + ".json")
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise SnapshotError(f"no snapshot named {name}")
+
+    def names(self) -> list[str]:
+        try:
+            return sorted(n[:-5] for n in os.listdir(self.manifests) if n.endswith(".json"))
+        except FileNotFoundError:
+            return []
+
+
+class ArchiveSource:
+    """A snapshot exported to one .tar file, read the same way as a store."""
+
+    def __init__(self, path: str):
+        self.tar = tarfile.open(path, "r")
+        try:
+            self.manifest = json.load(self.tar.extractfile(MANIFEST_NAME))
+        except KeyError:
+            raise SnapshotError(f"{path} has no {MANIFEST_NAME}")
+
+    def read(self, digest: str) -> bytes:
+        try:
+            member = self.tar.extractfile(f"objects/{digest}")
+        except KeyError:
+            raise SnapshotError(f"object {digest} is missing from the archive")
+        return unpack_blob(member.read(), digest)
+
+    def close(self):
+        self.tar.close()
+
+
+def export_archive(store: SnapshotStore, manifest: dict, path: str):
+    """Write `manifest` and the objects it uses as one .tar file."""
+    with tarfile.open(path + ".tmp", "w") as tar:
+        data = json.dumps(manifest, indent=1).encode("utf-8")
+        info = tarfile.TarInfo(MANIFEST_NAME)
+        info.size, info.mtime = len(data), int(time.time())
+        tar.addfile(info, io.BytesIO(data))
+        for digest in sorted({record["sha256"] for record in manifest["files"]}):
+            tar.add(store.object_path(digest), arcname=f"objects/{digest}")
+    os.replace(path + ".tmp", path)
+
+
+def take_snapshot(com_port: str, store: SnapshotStore, name: str | None = None, compress: bool | None = None) -> dict:
+    """Copy every file of the board into `store` over one session; returns the saved manifest."""
+    compress = AM_main.COMPRESS_TRANSFERS if compress is None else compress
+    session = AM_main.get_session(com_port)
+    entries = session.walk("/")
+    files = [(path, size) for path, kind, size in entries if kind == "f"]
+    known = session.hash_files([path for path, _ in files])
+
+    records = []
+    transferred = reused = 0
+    with tqdm(total=sum(size for _, size in files), desc="Snapshot", unit="B", unit_scale=True, unit_divisor=1024) as bar:
+        for path, size in files:
+            remote = known.get(path)
+            remote_digest = remote[1] if remote and remote[0] == "sha256" else None
+            if remote_digest and store.has(remote_digest):
+                records.append({"path": path, "size": size, "sha256": remote_digest})
+                reused += size
+                bar.update(size)
+                continue
+            writer = BlobWriter(store)
+            try:
+                session.download(path, writer, compress, progress=lambda new, total: bar.update(new))
+            except BaseException:
+                writer.discard()
+                raise
+            digest = writer.commit()
+            if remote_digest and remote_digest != digest:
+                raise SnapshotError(f"{path} changed while it was read")
+            records.append({"path": path, "size": writer.size, "sha256": digest})
+            transferred += writer.size
+
+    device = session.unique_id()
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "name": name or f"{device or AM_main.port_label(com_port)}-{time.strftime('%Y%m%d-%H%M%S')}",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "port": AM_main.port_device(com_port),
+        "device": device,
+        **session.firmware(),
+        "mpy": session.mpy_version(),
+        "dirs": sorted(path for path, kind, _ in entries if kind == "d"),
+        "files": records,
+    }
+    path = store.save(manifest)
+    print(
+        f"Snapshot {manifest['name']}: {len(records)} file(s), {AM_main.format_size(transferred)} transferred, "
+        f"{AM_main.format_size(reused)} already in the store. Manifest: {path}"
+    )
+    return manifest
+
+
+def restore(com_port: str, manifest: dict, source, diff: bool = False, prune: bool = False, compress: bool | None = None) -> dict:
+    """Write the files of `manifest`, read from `source`, to the board one at a time.
+
+    Returns `{"uploaded": [...], "unchanged": n, "deleted": [...]}`.
+    """
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"unsupported snapshot format {manifest.get('format')}")
+    compress = AM_main.COMPRESS_TRANSFERS if compress is None else compress
+    session = AM_main.get_session(com_port)
+    entries = session.walk("/") if diff or prune else []
+    on_board = [path for path, kind, _ in entries if kind == "f"]
+    current = {}
+    if diff:
+        current = session.hash_files(on_board)
+    to_send = [r for r in manifest["files"] if current.get(r["path"]) != ("sha256", r["sha256"])]
+    session.makedirs(manifest["dirs"])
+
+    uploaded = []
+    bundle = []
+
+    def flush():
+        if bundle:
+            session.put_bundle(bundle, compress)
+            uploaded.extend(path for path, _ in bundle)
+            bundle.clear()
+
+    with tqdm(total=sum(r["size"] for r in to_send), desc="Restore", unit="B", unit_scale=True, unit_divisor=1024) as bar:
+        for record in to_send:
+            data = source.read(record["sha256"])
+            if len(data) <= AM_main.BUNDLE_THRESHOLD:
+                bundle.append((record["path"], data))
+                if sum(len(data) for _, data in bundle) >= AM_main.BUNDLE_MAX_BYTES:
+                    flush()
+            else:
+                session.put_bytes(data, record["path"], compress)
+                uploaded.append(record["path"])
+            bar.update(len(data))
+        flush()
+    written = set(uploaded)
+    for record in manifest["files"]:
+        if record["path"] in written:
+            AM_main.index_add_file(com_port, record["path"], record["size"])
+
+    deleted = []
+    if prune:
+        wanted = {record["path"] for record in manifest["files"]}
+        extra = {path for path, kind, _ in entries if kind == "d"} - set(manifest["dirs"])
+        # removing the topmost extra folder takes its files and subfolders along
+        extra_dirs = sorted(path for path in extra if path.rsplit("/", 1)[0] not in extra)
+        stray = [
+            path
+            for path in sorted(set(on_board) - wanted)
+            if not any(path.startswith(d + "/") for d in extra_dirs)
+        ]
+        deleted = session.remove_files(stray)
+        for path in extra_dirs:
+            session.rmdir(path)
+            deleted.append(path)
+        AM_main.index_remove(com_port, deleted)
+    print(
+        f"Restored {manifest['name']}: {len(uploaded)} file(s) written, "
+        f"{len(manifest['files']) - len(to_send)} unchanged, {len(deleted)} deleted."
+    )
+    return {"uploaded": uploaded, "unchanged": len(manifest["files"]) - len(to_send), "deleted": deleted}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", default=SNAPSHOT_DIR, help="snapshot store directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    snap = commands.add_parser("snapshot", help="copy the whole board into the store")
+    snap.add_argument("--port", help="serial port, the first board found otherwise")
+    snap.add_argument("--name", help="snapshot name, default <board id>-<time>")
+    snap.add_argument("--output", help="also write the snapshot as one .tar archive")
+    snap.add_argument("--compress", action="store_true", help="deflate transfers when the firmware can")
+    back = commands.add_parser("restore", help="write a snapshot to a board")
+    back.add_argument("snapshot", help="snapshot name, manifest file or .tar archive")
+    back.add_argument("--port", help="serial port, the first board found otherwise")
+    back.add_argument("--diff", action="store_true", help="only send files that differ on the board")
+    back.add_argument("--prune", action="store_true", help="delete board files the snapshot does not have")
+    back.add_argument("--compress", action="store_true", help="deflate transfers when the firmware can")
+    commands.add_parser("list", help="list the snapshots in the store")
+    args = parser.parse_args(argv)
+
+    store = SnapshotStore(args.store)
+    if args.command == "list":
+        for name in store.names():
+            manifest = store.load(name)
+            print(f"{name}  {manifest['created']}  {manifest['device'] or '-'}  {len(manifest['files'])} file(s)")
+        return EXIT_OK
+
+    source = None
+    try:
+        if args.command == "restore":
+            if os.path.isfile(args.snapshot) and tarfile.is_tarfile(args.snapshot):
+                source = ArchiveSource(args.snapshot)
+                manifest = source.manifest
+            else:
+                manifest = store.load(args.snapshot)
+                source = store
+    except (OSError, ValueError, tarfile.TarError, SnapshotError) as e:
+        print(f"{args.snapshot}: {e}", file=sys.stderr)
+        return EXIT_FAILED
+
+    com_port = pick_port(args.port)
+    if com_port is None:
+        print("No MicroPython board found.", file=sys.stderr)
+        return EXIT_NO_DEVICE
+    try:
+        with AM_main.measured(com_port, args.command):
+            if args.command == "snapshot":
+                manifest = take_snapshot(com_port, store, args.name, args.compress)
+                if args.output:
+                    export_archive(store, manifest, args.output)
+                    print(f"Archive written to {args.output}.")
+            else:
+                restore(com_port, manifest, source, args.diff, args.prune, args.compress)
+    except (SessionError, serial.SerialException, OSError, SnapshotError) as e:
+        print(f"{args.command} failed: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    finally:
+        if isinstance(source, ArchiveSource):
+            source.close()
+        AM_main.close_sessions()
+        AM_main.export_metrics()
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
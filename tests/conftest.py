@@ -0,0 +1,120 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def device():
+    """A simulated board on a pseudo-terminal (POSIX only)."""
+    fakedevice = pytest.importorskip("AM_fakedevice")
+    if os.name != "posix":
+        pytest.skip("FakeDevice needs a pty")
+    with fakedevice.FakeDevice() as board:
+        yield board
+
+
+@pytest.fixture
+def session(device):
+    from AM_session import AmpySession
+
+    with AmpySession(device.port) as session:
+        yield session
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    """Indexes, journals, compiled files, link profiles, metrics and snapshots of the test, away from the user's."""
+    import AM_index
+    import AM_journal
+    import AM_main
+    import AM_mpy
+    import AM_snapshot
+
+    root = tmp_path / "state"
+    monkeypatch.setattr(AM_index, "INDEX_DIR", str(root / "index"))
+    monkeypatch.setattr(AM_journal, "JOURNAL_DIR", str(root / "journal"))
+    monkeypatch.setattr(AM_mpy, "MPY_CACHE_DIR", str(root / "mpy"))
+    monkeypatch.setattr(AM_main, "LINK_PROFILES_FILE", str(root / "links.json"))
+    monkeypatch.setattr(AM_main, "METRICS_DIR", str(root / "metrics"))
+    monkeypatch.setattr(AM_snapshot, "SNAPSHOT_DIR", str(root / "snapshots"))
+    return root
+
+
+@pytest.fixture
+def board(device, state_dir):
+    """Port of the simulated board, for the AM_main functions."""
+    import AM_main
+
+    yield device.port
+    AM_main.close_sessions()
+
+
+@pytest.fixture
+def make_tree(tmp_path):
+    """Write `{relative path: bytes}` below a fresh local folder and return it."""
+
+    def make(files, name="src"):
+        root = tmp_path / name
+        for path, data in files.items():
+            target = root / path
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(data)
+        return str(root)
+
+    return make
+
+
+@pytest.fixture
+def board_files(device):
+    """Write `{board path: bytes}` straight into the simulated board's storage."""
+
+    def write(files):
+        for path, data in files.items():
+            target = device.local_path(path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(data)
+
+    return write
+
+
+@pytest.fixture
+def round_trips(monkeypatch):
+    """Counts the raw-REPL executions of every session."""
+    from AM_session import AmpySession
+
+    calls = []
+    exec_raw = AmpySession.exec_raw
+
+    def counting(self, *args, **kwargs):
+        calls.append(args[0] if args else kwargs.get("code"))
+        return exec_raw(self, *args, **kwargs)
+
+    monkeypatch.setattr(AmpySession, "exec_raw", counting)
+    return calls
@@ -0,0 +1,100 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""The asyncio API against the simulated board."""
+
+import asyncio
+import os
+
+import pytest
+
+from AM_async import AsyncDevice
+from AM_fakedevice import FakeDevice
+
+
+def run(device, operation):
+    """Run `operation(async_device)` in a fresh event loop."""
+
+    async def main():
+        async with AsyncDevice(device.port) as board:
+            return await operation(board)
+
+    return asyncio.run(main())
+
+
+def test_ls_lists_one_folder_unless_recursive(device, monkeypatch):
+    os.makedirs(device.local_path("/lib/deep"))
+    for path in ("/a.py", "/lib/b.py", "/lib/deep/c.py"):
+        with open(device.local_path(path), "wb") as f:
+            f.write(b"xy")
+
+    async def listings(board):
+        walks = []
+        walk = board.session.walk
+        monkeypatch.setattr(board.session, "walk", lambda *args: walks.append(args) or walk(*args))
+        return await board.ls("/"), await board.ls("/lib"), await board.ls("/", recursive=True), walks
+
+    top, lib, everything, walks = run(device, listings)
+    assert top == [("/a.py", "f", 2), ("/lib", "d", 0)]
+    assert sorted(lib) == [("/lib/b.py", "f", 2), ("/lib/deep", "d", 0)]
+    assert len(everything) == 5
+    assert [recursive for _, recursive in walks] == [False, False, True]
+
+
+def test_put_and_get_with_progress(device):
+    data = bytes(range(256)) * 64
+    reported = []
+
+    async def roundtrip(board):
+        await board.put_bytes(data, "/blob.bin", progress=lambda n, total: reported.append(n))
+        return await board.get("/blob.bin")
+
+    assert run(device, roundtrip) == data
+    assert sum(reported) == len(data)
+
+
+def test_stream_yields_the_file_in_chunks(device):
+    data = os.urandom(20000)
+    with open(device.local_path("/log.bin"), "wb") as f:
+        f.write(data)
+
+    async def collect(board):
+        return [chunk async for chunk in board.stream("/log.bin")]
+
+    chunks = run(device, collect)
+    assert len(chunks) > 1
+    assert b"".join(chunks) == data
+
+
+def test_cancelled_upload_leaves_the_link_usable():
+    with FakeDevice(baudrate=57600) as device:
+
+        async def cancel_then_list(board):
+            upload = asyncio.ensure_future(board.put_bytes(os.urandom(64 * 1024), "/big.bin"))
+            await asyncio.sleep(0.5)
+            upload.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await upload
+            return await board.ls("/")
+
+        assert run(device, cancel_then_list) == []
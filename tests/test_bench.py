@@ -0,0 +1,54 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""The benchmark harness on a small workload."""
+
+import json
+import os
+
+import pytest
+
+AM_bench = pytest.importorskip("AM_bench")
+
+
+def test_bench_keeps_its_state_to_itself(state_dir, tmp_path):
+    if os.name != "posix":
+        pytest.skip("FakeDevice needs a pty")
+    before = [getattr(module, name) for module, name, _ in AM_bench.STATE_PATHS]
+    output = tmp_path / "bench.json"
+    code = AM_bench.main(
+        [
+            "--baud", "0", "--repeat", "2",
+            "--small-count", "5", "--large-count", "1", "--large-size", "4096",
+            "--delete-count", "5", "--listing-runs", "2",
+            "--output", str(output),
+        ]
+    )
+
+    assert code == 0
+    with open(output) as f:
+        results = json.load(f)
+    assert set(results["workloads"]) == set(AM_bench.WORKLOAD_NAMES)
+    assert results["workloads"]["small_files"]["files"] == 10
+    assert not state_dir.exists()  # nothing was written to the state the test started with
+    assert [getattr(module, name) for module, name, _ in AM_bench.STATE_PATHS] == before
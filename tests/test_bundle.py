@@ -0,0 +1,94 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Small files sent together in bundles."""
+
+import os
+
+import AM_main
+from AM_session import AmpySession, DeviceError
+
+SMALL = {f"pkg/sub{i % 3}/m{i}.py": f"v = {i}\n\t\r\n\x04".encode() * (i + 1) for i in range(24)}
+
+
+def files_below(root):
+    return sorted(
+        os.path.relpath(os.path.join(top, name), root).replace(os.sep, "/")
+        for top, _, files in os.walk(root)
+        for name in files
+    )
+
+
+def check(device, files):
+    assert files_below(device.root) == sorted(files)
+    for path, data in files.items():
+        with open(device.local_path("/" + path), "rb") as f:
+            assert f.read() == data
+
+
+def test_bundle_creates_folders_and_files(session, device):
+    files = {"a.txt": b"", "deep/er/b.bin": bytes(range(256)), "c\tname.py": b"x = 1\n"}
+    session.put_bundle([("/" + path, data) for path, data in files.items()])
+    check(device, files)
+
+
+def test_compressed_bundle(session, device):
+    files = {f"log{i}.txt": b"repeated line\n" * 50 for i in range(5)}
+    stats = session.put_bundle([("/" + path, data) for path, data in files.items()], compress=True)
+    assert stats["compressed"]
+    assert stats["wire_bytes"] < stats["raw_bytes"]
+    check(device, files)
+
+
+def test_folder_upload_bundles_small_files(board, device, make_tree, round_trips):
+    local_dir = make_tree(SMALL)
+    report = AM_main.upload_from_dir(board, local_dir, recursive=True)
+    assert len(report["uploaded"]) == len(SMALL)
+    assert len(round_trips) < len(SMALL)
+    check(device, SMALL)
+
+
+def test_failed_bundle_falls_back_to_single_files(board, device, make_tree, monkeypatch):
+    def broken(self, files, compress=False, progress=None):
+        raise DeviceError("OSError: 28")
+
+    monkeypatch.setattr(AmpySession, "put_bundle", broken)
+    local_dir = make_tree(SMALL)
+    report = AM_main.upload_from_dir(board, local_dir, recursive=True)
+    assert report["failed"] == []
+    check(device, SMALL)
+
+
+def test_large_files_are_sent_on_their_own(board, device, make_tree, monkeypatch):
+    bundles = []
+    put_bundle = AmpySession.put_bundle
+
+    def recording(self, files, *args, **kwargs):
+        bundles.append([path for path, _ in files])
+        return put_bundle(self, files, *args, **kwargs)
+
+    monkeypatch.setattr(AmpySession, "put_bundle", recording)
+    files = {"small.py": b"x = 1\n", "big.bin": os.urandom(AM_main.BUNDLE_THRESHOLD + 1)}
+    AM_main.upload_from_dir(board, make_tree(files))
+    assert bundles == [["/small.py"]]
+    check(device, files)
@@ -0,0 +1,85 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Compressed transfers against the simulated board."""
+
+import os
+
+import pytest
+
+from AM_session import AmpySession
+
+CSV = b"".join(b"%d,sensor,20.%d,ok\n" % (i, i % 10) for i in range(3000))
+
+
+@pytest.fixture
+def plain_device(device):
+    """The simulated board without `deflate` (and without zlib.DecompIO)."""
+    modules = device._modules
+
+    def patched(out):
+        found = modules(out)
+        del found["deflate"]
+        del found["zlib"]
+        return found
+
+    device._modules = patched
+    return device
+
+
+def test_compressed_upload_sends_fewer_bytes(session, device):
+    assert session.compression_support() == {"decompress": True, "compress": True}
+    stats = session.put_bytes(CSV, "/log.csv", compress=True)
+    assert stats["compressed"]
+    assert stats["raw_bytes"] == len(CSV)
+    assert stats["wire_bytes"] < len(CSV) / 3
+    with open(device.local_path("/log.csv"), "rb") as f:
+        assert f.read() == CSV
+    assert os.listdir(device.root) == ["log.csv"]  # no compressed temp file left behind
+
+
+def test_compressed_download_sends_fewer_bytes(session, device, tmp_path):
+    with open(device.local_path("/log.csv"), "wb") as f:
+        f.write(CSV)
+    local = tmp_path / "log.csv"
+    stats = session.download_file("/log.csv", str(local), compress=True)
+    assert stats["compressed"]
+    assert stats["wire_bytes"] < len(CSV) / 3
+    assert local.read_bytes() == CSV
+
+
+def test_board_without_deflate_falls_back_to_plain(plain_device, tmp_path):
+    with AmpySession(plain_device.port) as session:
+        assert session.compression_support() == {"decompress": False, "compress": False}
+        stats = session.put_bytes(CSV, "/log.csv", compress=True)
+        assert not stats["compressed"]
+        local = tmp_path / "log.csv"
+        stats = session.download_file("/log.csv", str(local), compress=True)
+        assert not stats["compressed"]
+        assert local.read_bytes() == CSV
+
+
+def test_incompressible_data_survives_compression(session):
+    data = os.urandom(5000)
+    session.put_bytes(data, "/noise.bin", compress=True)
+    assert session.get("/noise.bin") == data
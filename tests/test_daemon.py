@@ -0,0 +1,113 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""The connection daemon serving requests for the simulated board."""
+
+import base64
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+
+import AM_client
+import AM_daemon
+import AM_main
+
+
+@pytest.fixture
+def manager(board):
+    return AM_daemon.SessionManager([board])
+
+
+@pytest.fixture
+def socket_path():
+    with tempfile.TemporaryDirectory(prefix="ampy") as folder:  # pytest's tmp_path can exceed AF_UNIX limits
+        yield os.path.join(folder, "daemon.sock")
+
+
+def test_requests_run_on_one_session(manager, board, device, tmp_path):
+    local = tmp_path / "config.json"
+    local.write_bytes(b'{"a": 1}')
+    assert manager.handle({"op": "put", "local": str(local), "remote": "/config.json"})["ok"]
+    session = AM_main._sessions[board]
+
+    reply = manager.handle({"op": "cat", "remote": "/config.json", "start": 1})
+    assert reply["ok"]
+    assert base64.b64decode(reply["data"]) == b'"a": 1}'
+    assert AM_main._sessions[board] is session
+    assert manager.status()["sessions"][AM_main.port_device(board)]["requests"] == 2
+
+
+def test_invalid_requests_are_refused(manager):
+    assert not manager.handle({"op": "format"})["ok"]
+    assert not manager.handle({"op": "put", "local": "x.py"})["ok"]
+
+
+def test_client_talks_to_the_daemon(manager, board, board_files, socket_path):
+    board_files({"/main.py": b"print(1)\n"})
+    server = AM_daemon.bind(socket_path, manager)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        reply = AM_client.request({"op": "ls", "path": "/"}, socket_path, timeout=10)
+        assert reply["ok"]
+        assert "/main.py" in str(reply["entries"])
+        assert AM_client.request({"op": "shutdown"}, socket_path, timeout=10)["ok"]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_janitor_closes_idle_sessions(manager, board, monkeypatch):
+    monkeypatch.setattr(AM_daemon, "JANITOR_INTERVAL", 0.05)
+    manager.session_idle = 0.3
+    manager.open_session(board)  # opened at start, before any request
+    assert board in manager.last_used
+
+    janitor = threading.Thread(target=manager.janitor, args=(None,), daemon=True)
+    janitor.start()
+    try:
+        time.sleep(0.15)
+        assert board in AM_main._sessions
+        deadline = time.monotonic() + 5
+        while board in AM_main._sessions and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert board not in AM_main._sessions
+    finally:
+        manager.stopping.set()
+        janitor.join()
+
+    assert manager.handle({"op": "ls", "path": "/"})["ok"]  # reopened on demand
+    assert AM_main._sessions[board].is_open
+
+
+def test_daemon_stops_when_idle(manager, monkeypatch):
+    monkeypatch.setattr(AM_daemon, "JANITOR_INTERVAL", 0.05)
+    manager.idle_exit = 0.1
+    stopped = threading.Event()
+    server = type("Server", (), {"shutdown": lambda self: stopped.set()})()
+    janitor = threading.Thread(target=manager.janitor, args=(server,), daemon=True)
+    janitor.start()
+    assert stopped.wait(5)
+    janitor.join()
@@ -0,0 +1,78 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Bulk deletes against the simulated board."""
+
+import os
+
+import AM_main
+
+FILES = {
+    "/a.txt": b"a",
+    "/b.txt": b"b",
+    "/keep.py": b"k",
+    "/logs/c.txt": b"c",
+    "/logs/deep/d.txt": b"d",
+    "/cache.txt/e.bin": b"e",
+}
+
+
+def tree(device):
+    return sorted(
+        os.path.relpath(os.path.join(top, name), device.root)
+        for top, dirs, files in os.walk(device.root)
+        for name in dirs + files
+    )
+
+
+def test_delete_matching_is_one_round_trip(session, device, board_files, round_trips):
+    board_files(FILES)
+    report = session.delete_matching("*.txt", "/", recursive=True)
+    assert len(round_trips) == 1
+    assert sorted(report["deleted"]) == ["/a.txt", "/b.txt", "/logs/c.txt", "/logs/deep/d.txt"]
+    assert report["failed"] == []
+
+
+def test_bulk_delete_stays_in_the_top_folder(board, device, board_files):
+    board_files(FILES)
+    report = AM_main.bulk_delete(board, "*.txt")
+    assert sorted(report["deleted"]) == ["/a.txt", "/b.txt"]
+    assert "logs/c.txt" in tree(device)
+
+
+def test_bulk_delete_removes_matching_folders_when_asked(board, device, board_files):
+    board_files(FILES)
+    report = AM_main.bulk_delete(board, "*.txt", recursive=True, remove_dirs=True)
+    assert "/cache.txt" in report["deleted"]
+    assert tree(device) == ["keep.py", "logs", "logs/deep"]
+
+
+def test_bulk_delete_updates_the_index(board, device, board_files):
+    board_files(FILES)
+    index = AM_main.get_index(board, refresh=True)
+    assert "/a.txt" in index.entries
+    AM_main.bulk_delete(board, "*.txt", recursive=True)
+    assert sorted(path for path, entry in index.entries.items() if entry["type"] == "f") == [
+        "/cache.txt/e.bin",
+        "/keep.py",
+    ]
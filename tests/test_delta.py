@@ -0,0 +1,88 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Delta uploads patching large files in place."""
+
+import random
+
+from AM_session import DELTA_BLOCK, DELTA_MIN_SIZE
+from test_sync import without_hashlib
+
+SIZE = 4 * DELTA_MIN_SIZE
+OLD = random.Random(1).randbytes(SIZE)
+
+
+def edited(data, offset, text=b"edited"):
+    return data[:offset] + text + data[offset + len(text) :]
+
+
+def read(device, path):
+    with open(device.local_path(path), "rb") as f:
+        return f.read()
+
+
+def test_only_changed_blocks_are_sent(session, device, board_files):
+    board_files({"/data.bin": OLD})
+    new = edited(edited(OLD, 10), SIZE - 100)
+    stats = session.put_bytes(new, "/data.bin", delta=True)
+
+    assert stats["patched"]
+    assert stats["wire_bytes"] == 2 * DELTA_BLOCK
+    assert read(device, "/data.bin") == new
+
+
+def test_growing_file_sends_the_new_tail(session, device, board_files):
+    board_files({"/data.bin": OLD})
+    new = OLD + b"appended" * 100
+    stats = session.put_bytes(new, "/data.bin", delta=True)
+
+    assert stats["patched"]
+    assert stats["wire_bytes"] < 2 * DELTA_BLOCK
+    assert read(device, "/data.bin") == new
+
+
+def test_shrinking_file_is_uploaded_whole(session, device, board_files):
+    board_files({"/data.bin": OLD})
+    new = OLD[: SIZE // 2]
+    stats = session.put_bytes(new, "/data.bin", delta=True)
+
+    assert not stats["patched"]
+    assert stats["wire_bytes"] == len(new)
+    assert read(device, "/data.bin") == new
+
+
+def test_small_and_missing_files_are_uploaded_whole(session, device, board_files):
+    board_files({"/small.bin": OLD[:100]})
+    assert not session.put_bytes(edited(OLD[:100], 0), "/small.bin", delta=True)["patched"]
+    assert not session.put_bytes(OLD, "/missing.bin", delta=True)["patched"]
+    assert read(device, "/missing.bin") == OLD
+
+
+def test_board_without_hashlib_falls_back(session, device, board_files):
+    board_files({"/data.bin": OLD})
+    without_hashlib(device)
+    new = edited(OLD, 10)
+    stats = session.put_bytes(new, "/data.bin", delta=True)
+
+    assert not stats["patched"]
+    assert read(device, "/data.bin") == new
@@ -0,0 +1,80 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Streamed downloads against the simulated board."""
+
+import os
+
+import pytest
+
+import AM_main
+from AM_session import MAX_TRANSFER_CHUNK, DeviceError
+
+BINARY = bytes(range(256)) * 100  # every byte value, including \r, \n and \x04
+
+
+class Recorder:
+    """Binary sink that remembers the size of every write."""
+
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+
+
+def test_download_streams_in_chunks(session, board_files):
+    board_files({"/blob.bin": BINARY})
+    sink = Recorder()
+    progress = []
+    stats = session.download("/blob.bin", sink, progress=lambda n, total: progress.append((n, total)))
+
+    assert b"".join(sink.writes) == BINARY
+    assert len(sink.writes) > 1
+    assert max(len(chunk) for chunk in sink.writes) <= MAX_TRANSFER_CHUNK
+    assert sum(n for n, _ in progress) == len(BINARY)
+    assert {total for _, total in progress} == {len(BINARY)}
+    assert stats["raw_bytes"] == len(BINARY)
+
+
+def test_download_file_replaces_the_target_only_when_complete(session, board_files, tmp_path):
+    board_files({"/blob.bin": BINARY})
+    local = tmp_path / "blob.bin"
+    local.write_bytes(b"old")
+    session.download_file("/blob.bin", str(local))
+    assert local.read_bytes() == BINARY
+    assert os.listdir(tmp_path) == ["blob.bin"]
+
+
+def test_missing_remote_file_leaves_nothing_behind(session, tmp_path):
+    with pytest.raises(DeviceError):
+        session.download_file("/missing.bin", str(tmp_path / "missing.bin"))
+    assert os.listdir(tmp_path) == []
+
+
+def test_download_single_reports_success(board, board_files, tmp_path):
+    board_files({"/blob.bin": BINARY})
+    assert AM_main.download_single(board, "/blob.bin", str(tmp_path / "blob.bin"))
+    assert (tmp_path / "blob.bin").read_bytes() == BINARY
+    assert not AM_main.download_single(board, "/missing.bin", str(tmp_path / "missing.bin"))
+    assert not (tmp_path / "missing.bin").exists()
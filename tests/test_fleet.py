@@ -0,0 +1,100 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Fleet runs over two simulated boards."""
+
+import json
+import os
+
+import pytest
+
+import AM_main
+from AM_fakedevice import FakeDevice
+
+FILES = {"main.py": b"run()\n", "lib.py": b"def run(): pass\n", "data.bin": bytes(3000)}
+
+
+@pytest.fixture
+def fleet(device, state_dir):
+    with FakeDevice(unique_id=b"\x0b") as other:
+        yield [device, other]
+        AM_main.close_sessions()
+
+
+@pytest.fixture
+def bars(monkeypatch):
+    """Every tqdm bar AM_main draws (not disabled) during the test."""
+    created = []
+
+    class RecordingBar(AM_main.tqdm):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            if not kwargs.get("disable"):
+                created.append(self)
+
+    monkeypatch.setattr(AM_main, "tqdm", RecordingBar)
+    return created
+
+
+def test_upload_counts_on_the_board_bars(fleet, bars, make_tree):
+    local_dir = make_tree(FILES)
+    ports = [board.port for board in fleet]
+    results = AM_main.run_fleet(ports, AM_main.fleet_upload_from_dir, local_dir, True)
+
+    assert results == {port: (len(FILES), [], None) for port in ports}
+    assert [bar.desc for bar in bars] == ports  # no per-port bars drawn over them
+    assert [bar.n for bar in bars] == [len(FILES)] * 2
+    for board in fleet:
+        assert sorted(os.listdir(board.root)) == sorted(FILES)
+    with open(os.path.join(local_dir, AM_main.SYNC_STATE_FILE)) as f:
+        assert sorted(json.load(f)) == ["0b", "face0001"]
+
+
+def test_download_counts_on_the_board_bars(fleet, bars, tmp_path):
+    for board in fleet:
+        for name, data in FILES.items():
+            with open(board.local_path("/" + name), "wb") as f:
+                f.write(data)
+    ports = [board.port for board in fleet]
+    results = AM_main.run_fleet(
+        ports, AM_main.fleet_download_multiple, ["/main.py", "/missing.py"], str(tmp_path / "out")
+    )
+
+    assert results == {port: (1, ["/missing.py: not downloaded"], None) for port in ports}
+    assert [bar.desc for bar in bars] == ports
+    assert [bar.n for bar in bars] == [2, 2]
+    for port in ports:
+        with open(tmp_path / "out" / AM_main.port_label(port) / "main.py", "rb") as f:
+            assert f.read() == FILES["main.py"]
+
+
+def test_one_failing_board_does_not_stop_the_others(fleet, bars):
+    ports = [board.port for board in fleet]
+
+    def worker(com_port, bar):
+        if com_port == ports[0]:
+            raise ValueError("bad board")
+        return 1, []
+
+    results = AM_main.run_fleet(ports, worker)
+    assert results == {ports[0]: (0, [], "bad board"), ports[1]: (1, [], None)}
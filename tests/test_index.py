@@ -0,0 +1,76 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""The cached remote file index against the simulated board."""
+
+import os
+
+import AM_index
+import AM_main
+from AM_session import _WALK
+
+
+def walks(round_trips):
+    return sum(code.startswith(_WALK.split("{")[0]) for code in round_trips)
+
+
+def test_listing_is_served_from_the_cache(board, board_files, round_trips, capsys):
+    board_files({"/main.py": b"x" * 5, "/lib/mod.py": b"y"})
+    AM_main.display_content(board)
+    AM_main.display_content(board)
+    assert walks(round_trips) == 1
+    out = capsys.readouterr().out
+    assert "/main.py - 5 bytes" in out
+    assert "/lib\n" in out
+    assert "/lib/mod.py" not in out  # only the top level is listed
+
+
+def test_index_survives_a_restart(board, device, board_files, state_dir, round_trips):
+    board_files({"/main.py": b"x"})
+    AM_main.get_index(board)
+    AM_main.close_sessions()
+    assert os.listdir(state_dir / "index") == ["face0001.json"]
+
+    index = AM_main.get_index(board)
+    assert walks(round_trips) == 1
+    assert index.listing("/") == [("/main.py", "f", 1)]
+
+
+def test_own_changes_update_the_index_in_place(board, round_trips, tmp_path):
+    AM_main.get_index(board)
+    local = tmp_path / "app.py"
+    local.write_bytes(b"app = 1\n")
+    assert AM_main.upload_single(board, str(local), "/app.py")
+    AM_main.bulk_delete(board, "nothing-matches")
+    index = AM_main.get_index(board)
+    assert walks(round_trips) == 1
+    assert index.listing("/") == [("/app.py", "f", 8)]
+
+
+def test_stale_index_is_rebuilt(board, board_files, round_trips, monkeypatch):
+    AM_main.get_index(board)
+    board_files({"/late.py": b"z"})  # written behind the tool's back
+    monkeypatch.setattr(AM_index.RemoteIndex, "is_fresh", lambda self, ttl=0: False)
+    index = AM_main.get_index(board)
+    assert walks(round_trips) == 2
+    assert ("/late.py", "f", 1) in index.listing("/")
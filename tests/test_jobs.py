@@ -0,0 +1,97 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Job steps against the simulated board."""
+
+import pytest
+
+import AM_jobs
+import AM_main
+from AM_session import AmpySession, SessionError
+
+LOG = b"sensor,1,2,3\n" * 400  # above the bundle threshold, so it goes up on its own
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    """The `compress` argument of every upload_single call."""
+    seen = []
+    upload_single = AM_main.upload_single
+
+    def recording(com_port, local_file, remote_file, **kwargs):
+        seen.append(kwargs.get("compress"))
+        return upload_single(com_port, local_file, remote_file, **kwargs)
+
+    monkeypatch.setattr(AM_main, "upload_single", recording)
+    return seen
+
+
+def run(board, *steps, **job):
+    return AM_jobs.run_job({"steps": list(steps), **job}, board)
+
+
+@pytest.mark.parametrize("op", ["put", "sync"])
+def test_folder_steps_pass_compress_on(board, device, make_tree, uploads, op):
+    local_dir = make_tree({"log.csv": LOG})
+    result = run(board, {"op": op, "local": local_dir}, compress=True)
+    assert result["ok"], result
+    assert uploads == [True]
+    with open(device.local_path("/log.csv"), "rb") as f:
+        assert f.read() == LOG
+
+
+def test_step_compress_overrides_the_job(board, make_tree, uploads):
+    local_dir = make_tree({"log.csv": LOG})
+    result = run(board, {"op": "put", "local": local_dir, "compress": False}, compress=True)
+    assert result["ok"], result
+    assert uploads == [False]
+
+
+def test_put_survives_a_stalled_write(board, device, tmp_path, monkeypatch):
+    monkeypatch.setattr(AM_main, "RESUME_DELAY", 0)
+    local = tmp_path / "main.py"
+    local.write_bytes(b"print('hi')\n")
+    put = AmpySession.put
+    calls = []
+
+    def stalling(self, *args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise SessionError("no reply from the board")
+        return put(self, *args, **kwargs)
+
+    monkeypatch.setattr(AmpySession, "put", stalling)
+    result = run(board, {"op": "put", "local": str(local), "remote": "/app/main.py"})
+    assert result["ok"], result
+    assert len(calls) == 2
+    with open(device.local_path("/app/main.py"), "rb") as f:
+        assert f.read() == b"print('hi')\n"
+
+
+def test_script_over_its_timeout_fails_as_timeout(board, tmp_path):
+    script = tmp_path / "chatty.py"
+    script.write_text("import time\nfor _ in range(30):\n    print('tick')\n    time.sleep(0.1)\n")
+    result = run(board, {"op": "run-script", "local": str(script), "timeout": 1})
+    step = result["steps"][0]
+    assert not step["ok"]
+    assert step["outcome"] == "timeout"
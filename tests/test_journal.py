@@ -0,0 +1,96 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Resuming interrupted folder uploads against the simulated board."""
+
+import os
+import time
+
+import AM_journal
+import AM_main
+
+FILES = {f"m{i}.py": f"v = {i}\n".encode() for i in range(4)}
+
+
+def fail_one(monkeypatch, remote_file):
+    upload_single = AM_main.upload_single
+
+    def flaky(com_port, local_file, target, **kwargs):
+        return target != remote_file and upload_single(com_port, local_file, target, **kwargs)
+
+    monkeypatch.setattr(AM_main, "upload_single", flaky)
+
+
+def test_rerun_skips_only_files_still_on_the_board(board, device, make_tree, monkeypatch):
+    monkeypatch.setattr(AM_main, "BUNDLE_THRESHOLD", 0)
+    local_dir = make_tree(FILES)
+    with monkeypatch.context() as patch:
+        fail_one(patch, "/m3.py")
+        report = AM_main.upload_from_dir(board, local_dir)
+    assert report["failed"] == ["/m3.py"]
+
+    report = AM_main.upload_from_dir(board, local_dir)
+    assert report["uploaded"] == ["/m3.py"]
+    assert report["unchanged"] == 3
+    assert sorted(os.listdir(device.root)) == sorted(FILES)
+
+
+def test_rerun_after_wipe_uploads_everything(board, device, make_tree, monkeypatch):
+    monkeypatch.setattr(AM_main, "BUNDLE_THRESHOLD", 0)
+    local_dir = make_tree(FILES)
+    with monkeypatch.context() as patch:
+        fail_one(patch, "/m3.py")
+        AM_main.upload_from_dir(board, local_dir)
+    device.clear()
+
+    report = AM_main.upload_from_dir(board, local_dir)
+    assert sorted(report["uploaded"]) == ["/" + name for name in sorted(FILES)]
+    assert report["unchanged"] == 0
+    assert sorted(os.listdir(device.root)) == sorted(FILES)
+
+
+def test_changed_remote_file_is_uploaded_again(board, device, make_tree, monkeypatch):
+    monkeypatch.setattr(AM_main, "BUNDLE_THRESHOLD", 0)
+    local_dir = make_tree(FILES)
+    with monkeypatch.context() as patch:
+        fail_one(patch, "/m3.py")
+        AM_main.upload_from_dir(board, local_dir)
+    with open(device.local_path("/m0.py"), "wb") as f:
+        f.write(b"edited on the board\n")
+
+    report = AM_main.upload_from_dir(board, local_dir)
+    assert sorted(report["uploaded"]) == ["/m0.py", "/m3.py"]
+    with open(device.local_path("/m0.py"), "rb") as f:
+        assert f.read() == FILES["m0.py"]
+
+
+def test_old_journal_is_ignored(state_dir):
+    journal = AM_journal.TransferJournal.open("upload", "board", "/src")
+    journal.finish("/a.py", (1, 2), b"x")
+    journal.close(completed=False)
+    assert AM_journal.TransferJournal.open("upload", "board", "/src").done
+
+    old = time.time() - AM_journal.JOURNAL_MAX_AGE - 60
+    os.utime(journal.path, (old, old))
+    assert not AM_journal.TransferJournal.open("upload", "board", "/src").resuming
+    assert not os.path.exists(journal.path)
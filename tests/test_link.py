@@ -0,0 +1,80 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Link tuning: chunk sizing, overflow back-off, baud rate and saved profiles."""
+
+import json
+import os
+
+import pytest
+
+import AM_main
+from AM_fakedevice import FakeDevice
+from AM_session import MAX_TRANSFER_CHUNK, TRANSFER_CHUNK, AmpySession
+
+DATA = os.urandom(40000)
+
+
+def read(device, path):
+    with open(device.local_path(path), "rb") as f:
+        return f.read()
+
+
+def test_chunks_grow_on_a_clean_link(session, device):
+    session.put_bytes(DATA, "/x.bin")
+    assert session.transfer_chunk == MAX_TRANSFER_CHUNK
+    assert session.counters["retries"] == 0
+    assert read(device, "/x.bin") == DATA
+
+
+def test_overflow_backs_off_and_keeps_the_data():
+    with FakeDevice(rx_buffer=256) as device, AmpySession(device.port) as session:
+        session.put_bytes(DATA, "/x.bin")
+        assert device.dropped_bytes
+        assert session.counters["retries"] >= 1
+        assert session.transfer_chunk < TRANSFER_CHUNK
+        assert session.write_delay > 0
+        assert read(device, "/x.bin") == DATA
+
+
+@pytest.mark.parametrize("platform, upgraded", [("esp32", True), ("rp2", False)])
+def test_baud_rate_upgrade_only_on_usb_serial_bridges(platform, upgraded):
+    with FakeDevice(platform=platform) as device, AmpySession(device.port) as session:
+        before = session.baudrate
+        after = session.upgrade_baudrate()
+        assert (after > before) is upgraded
+        assert session.exec_("print(6 * 7)").strip() == b"42"
+
+
+def test_profile_is_saved_per_board_and_reused(board, state_dir, monkeypatch):
+    AM_main.get_session(board).put_bytes(DATA, "/x.bin")
+    device_id = AM_main.board_id(board)
+    AM_main.close_sessions()
+
+    with open(AM_main.LINK_PROFILES_FILE) as f:
+        profiles = json.load(f)
+    assert list(profiles) == [device_id]
+    assert profiles[device_id]["transfer_chunk"] == MAX_TRANSFER_CHUNK
+
+    monkeypatch.setattr(AmpySession, "upgrade_baudrate", lambda self, *args: pytest.fail("tuned again"))
+    assert AM_main.get_session(board).transfer_chunk == MAX_TRANSFER_CHUNK
@@ -0,0 +1,89 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Per-operation measurements and their export."""
+
+import json
+import os
+
+import pytest
+
+import AM_main
+from AM_metrics import Metrics
+from AM_session import DeviceError
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    fresh = Metrics()
+    monkeypatch.setattr(AM_main, "METRICS", fresh)
+    return fresh
+
+
+def test_operations_are_recorded_with_traffic(board, metrics, board_files):
+    board_files({"/log.txt": b"x" * 5000})
+    assert AM_main.session_call(board, "Read", lambda session: session.get("/log.txt"), op="get")[0]
+
+    (record,) = metrics.snapshot()
+    assert record["op"] == "get"
+    assert record["outcome"] == "ok"
+    assert record["port"] == AM_main.port_device(board)
+    assert record["device"] == AM_main.board_id(board)
+    assert record["bytes_received"] > 5000
+    assert record["seconds"] >= sum(record["phases"].values()) - 1e-3
+
+
+def test_failures_and_nested_operations(board, metrics):
+    def failing(session):
+        raise DeviceError("OSError: [Errno 2] ENOENT")
+
+    def nested(session):
+        with AM_main.measured(board, "inner"):
+            return session.exec_("print(1)")
+
+    assert not AM_main.session_call(board, "Remove", failing, op="rm")[0]
+    assert AM_main.session_call(board, "Nested", nested, op="outer")[0]
+    records = metrics.snapshot()
+    assert [(r["op"], r["outcome"]) for r in records] == [("rm", "device_error"), ("outer", "ok")]
+    assert "ENOENT" in records[0]["error"]
+
+
+def test_export_writes_jsonl_and_prometheus(board, metrics, state_dir):
+    AM_main.session_call(board, "Ping", lambda session: session.exec_("print(1)"), op="ping")
+    jsonl_path, prom_path = AM_main.export_metrics()
+
+    assert os.path.dirname(jsonl_path) == str(state_dir / "metrics")
+    with open(jsonl_path) as f:
+        assert [json.loads(line)["op"] for line in f] == ["ping"]
+    with open(prom_path) as f:
+        text = f.read()
+    assert "# TYPE ampy_operations_total counter" in text
+    assert f'op="ping",outcome="ok"}} 1' in text
+
+    (row,) = metrics.summary()
+    assert row["operations"] == 1
+    assert row["errors"] == 0
+
+
+def test_nothing_to_export(metrics):
+    assert AM_main.export_metrics() is None
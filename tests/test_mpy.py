@@ -0,0 +1,113 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Precompiled uploads, with a stand-in for mpy-cross."""
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import AM_main
+import AM_mpy
+
+# Prints the version the simulated board asks for and "compiles" by copying
+# the source behind a marker, slowly enough for concurrent compiles to overlap.
+FAKE_COMPILER = """
+import sys, time
+args = sys.argv[1:]
+if args == ["--version"]:
+    print("MicroPython v1.22.0 on 2024-01-01; mpy-cross emitting mpy v6.2")
+    sys.exit(0)
+output, source = args[args.index("-o") + 1], args[-1]
+data = open(source, "rb").read()
+if b"syntax error" in data:
+    sys.exit("SyntaxError: invalid syntax")
+with open(output, "wb") as f:
+    for i in range(0, len(data), 1024):
+        f.write(b"M" + data[i : i + 1024])
+        f.flush()
+        time.sleep(0.01)
+"""
+
+
+@pytest.fixture
+def compiler(tmp_path, monkeypatch):
+    script = tmp_path / "fake_mpy_cross.py"
+    script.write_text(FAKE_COMPILER)
+    command = f"{sys.executable} {script}"
+    monkeypatch.setenv(AM_mpy.COMPILER_ENV, command)
+    monkeypatch.setattr(AM_mpy, "_compilers", {})
+    return AM_mpy.MpyCross(command)
+
+
+def compiled(data):
+    return b"".join(b"M" + data[i : i + 1024] for i in range(0, len(data), 1024))
+
+
+def test_concurrent_compiles_publish_whole_files(compiler, state_dir, tmp_path):
+    source = tmp_path / "big.py"
+    data = b"x = 1\n" * 2000
+    source.write_bytes(data)
+    cache = AM_mpy.MpyCache(compiler)
+    with ThreadPoolExecutor(8) as pool:
+        outputs = list(pool.map(lambda _: cache.compile(str(source), "big.py"), range(8)))
+
+    assert len(set(outputs)) == 1
+    with open(outputs[0], "rb") as f:
+        assert f.read() == compiled(data)
+    assert os.listdir(cache.directory) == [os.path.basename(outputs[0])]
+
+
+def test_failed_compile_leaves_no_temp_file(compiler, state_dir, tmp_path):
+    source = tmp_path / "bad.py"
+    source.write_bytes(b"syntax error\n")
+    cache = AM_mpy.MpyCache(compiler)
+    with pytest.raises(AM_mpy.CompileError):
+        cache.compile(str(source), "bad.py")
+    assert os.listdir(cache.directory) == []
+
+
+def test_folder_upload_sends_mpy_and_keeps_entry_points(compiler, board, device, make_tree):
+    local_dir = make_tree({"main.py": b"import app\n", "app.py": b"run = 1\n"})
+    with open(device.local_path("/app.py"), "wb") as f:
+        f.write(b"old source\n")
+
+    report = AM_main.upload_from_dir(board, local_dir, compile_mpy=True)
+    assert sorted(report["uploaded"]) == ["/app.mpy", "/main.py"]
+    assert sorted(os.listdir(device.root)) == ["app.mpy", "main.py"]
+    with open(device.local_path("/app.mpy"), "rb") as f:
+        assert f.read() == compiled(b"run = 1\n")
+
+
+def test_source_stays_when_its_mpy_fails(compiler, board, device, make_tree, monkeypatch):
+    monkeypatch.setattr(AM_main, "BUNDLE_THRESHOLD", 0)
+    local_dir = make_tree({"app.py": b"run = 1\n"})
+    with open(device.local_path("/app.py"), "wb") as f:
+        f.write(b"old source\n")
+    monkeypatch.setattr(AM_main, "upload_single", lambda *args, **kwargs: None)
+
+    report = AM_main.upload_from_dir(board, local_dir, compile_mpy=True)
+    assert report["failed"] == ["/app.mpy"]
+    assert os.listdir(device.root) == ["app.py"]
@@ -0,0 +1,91 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""The prepare-ahead pipeline behind folder uploads."""
+
+import random
+import time
+
+import pytest
+
+import AM_main
+from AM_pipeline import Pipeline
+
+
+def test_results_come_in_input_order():
+    delays = random.Random(2).choices([0, 0.001, 0.01], k=40)
+
+    def prepare(number):
+        time.sleep(delays[number])
+        return number * 2
+
+    results = [(item, result) for item, result, _ in Pipeline(range(40), prepare, workers=8)]
+    assert results == [(number, number * 2) for number in range(40)]
+
+
+def test_errors_are_handed_to_the_consumer():
+    def prepare(number):
+        if number == 2:
+            raise ValueError("unreadable")
+        return number
+
+    entries = list(Pipeline(range(4), prepare))
+    assert [item for item, _, _ in entries] == [0, 1, 2, 3]
+    assert isinstance(entries[2][2], ValueError)
+    assert entries[3][1:] == (3, None)
+
+
+def test_prepared_bytes_stay_within_the_budget():
+    held = []
+    pipeline = Pipeline(range(20), lambda number: number, cost=lambda item: 10, workers=4, max_bytes=30)
+
+    for _ in pipeline:
+        held.append(pipeline.budget.used)
+        time.sleep(0.002)
+    assert max(held) <= 30
+
+
+def test_failing_input_ends_the_run():
+    def items():
+        yield 1
+        raise OSError("folder vanished")
+
+    pipeline = iter(Pipeline(items(), lambda item: item))
+    assert next(pipeline)[0] == 1
+    with pytest.raises(OSError):
+        next(pipeline)
+
+
+def test_stopping_early_releases_the_producer():
+    pipeline = Pipeline(range(10_000), lambda item: item, depth=2)
+    for item, _, _ in pipeline:
+        if item == 3:
+            break
+    assert {"prepare", "wait", "consume"} <= set(pipeline.times.totals())
+
+
+def test_folder_upload_reports_stage_times(board, device, make_tree):
+    local_dir = make_tree({f"m{i}.py": b"x = 1\n" * (i + 1) for i in range(6)})
+    report = AM_main.upload_from_dir(board, local_dir)
+    assert len(report["uploaded"]) == 6
+    assert {"prepare", "wait", "consume"} <= set(report["stages"])
@@ -0,0 +1,104 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Board discovery and the probe cache."""
+
+import pytest
+
+import AM_ports
+from AM_ports import PortInfo
+
+
+@pytest.fixture
+def ports(monkeypatch):
+    """Candidate ports the test controls, and the devices probed so far."""
+    candidates = []
+    probed = []
+    answers = {}
+
+    def probe(device, timeout=AM_ports.PROBE_TIMEOUT):
+        probed.append(device)
+        return answers.get(device, False)
+
+    monkeypatch.setattr(AM_ports, "_probe_cache", {})
+    monkeypatch.setattr(AM_ports, "list_candidate_ports", lambda: [PortInfo(d) for d in candidates])
+    monkeypatch.setattr(AM_ports, "probe_port", probe)
+    return candidates, probed, answers
+
+
+def test_probe_finds_the_simulated_board(device):
+    assert AM_ports.probe_port(device.port)
+
+
+def test_rescan_probes_only_new_ports(ports):
+    candidates, probed, answers = ports
+    candidates[:] = ["/dev/ttyACM0", "/dev/ttyS0"]
+    answers["/dev/ttyACM0"] = True
+    assert [p.device for p in AM_ports.discover_boards()] == ["/dev/ttyACM0"]
+    assert sorted(probed) == ["/dev/ttyACM0", "/dev/ttyS0"]
+
+    probed.clear()
+    candidates.append("/dev/ttyACM1")
+    AM_ports.discover_boards()
+    assert probed == ["/dev/ttyACM1"]  # the silent ttyS0 is not probed on every scan
+
+
+def test_forgotten_port_is_probed_again(ports):
+    candidates, probed, answers = ports
+    candidates[:] = ["/dev/ttyACM0"]
+    assert AM_ports.discover_boards() == []
+
+    answers["/dev/ttyACM0"] = True  # the board finished booting and was replugged
+    AM_ports.forget_port("/dev/ttyACM0")
+    assert [p.device for p in AM_ports.discover_boards()] == ["/dev/ttyACM0"]
+    assert probed == ["/dev/ttyACM0", "/dev/ttyACM0"]
+
+
+def test_silent_port_is_probed_again_after_the_ttl(ports, monkeypatch):
+    candidates, probed, _ = ports
+    candidates[:] = ["/dev/ttyS0"]
+    AM_ports.discover_boards()
+    AM_ports.discover_boards()
+    assert probed == ["/dev/ttyS0"]
+    monkeypatch.setattr(AM_ports, "NEGATIVE_PROBE_TTL", 0)
+    AM_ports.discover_boards()
+    assert probed == ["/dev/ttyS0", "/dev/ttyS0"]
+
+
+def test_hotplug_event_names_the_touched_devices():
+    def event(name):
+        padded = name.encode() + b"\0" * (16 - len(name))
+        return AM_ports._INOTIFY_EVENT.pack(1, AM_ports._IN_CREATE, 0, len(padded)) + padded
+
+    assert AM_ports._touched_devices(event("ttyACM0") + event("ttyUSB1")) == {"/dev/ttyACM0", "/dev/ttyUSB1"}
+
+
+def test_unplugged_port_is_forgotten(ports, monkeypatch):
+    candidates, probed, _ = ports
+    monkeypatch.setattr(AM_ports, "_inotify_watch", lambda path: None)
+    monkeypatch.setattr(AM_ports, "POLL_INTERVAL", 0.01)
+    candidates[:] = ["/dev/ttyACM0"]
+    AM_ports.discover_boards()
+    candidates.clear()
+    assert AM_ports.wait_for_port_change(["/dev/ttyACM0"], timeout=1) == []
+    assert AM_ports._probe_cache == {}
@@ -0,0 +1,83 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Heads, tails, byte ranges and following of remote files."""
+
+import AM_main
+
+LOG = b"".join(f"line {i}\n".encode() for i in range(500))
+
+
+def test_read_range_reads_only_the_range(session, board_files):
+    board_files({"/log.txt": LOG})
+    received = []
+    data, offset, size = session.read_range("/log.txt", 100, 50, received.append)
+    assert (offset, size) == (100, len(LOG))
+    assert b"".join(received) == LOG[100:150]
+    assert data == b""
+
+    data, offset, _ = session.read_range("/log.txt", -20)
+    assert (data, offset) == (LOG[-20:], len(LOG) - 20)
+    assert session.read_range("/log.txt", len(LOG) + 5)[0] == b""
+
+
+def test_line_span_finds_heads_and_tails(session, board_files):
+    board_files({"/log.txt": LOG})
+    lines = LOG.splitlines(keepends=True)
+    start, end, size = session.line_span("/log.txt", 0, 3)
+    assert LOG[start:end] == b"".join(lines[:3])
+    start, end, size = session.line_span("/log.txt", -2, 2)
+    assert LOG[start:end] == b"".join(lines[-2:])
+    assert size == len(LOG)
+
+
+def test_display_file_lines_prints_the_tail(board, board_files, capsys):
+    board_files({"/log.txt": LOG})
+    AM_main.display_file_lines(board, "/log.txt", -2, 2)
+    out = capsys.readouterr().out
+    assert "line 498\nline 499\n" in out
+    assert "line 497" not in out
+
+
+def test_follow_prints_appended_lines(board, device, board_files, capsys, monkeypatch):
+    board_files({"/log.txt": LOG})
+    polls = []
+    interval = 0.0125
+    real_sleep = AM_main.time.sleep
+
+    def sleep(seconds):
+        if seconds != interval:
+            return real_sleep(seconds)
+        polls.append(None)
+        if len(polls) == 1:
+            with open(device.local_path("/log.txt"), "ab") as f:
+                f.write(b"appended\n")
+        elif len(polls) == 3:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(AM_main.time, "sleep", sleep)
+    assert AM_main.follow_file(board, "/log.txt", lines=1, interval=interval)
+    out = capsys.readouterr().out
+    assert "line 499\nappended\n" in out
+    assert out.count("appended") == 1
+    assert "line 498" not in out
@@ -0,0 +1,92 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Deadlines, recovery of a stalled board and retries."""
+
+import time
+
+import pytest
+
+import AM_main
+import AM_session
+from AM_session import DeadlineExceeded, SessionError
+
+STALL = "import time\ntime.sleep(1.5)\nprint('late')"
+
+
+@pytest.fixture
+def short_deadline(monkeypatch):
+    monkeypatch.setattr(AM_session, "DEADLINE_MIN", 0.3)
+
+
+def test_silent_board_misses_its_deadline(session, short_deadline):
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        session.exec_(STALL)
+    assert time.monotonic() - start < 1.5
+
+    assert session.recover() in ("interrupt", "soft reset", "reopen")
+    assert session.exec_("print(1 + 1)").strip() == b"2"
+
+
+def test_unbounded_code_waits_for_the_board(session, short_deadline):
+    assert session.exec_(STALL, bounded=False).strip() == b"late"
+
+
+def test_limit_caps_the_run_time(session):
+    with pytest.raises(DeadlineExceeded):
+        session.exec_(STALL, bounded=False, limit=0.3)
+    session.recover()
+    assert session.exec_("print('ok')").strip() == b"ok"
+
+
+def test_session_call_retries_after_a_stall(board, monkeypatch):
+    monkeypatch.setattr(AM_main, "RESUME_DELAY", 0.01)
+    attempts = []
+
+    def flaky(session):
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise DeadlineExceeded("stalled")
+        return session.exec_("print('done')").strip()
+
+    assert AM_main.session_call(board, "Test", flaky, retries=1) == (True, b"done")
+    assert len(attempts) == 2
+
+
+def test_dead_board_is_skipped_after_repeated_failures(board, monkeypatch):
+    monkeypatch.setattr(AM_main, "recover_session", lambda com_port: False)
+    attempts = []
+
+    def dead(session):
+        attempts.append(None)
+        raise SessionError("no answer")
+
+    for _ in range(AM_main.LINK_FAILURE_LIMIT):
+        assert AM_main.session_call(board, "Test", dead) == (False, None)
+    assert AM_main.link_down(board)
+    assert AM_main.session_call(board, "Test", dead) == (False, None)
+    assert len(attempts) == AM_main.LINK_FAILURE_LIMIT
+
+    monkeypatch.setattr(AM_main, "LINK_RETRY_AFTER", 0)
+    assert not AM_main.link_down(board)
@@ -0,0 +1,89 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Continuing interrupted single-file transfers from their `.part` files."""
+
+import os
+
+from AM_session import PARTIAL_SUFFIX
+
+DATA = bytes(range(256)) * 40
+
+
+def sent():
+    calls = []
+    return calls, lambda n, total: calls.append(n)
+
+
+def test_upload_continues_a_matching_partial_file(session, device, board_files):
+    board_files({"/blob.bin" + PARTIAL_SUFFIX: DATA[:4096]})
+    calls, progress = sent()
+    session.put_bytes(DATA, "/blob.bin", progress=progress, resume=True)
+
+    assert calls[0] == 4096
+    assert sum(calls) == len(DATA)
+    with open(device.local_path("/blob.bin"), "rb") as f:
+        assert f.read() == DATA
+    assert os.listdir(device.root) == ["blob.bin"]
+
+
+def test_upload_restarts_a_foreign_partial_file(session, device, board_files):
+    board_files({"/blob.bin" + PARTIAL_SUFFIX: b"something else" * 100})
+    calls, progress = sent()
+    session.put_bytes(DATA, "/blob.bin", progress=progress, resume=True)
+
+    assert calls[0] < 4096
+    with open(device.local_path("/blob.bin"), "rb") as f:
+        assert f.read() == DATA
+
+
+def test_upload_replaces_an_existing_file(session, device, board_files):
+    board_files({"/blob.bin": b"old"})
+    session.put_bytes(DATA, "/blob.bin")
+    with open(device.local_path("/blob.bin"), "rb") as f:
+        assert f.read() == DATA
+    assert os.listdir(device.root) == ["blob.bin"]
+
+
+def test_download_continues_a_matching_partial_file(session, board_files, tmp_path):
+    board_files({"/blob.bin": DATA})
+    local = tmp_path / "blob.bin"
+    (tmp_path / ("blob.bin" + PARTIAL_SUFFIX)).write_bytes(DATA[:4096])
+    calls, progress = sent()
+    session.download_file("/blob.bin", str(local), progress=progress)
+
+    assert calls[0] == 4096
+    assert sum(calls) == len(DATA)
+    assert local.read_bytes() == DATA
+    assert os.listdir(tmp_path) == ["blob.bin"]
+
+
+def test_download_restarts_a_foreign_partial_file(session, board_files, tmp_path):
+    board_files({"/blob.bin": DATA})
+    local = tmp_path / "blob.bin"
+    (tmp_path / ("blob.bin" + PARTIAL_SUFFIX)).write_bytes(b"x" * 5000)
+    calls, progress = sent()
+    session.download_file("/blob.bin", str(local), progress=progress)
+
+    assert sum(calls) == len(DATA)
+    assert local.read_bytes() == DATA
@@ -0,0 +1,72 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Smoke tests for AmpySession against the simulated board."""
+
+import os
+
+import pytest
+
+from AM_session import DeviceError
+
+
+def test_put_get_roundtrip(session, device, tmp_path):
+    data = bytes(range(256)) * 40
+    local = tmp_path / "data.bin"
+    local.write_bytes(data)
+    session.put(str(local), "/data.bin")
+    with open(device.local_path("/data.bin"), "rb") as f:
+        assert f.read() == data
+    assert session.get("/data.bin") == data
+    assert not os.path.exists(device.local_path("/data.bin.part"))
+
+
+def test_ls_and_rm(session, device):
+    session.mkdir("/lib")
+    session.put_bytes(b"x = 1\n", "/lib/mod.py")
+    session.put_bytes(b"", "/empty.txt")
+    assert set(session.ls("/")) >= {"/lib", "/empty.txt"}
+    assert "/lib/mod.py" in session.ls("/", recursive=True)
+    session.rm("/empty.txt")
+    assert "/empty.txt" not in session.ls("/")
+    with pytest.raises(DeviceError):
+        session.rm("/empty.txt")
+    session.rmdir("/lib")
+    assert session.ls("/") == []
+
+
+def test_compressed_put_replaces_target(session, device):
+    with open(device.local_path("/log.txt"), "wb") as f:
+        f.write(b"old")
+    data = b"sensor,1,2,3\n" * 2000
+    stats = session.put_bytes(data, "/log.txt", compress=True)
+    assert stats["raw_bytes"] == len(data)
+    assert session.get("/log.txt") == data
+    assert sorted(os.listdir(device.root)) == ["log.txt"]
+
+
+def test_run_waits_for_a_quiet_script(session, tmp_path):
+    session.timeout = 0.5  # the script stays silent for longer than this
+    script = tmp_path / "quiet.py"
+    script.write_text("import time\ntime.sleep(1.5)\nprint('done')\n")
+    assert session.run(str(script)).strip() == b"done"
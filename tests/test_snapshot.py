@@ -0,0 +1,128 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Snapshots of the simulated board and restores to another one."""
+
+import os
+
+import pytest
+
+import AM_main
+import AM_snapshot
+from AM_fakedevice import FakeDevice
+from AM_session import AmpySession
+
+FILES = {
+    "/main.py": b"import app\n",
+    "/lib/app.py": b"x = 1\n" * 10,
+    "/data/blob.bin": os.urandom(3 * AM_main.BUNDLE_THRESHOLD),
+}
+
+
+@pytest.fixture
+def other(state_dir):
+    with FakeDevice(unique_id=b"\x0b") as spare:
+        yield spare
+        AM_main.close_sessions()
+
+
+@pytest.fixture
+def snapshot(board, board_files, device):
+    board_files(FILES)
+    os.makedirs(device.local_path("/empty"))
+    return AM_snapshot.take_snapshot(board, AM_snapshot.SnapshotStore(), "base")
+
+
+def contents(device):
+    found = {}
+    for top, dirs, files in os.walk(device.root):
+        for name in files:
+            path = os.path.join(top, name)
+            with open(path, "rb") as f:
+                found["/" + os.path.relpath(path, device.root).replace(os.sep, "/")] = f.read()
+    return found
+
+
+def test_snapshot_records_every_file_and_folder(snapshot, state_dir):
+    assert snapshot["dirs"] == ["/data", "/empty", "/lib"]
+    assert sorted(record["path"] for record in snapshot["files"]) == sorted(FILES)
+    store = AM_snapshot.SnapshotStore()
+    assert store.root == str(state_dir / "snapshots")
+    assert store.names() == ["base"]
+    for record in snapshot["files"]:
+        assert store.read(record["sha256"]) == FILES[record["path"]]
+
+
+def test_known_files_are_not_downloaded_again(snapshot, board, monkeypatch):
+    downloads = []
+    download = AmpySession.download
+
+    def recording(self, remote_file, *args, **kwargs):
+        downloads.append(remote_file)
+        return download(self, remote_file, *args, **kwargs)
+
+    monkeypatch.setattr(AmpySession, "download", recording)
+    again = AM_snapshot.take_snapshot(board, AM_snapshot.SnapshotStore(), "again")
+    assert downloads == []
+    assert again["files"] == snapshot["files"]
+
+
+def test_restore_to_another_board(snapshot, other):
+    report = AM_snapshot.restore(other.port, snapshot, AM_snapshot.SnapshotStore())
+    assert sorted(report["uploaded"]) == sorted(FILES)
+    assert contents(other) == FILES
+    assert os.path.isdir(other.local_path("/empty"))
+
+
+def test_restore_diff_and_prune(snapshot, other):
+    for path, data in {**FILES, "/lib/app.py": b"changed\n", "/extra.txt": b"", "/old/x.py": b""}.items():
+        os.makedirs(os.path.dirname(other.local_path(path)), exist_ok=True)
+        with open(other.local_path(path), "wb") as f:
+            f.write(data)
+
+    report = AM_snapshot.restore(other.port, snapshot, AM_snapshot.SnapshotStore(), diff=True, prune=True)
+    assert report["uploaded"] == ["/lib/app.py"]
+    assert report["unchanged"] == 2
+    assert sorted(report["deleted"]) == ["/extra.txt", "/old"]
+    assert contents(other) == FILES
+
+
+def test_archive_restores_without_the_store(snapshot, other, tmp_path):
+    archive = str(tmp_path / "board.tar")
+    AM_snapshot.export_archive(AM_snapshot.SnapshotStore(), snapshot, archive)
+    source = AM_snapshot.ArchiveSource(archive)
+    try:
+        assert source.manifest == snapshot
+        AM_snapshot.restore(other.port, source.manifest, source)
+    finally:
+        source.close()
+    assert contents(other) == FILES
+
+
+def test_corrupt_object_is_refused(snapshot, other):
+    store = AM_snapshot.SnapshotStore()
+    record = next(r for r in snapshot["files"] if r["path"] == "/main.py")
+    with open(store.object_path(record["sha256"]), "r+b") as f:
+        f.write(b"\0")
+    with pytest.raises(AM_snapshot.SnapshotError):
+        AM_snapshot.restore(other.port, snapshot, store)
@@ -0,0 +1,97 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Incremental sync and pruning against the simulated board."""
+
+import os
+import types
+
+import AM_main
+from AM_fakedevice import FakeDevice
+
+
+def read(device, path):
+    with open(device.local_path(path), "rb") as f:
+        return f.read()
+
+
+def without_hashlib(device):
+    """Make the board report size and mtime instead of sha256, like firmware without hashlib."""
+    modules = device._modules
+
+    def patched(out):
+        found = modules(out)
+        found["hashlib"] = found["uhashlib"] = types.SimpleNamespace()
+        return found
+
+    device._modules = patched
+
+
+def test_sync_uploads_only_changed_files(board, device, make_tree):
+    local_dir = make_tree({"a.py": b"a = 1\n", "b.py": b"b = 1\n"})
+    report = AM_main.upload_from_dir(board, local_dir, sync=True)
+    assert sorted(report["uploaded"]) == ["/a.py", "/b.py"]
+
+    with open(os.path.join(local_dir, "b.py"), "wb") as f:
+        f.write(b"b = 2\n")
+    report = AM_main.upload_from_dir(board, local_dir, sync=True)
+    assert report["uploaded"] == ["/b.py"]
+    assert report["unchanged"] == 1
+    assert read(device, "/b.py") == b"b = 2\n"
+
+
+def test_prune_removes_stale_files_and_topmost_stale_folders(board, device, make_tree):
+    local_dir = make_tree({"main.py": b"x\n", "lib/keep/mod.py": b"y\n"})
+    for path in ("/old.py", "/gone/deep/f.py", "/lib/old/g.py", "/lib/keep/stale.py"):
+        os.makedirs(os.path.dirname(device.local_path(path)), exist_ok=True)
+        with open(device.local_path(path), "wb") as f:
+            f.write(b"stale\n")
+
+    report = AM_main.upload_from_dir(board, local_dir, sync=True, prune=True, recursive=True)
+    assert sorted(report["deleted"]) == ["/gone", "/lib/keep/stale.py", "/lib/old", "/old.py"]
+    remaining = sorted(
+        os.path.relpath(os.path.join(top, name), device.root)
+        for top, dirs, files in os.walk(device.root)
+        for name in dirs + files
+    )
+    assert remaining == ["lib", "lib/keep", "lib/keep/mod.py", "main.py"]
+
+
+def test_sync_state_is_kept_per_board(board, device, make_tree):
+    without_hashlib(device)
+    local_dir = make_tree({"a.py": b"a = 1\n"})
+    AM_main.upload_from_dir(board, local_dir, sync=True)
+    synced = os.stat(device.local_path("/a.py"))
+
+    with FakeDevice(unique_id=b"\x0b") as other:
+        without_hashlib(other)
+        # same size and mtime as on the first board, different content
+        with open(other.local_path("/a.py"), "wb") as f:
+            f.write(b"a = 9\n")
+        os.utime(other.local_path("/a.py"), (synced.st_atime, synced.st_mtime))
+        try:
+            report = AM_main.upload_from_dir(other.port, local_dir, sync=True)
+        finally:
+            AM_main.close_sessions()
+        assert report["uploaded"] == ["/a.py"]
+        assert read(other, "/a.py") == b"a = 1\n"
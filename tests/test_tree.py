@@ -0,0 +1,79 @@
+# MIT License
+#
+# Copyright (c) 2024 Filip Pawłowski(kotlecikmud)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Recursive uploads and downloads with include/exclude filters."""
+
+import os
+
+import AM_main
+
+TREE = {
+    "main.py": b"import lib.net\n",
+    "lib/net.py": b"net = 1\n",
+    "lib/__pycache__/net.cpython-311.pyc": b"\0",
+    "lib/drivers/led.py": b"led = 1\n",
+    "assets/logo.png": b"\x89PNG",
+    "notes.txt": b"todo\n",
+}
+
+
+def files_below(root):
+    return sorted(
+        os.path.relpath(os.path.join(top, name), root).replace(os.sep, "/")
+        for top, _, files in os.walk(root)
+        for name in files
+    )
+
+
+def test_local_walk_applies_the_filters(make_tree):
+    local_dir = make_tree(TREE)
+    assert list(AM_main.walk_local_tree(local_dir, recursive=False)) == ["main.py", "notes.txt"]
+    assert list(AM_main.walk_local_tree(local_dir, include=["*.py"])) == [
+        "lib/drivers/led.py",
+        "lib/net.py",
+        "main.py",
+    ]
+    assert "assets/logo.png" not in AM_main.walk_local_tree(local_dir, exclude=["assets"])
+
+
+def test_recursive_upload_keeps_the_structure(board, device, make_tree):
+    local_dir = make_tree(TREE)
+    report = AM_main.upload_from_dir(board, local_dir, recursive=True, exclude=["*.txt", "__pycache__"])
+    assert report["failed"] == []
+    assert files_below(device.root) == ["assets/logo.png", "lib/drivers/led.py", "lib/net.py", "main.py"]
+    with open(device.local_path("/lib/drivers/led.py"), "rb") as f:
+        assert f.read() == TREE["lib/drivers/led.py"]
+
+
+def test_upload_without_recursive_stays_at_the_top(board, device, make_tree):
+    local_dir = make_tree(TREE)
+    AM_main.upload_from_dir(board, local_dir)
+    assert files_below(device.root) == ["main.py", "notes.txt"]
+
+
+def test_recursive_download_applies_the_filters(board, board_files, tmp_path):
+    board_files({"/" + path: data for path, data in TREE.items()})
+    out = tmp_path / "out"
+    AM_main.download_tree(board, "/lib", str(out), include=["*.py"])
+    assert files_below(out) == ["drivers/led.py", "net.py"]
+    assert (out / "drivers" / "led.py").read_bytes() == TREE["lib/drivers/led.py"]